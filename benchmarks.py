@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import pointing_technique as pt
+except ImportError:
+    print("Could not import pointing_technique.py")
+import target_layout
+from target_set import TargetSet, TargetView
+
+"""
+BENCHMARK SUITE
+Measures the hot paths of the experiment: hit-testing of both pointing techniques, target layout generation,
+trial logging and the mouse move -> paint cycle of the experiment widget (using the offscreen Qt platform).
+Results are written as json, together with the git revision, so runs of different revisions can be compared:
+
+usage: python3 benchmarks.py [-o results.json] [--quick] [--only hit_test,layout] [--compare old.json]
+"""
+
+TARGET_COUNTS = [10, 100, 1000, 5000]
+BUBBLE_RADII = [10, 20, 50, 100]
+LAYOUT_COUNTS = [10, 100, 1000]
+SEED = 4711
+
+
+class BenchmarkRunner(object):
+    """
+        Times benchmark functions and collects the results
+
+        @param min_time: Minimum time in seconds spent on every benchmark
+        @param repeats: How often every measurement is repeated, the best run is reported
+    """
+
+    def __init__(self, min_time=0.2, repeats=3):
+        self.min_time = min_time
+        self.repeats = repeats
+        self.results = []
+
+    ''' Measures a function doing one operation per call
+
+        @param name: Name of the benchmark group
+        @param params: Dictionary describing the benchmark's parameters
+        @param func: Function without arguments executing one operation
+    '''
+
+    def measure(self, name, params, func):
+        func()
+        number = 1
+        while True:
+            duration = self._time(func, number)
+            if duration >= self.min_time / self.repeats or number >= 1 << 20:
+                break
+            number *= 2
+        runs = [duration] + [self._time(func, number) for _ in range(self.repeats - 1)]
+        best = min(runs) / number
+        result = {"name": name, "params": params, "iterations": number,
+                  "best_s": best, "mean_s": sum(runs) / len(runs) / number, "ops_per_s": 1 / best if best else None}
+        self.results.append(result)
+        print("%-22s %-48s %12.2f us/op" % (name, json.dumps(params, sort_keys=True), best * 1e6))
+        return result
+
+    def _time(self, func, number):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+
+''' Builds a random TargetSet covering the experiment window'''
+
+
+def random_targets(count, rng):
+    return TargetSet([(rng.uniform(0, 1920), rng.uniform(0, 800), rng.choice([10, 25, 50, 75]))
+                      for _ in range(count)])
+
+
+''' Benchmarks filter and get_target_ids_under_cursor of all techniques for different target counts and bubble radii
+    The positions form a continuous random walk, like real mouse movements
+'''
+
+
+def bench_hit_test(runner, quick):
+    rng = random.Random(SEED)
+    positions = [(960, 400)]
+    while len(positions) < 1024:
+        pos_x, pos_y = positions[-1]
+        positions.append((min(max(pos_x + rng.randint(-10, 10), 0), 1920),
+                          min(max(pos_y + rng.randint(-10, 10), 0), 800)))
+    for count in TARGET_COUNTS[:2] if quick else TARGET_COUNTS:
+        targets = random_targets(count, rng)
+        techniques = [("standard", None, pt.StandardPointingTechnique(targets, TargetView))]
+        for radius in BUBBLE_RADII[:2] if quick else BUBBLE_RADII:
+            techniques.append(("fat_bubble", radius,
+                               pt.PointingTechniqueFatBubble(targets, TargetView, radius)))
+        techniques.append(("bubble_cursor", None, pt.BubbleCursor(targets, TargetView)))
+        for name, radius, technique in techniques:
+            cycle = iter(range(1 << 62))
+
+            def query():
+                pos = positions[next(cycle) & 1023]
+                technique.filter(pos[0], pos[1])
+                technique.get_target_ids_under_cursor()
+
+            runner.measure("hit_test", {"technique": name, "targets": count, "bubble_radius": radius,
+                                        "index": type(technique.index).__name__}, query)
+
+
+''' Benchmarks target_layout.generate_layout for different numbers of distractors
+    Layouts that do not fit are measured up to the point the LayoutError is raised
+'''
+
+
+def bench_layout(runner, quick):
+    rng = random.Random(SEED)
+    for count in LAYOUT_COUNTS[:2] if quick else LAYOUT_COUNTS:
+        for size in (10, 75):
+
+            def generate():
+                try:
+                    target_layout.generate_layout(200, size, rng.random() * 6.28, (960, 400), 1920, 800, count, rng)
+                except target_layout.LayoutError:
+                    pass
+
+            runner.measure("generate_layout", {"distractors": count, "size": size}, generate)
+
+
+''' Benchmarks the Qt parts: initTargets, log_time and the mouseMoveEvent -> paintEvent cycle
+    Requires PyQt5, the widget is rendered with the offscreen platform
+'''
+
+
+def bench_qt(runner, quick):
+    try:
+        from PyQt5 import QtCore, QtGui, QtWidgets
+    except ImportError:
+        print("PyQt5 is not available, skipping the Qt benchmarks")
+        return
+    import pointing_experiment as pe
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            model = pe.PointingExperimentModel("bench", [(250, 10), (100, 75)], True)
+            test = pe.PointingExperimentTest(model)
+
+        # the layout of a trial is cached by the plan, without evicting it this would time a dictionary lookup
+        def init_targets():
+            test.plan.evict(len(test.plan))
+            test.initTargets()
+
+        runner.measure("init_targets", {"targets": len(test.targets)}, init_targets)
+
+        def log():
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.log_time(123, (1, 2))
+
+        runner.measure("log_time", {}, log)
+
+        rng = random.Random(SEED)
+        positions = [QtCore.QPoint(rng.randint(0, 1920), rng.randint(0, 800)) for _ in range(256)]
+        for improved in (False, True):
+            model.improve_pointing = improved
+            test.init_next_trial()
+            app.processEvents()
+            cycle = iter(range(1 << 62))
+
+            def move_and_paint():
+                pos = positions[next(cycle) & 255]
+                event = QtGui.QMouseEvent(QtCore.QEvent.MouseMove, pos, QtCore.Qt.NoButton, QtCore.Qt.NoButton,
+                                          QtCore.Qt.NoModifier)
+                test.mouseMoveEvent(event)
+                app.processEvents()
+
+            runner.measure("move_and_paint", {"improved_pointing": improved, "targets": len(test.targets)},
+                           move_and_paint)
+        test.close()
+        model.close()
+    finally:
+        os.chdir(cwd)
+    app.processEvents()
+
+
+BENCHMARKS = {"hit_test": bench_hit_test, "layout": bench_layout, "qt": bench_qt}
+
+
+''' Returns the current git revision or None if not inside a git checkout'''
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+''' Prints the speed ratio of every benchmark found in both result files (> 1 means faster now)'''
+
+
+def compare(old_results, new_results):
+    old = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in old_results}
+    for result in new_results:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        if key in old:
+            print("%-22s %-48s %6.2fx" % (key[0], key[1], old[key]["best_s"] / result["best_s"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the pointing experiment")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--quick", action="store_true", help="fewer parameters and shorter runs")
+    parser.add_argument("--only", help="comma separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--compare", help="previous result file to compare against")
+    args = parser.parse_args()
+
+    runner = BenchmarkRunner(min_time=0.05 if args.quick else 0.2)
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    for name in selected:
+        # a failing benchmark must not cost the results of the others
+        try:
+            BENCHMARKS[name](runner, args.quick)
+        except Exception:
+            traceback.print_exc()
+            sys.stderr.write("benchmark %s failed, its results are missing from the report\n" % name)
+
+    report = {"revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": runner.results}
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=1)
+    if args.compare:
+        with open(args.compare) as old:
+            compare(json.load(old)["results"], runner.results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+
+
+import array
+import csv
+import glob
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+COLUMNAR TRIAL LOGS
+Stores trial records as typed columns in a NumPy .npz file next to the semicolon separated csv file.
+Analysis code can load single columns without parsing any text:
+
+    columns = load_columns("user1.npz", ["target_size", "movement_time (ms)"])
+
+The experiment appends every batch of records as a separate chunk file (user1.part000001.npz, ...),
+load_columns() reads the chunks of a log together.
+
+Cursor trajectories attached to the records are stored as four concatenated sample columns plus
+an offsets column (trajectory i spans trajectory_offsets[i]:trajectory_offsets[i + 1]).
+
+usage: python3 columnar_log.py <log.csv> [<log.csv> ...]   converts existing csv logs to .npz
+"""
+
+''' Column types of the trial log, in the order of the csv columns (array typecodes, "U" for text)'''
+LOG_SCHEMA = [("timestamp (ISO)", "U"), ("user_id", "U"), ("trial", "l"), ("target_distance", "l"),
+              ("target_size", "l"), ("movement_time (ms)", "d"), ("click_offset_x", "d"), ("click_offset_y", "d"),
+              ("number_of_errors", "l"), ("improved_pointing", "b")]
+
+# the seed of the session's trial plan, tells apart the sessions appended to the same file
+SESSION_SCHEMA = [("session_seed", "q")]
+
+TRAJECTORY_COLUMNS = [("trajectory_t_ns", "q"), ("trajectory_x", "i"), ("trajectory_y", "i"),
+                      ("trajectory_hovered", "H")]
+
+# stands in for integer values of records that were logged without the column
+MISSING_INTEGER = -1
+
+# file name suffix of the chunks NpzSink appends to a log, numbered from 1
+CHUNK_NAME = ".part%06d.npz"
+
+
+''' Converts a single csv value to the type given by the schema'''
+
+
+def parse_value(value, typecode):
+    if typecode == "U":
+        return value
+    if typecode == "b":
+        return value.strip().lower() in ("true", "1")
+    if typecode == "d":
+        return float(value)
+    return int(float(value))
+
+
+class ColumnBuffer(object):
+    """
+        Collects typed columns for a given schema in compact arrays
+
+        @param schema: A list of (name, typecode) tuples
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = {name: [] if typecode == "U" else array.array(typecode) for name, typecode in schema}
+        self.trajectories = {name: array.array(typecode) for name, typecode in TRAJECTORY_COLUMNS}
+        self.trajectory_offsets = array.array('q', [0])
+
+    def __len__(self):
+        return len(self.trajectory_offsets) - 1
+
+    ''' Appends a record, values are converted to the schema's types and missing trajectories stored as empty'''
+
+    def append(self, record):
+        for name, typecode in self.schema:
+            value = record.get(name)
+            if typecode == "U":
+                self.columns[name].append("" if value is None else str(value))
+            elif typecode == "d" and value is None:
+                self.columns[name].append(float("nan"))
+            else:
+                self.columns[name].append(parse_value(str(value), typecode))
+        trajectory = record.get("trajectory")
+        if trajectory is not None:
+            for (name, typecode), column in zip(TRAJECTORY_COLUMNS, (trajectory.t_ns, trajectory.x, trajectory.y,
+                                                                     trajectory.hovered)):
+                self.trajectories[name].extend(column)
+        self.trajectory_offsets.append(len(self.trajectories["trajectory_t_ns"]))
+
+    ''' Converts all buffered columns to NumPy arrays
+
+        @return: A dictionary mapping column names to arrays
+    '''
+
+    def to_arrays(self):
+        result = {}
+        for name, typecode in self.schema:
+            column = self.columns[name]
+            if typecode == "U":
+                result[name] = np.array(column, dtype=str)
+            elif typecode == "b":
+                result[name] = np.frombuffer(column.tobytes(), dtype=np.int8).astype(bool)
+            else:
+                result[name] = np.frombuffer(column.tobytes(), dtype=column.typecode)
+        for name, column in self.trajectories.items():
+            result[name] = np.frombuffer(column.tobytes(), dtype=column.typecode)
+        result["trajectory_offsets"] = np.frombuffer(self.trajectory_offsets.tobytes(), dtype=np.int64)
+        return result
+
+
+''' Returns the number of records and of trajectory samples of a set of columns'''
+
+
+def column_lengths(columns):
+    offsets = columns.get("trajectory_offsets")
+    if offsets is not None:
+        return len(offsets) - 1, int(offsets[-1])
+    trajectory_names = [name for name, typecode in TRAJECTORY_COLUMNS]
+    return max([len(values) for name, values in columns.items() if name not in trajectory_names] or [0]), 0
+
+
+''' Returns the values standing in for a column a set of records does not have: empty strings for text,
+    False for flags, NaN for floating point numbers and MISSING_INTEGER (0 if unsigned) for integers,
+    so that integer columns keep their type
+'''
+
+
+def missing_values(like, length):
+    if like.dtype.kind in "US":
+        return np.full(length, "", dtype=like.dtype)
+    if like.dtype.kind == "b":
+        return np.zeros(length, dtype=bool)
+    if like.dtype.kind == "i":
+        return np.full(length, MISSING_INTEGER, dtype=like.dtype)
+    if like.dtype.kind == "u":
+        return np.zeros(length, dtype=like.dtype)
+    return np.full(length, np.nan, dtype=like.dtype)
+
+
+''' Concatenates the columns of several sets of records, e.g. the chunks of a log
+    Columns only some of the sets have are padded with missing_values() for the records of the others
+
+    @param parts: A list of dictionaries mapping column names to arrays
+
+    @return: A dictionary mapping column names to arrays
+'''
+
+
+def concatenate_columns(parts):
+    if len(parts) == 1:
+        return parts[0]
+    lengths = [column_lengths(part) for part in parts]
+    trajectory_names = [name for name, typecode in TRAJECTORY_COLUMNS]
+    names = []
+    for part in parts:
+        names.extend(name for name in part if name not in names)
+    merged = {}
+    for name in names:
+        if name == "trajectory_offsets":
+            offsets = [np.zeros(1, dtype=np.int64)]
+            for part, (rows, samples) in zip(parts, lengths):
+                part_offsets = part[name] if name in part else np.zeros(rows + 1, dtype=np.int64)
+                offsets.append(part_offsets[1:] + offsets[-1][-1])
+            merged[name] = np.concatenate(offsets)
+            continue
+        like = next(part[name] for part in parts if name in part)
+        merged[name] = np.concatenate([part[name] if name in part else
+                                       missing_values(like, samples if name in trajectory_names else rows)
+                                       for part, (rows, samples) in zip(parts, lengths)])
+    return merged
+
+
+''' Returns the files a .npz log is stored in: the file itself if it exists (written by csv_to_npz() or by
+    older versions) followed by the chunks appended by append_columns(), <name>.part000001.npz, ...
+'''
+
+
+def log_files(filename):
+    chunks = glob.glob(glob.escape(os.path.splitext(filename)[0]) + ".part" + "[0-9]" * 6 + ".npz")
+    return ([filename] if os.path.exists(filename) else []) + sorted(chunks)
+
+
+''' Appends columns to a .npz log by writing them to a new chunk file next to it
+    Earlier records are neither read nor rewritten, so appending takes the same time however long the log is.
+    The chunk is written to a temporary file first, a crash never leaves a partial chunk behind.
+
+    @return: The name of the written chunk
+'''
+
+
+def append_columns(filename, columns):
+    files = log_files(filename)
+    number = int(files[-1].rsplit(".part", 1)[1][:-len(".npz")]) if files and files[-1] != filename else 0
+    chunk_name = os.path.splitext(filename)[0] + CHUNK_NAME % (number + 1)
+    temp_name = chunk_name + ".tmp.npz"
+    np.savez(temp_name, **columns)
+    os.replace(temp_name, chunk_name)
+    return chunk_name
+
+
+''' Loads the given columns of a .npz log, only the requested columns are read from disk
+    The chunks of the log are concatenated, columns some chunks do not have are padded with missing_values()
+
+    @param filename: The .npz log to read
+    @param columns: A list of column names, all columns if None
+
+    @return: A dictionary mapping column names to arrays
+'''
+
+
+def load_columns(filename, columns=None):
+    files = log_files(filename)
+    if not files:
+        raise FileNotFoundError(filename)
+    parts = []
+    for name in files:
+        with np.load(name) as data:
+            stored = [column for column in (columns if columns is not None else data.files) if column in data.files]
+            parts.append({column: data[column] for column in stored})
+    result = concatenate_columns(parts)
+    for column in columns or []:
+        if column not in result:
+            raise KeyError("%s is not a column of %s" % (column, filename))
+    return result
+
+
+''' Returns the names of the columns stored in a .npz log (in any of its chunks) without loading them'''
+
+
+def column_names(filename):
+    names = []
+    for name in log_files(filename):
+        with np.load(name) as data:
+            names.extend(column for column in data.files if column not in names)
+    return names
+
+
+class NpzSink(object):
+    """
+        Trial logger sink collecting records in typed columns and appending them to a .npz log
+        Every batch_size records are written to a new chunk of the log (see append_columns()) and the rest on
+        close, so a crash loses at most one batch and earlier records are never rewritten.
+        Can be used together with the sinks of trial_logger.AsyncTrialWriter
+
+        @param filename: The .npz file the records are appended to
+        @param schema: A list of (name, typecode) tuples, LOG_SCHEMA by default
+        @param batch_size: Number of records appended to the file at once
+    """
+
+    def __init__(self, filename, schema=None, batch_size=32):
+        if np is None:
+            raise ImportError("NumPy is required for the columnar log output")
+        self.filename = filename
+        self.batch_size = batch_size
+        self.buffer = ColumnBuffer(schema or LOG_SCHEMA)
+
+    ''' Returns the given records that are not in the log yet, in their order'''
+
+    def missing_records(self, records):
+        from trial_logger import RECORD_KEY_FIELDS, record_key
+        if not log_files(self.filename) or not set(RECORD_KEY_FIELDS) <= set(column_names(self.filename)):
+            return list(records)
+        columns = load_columns(self.filename, RECORD_KEY_FIELDS)
+        logged = set(zip(*[[str(value) for value in columns[field].tolist()] for field in RECORD_KEY_FIELDS]))
+        return [record for record in records if record_key(record) not in logged]
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_size:
+                self.write_buffer()
+
+    ''' Appends the buffered records to the file and starts a new buffer'''
+
+    def write_buffer(self):
+        if len(self.buffer):
+            append_columns(self.filename, self.buffer.to_arrays())
+        self.buffer = ColumnBuffer(self.buffer.schema)
+
+    def flush(self):
+        return
+
+    def close(self):
+        self.write_buffer()
+
+
+''' Reads the records of a semicolon separated trial log
+    Header lines repeated in the middle of the file (one per appended session) are skipped
+
+    @return: A generator yielding one dictionary per record
+'''
+
+
+def read_csv_records(filename):
+    with open(filename, newline="") as logfile:
+        reader = csv.reader(logfile, delimiter=";")
+        header = None
+        for row in reader:
+            if not row:
+                continue
+            if header is None or row == header:
+                header = row
+                continue
+            yield dict(zip(header, row))
+
+
+''' Converts a csv trial log into a .npz file with typed columns
+
+    @param csv_filename: The csv log to convert
+    @param npz_filename: The file to write, the csv name with a .npz extension by default
+
+    @return: The name of the written file
+'''
+
+
+def csv_to_npz(csv_filename, npz_filename=None):
+    if npz_filename is None:
+        npz_filename = os.path.splitext(csv_filename)[0] + ".npz"
+    buffer = ColumnBuffer(LOG_SCHEMA)
+    for record in read_csv_records(csv_filename):
+        buffer.append(record)
+    temp_name = npz_filename + ".tmp.npz"
+    np.savez(temp_name, **buffer.to_arrays())
+    os.replace(temp_name, npz_filename)
+    return npz_filename
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: %s <log.csv> [<log.csv> ...]\n" % sys.argv[0])
+        sys.exit(1)
+    for filename in sys.argv[1:]:
+        print(csv_to_npz(filename))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+
+
+import configparser
+import datetime
+import json
+import random
+import sys
+import time
+
+from trial_logger import AsyncTrialWriter, CsvSink, StdoutSink
+from trajectory import TrajectoryRecorder
+from trial_design import ORDERS, ConditionGrid, TrialDesign, participant_number
+from online_stats import SessionStatistics
+import instrumentation
+
+"""
+EXPERIMENT MODEL
+The Qt-free core of the pointing experiment: trial order, time measurement, logging and the setup file parsers.
+Importing it does not load PyQt, so batch tools like the simulations can use it without a display.
+The experiment UI in pointing_experiment.py re-exports everything defined here.
+"""
+
+""" setup ini file format:
+[experiment_setup]
+UserID = 1
+Conditions = 100,10;100,25;250,75;100,50;250,50;100,75;250,25;150,10;250,10;150,25;200,75;150,50;200,50;150,75;200,25;
+             200,10
+ImprovePointing = 0
+
+Instead of Conditions a grid of all combinations of distances and sizes can be given:
+Distances = 100,150,200,250
+Sizes = 10,25,50,75
+The optional Order (fixed, latin or balanced, see trial_design.py) defaults to fixed for a Conditions list
+and to balanced for a grid.
+"""
+
+""" setup json file format:
+{
+"UserID" : "1",
+"Conditions": "100,10;100,25;250,75;100,50;250,50;100,75;250,25;150,10;250,10;150,25;200,75;150,50;200,50;150,75;200,25;
+              200,10",
+"ImprovePointing": "0"
+}
+or with "Distances", "Sizes" and "Order" like the ini file
+"""
+
+
+LOG_FIELDS = ["timestamp (ISO)", "user_id", "trial", "target_distance", "target_size",
+              "movement_time (ms)", "click_offset_x", "click_offset_y",
+              "number_of_errors", "improved_pointing"]
+
+
+def make_log_record(timestamp, user_id, trial, distance, size, time, click_offset, errors, improved_pointing):
+    """
+        Builds a single row of the trial log
+        Shared by the experiment model and the headless simulation so both produce the same records
+
+        @return: A dictionary mapping every name in LOG_FIELDS to its value
+    """
+    return {"timestamp (ISO)": timestamp, "user_id": user_id,
+            "trial": trial, "target_distance": distance,
+            "target_size": size, "movement_time (ms)": time,
+            "click_offset_x": click_offset[0], "click_offset_y": click_offset[1],
+            "number_of_errors": errors, "improved_pointing": improved_pointing
+            }
+
+
+class PointingExperimentModel(object):
+    """
+        This experiment model keeps track of all information concerning a pointing test.
+        The experiment settings are given via instantiation parameters and the trial order is a TrialDesign,
+        counterbalanced by the user's ID unless the order is fixed.
+        Further all information are logged to stdout and stored in a file in csv format.
+        Logging happens on a background thread, close() has to be called to flush all records at the end.
+        Every record carries the trial's cursor trajectory under the key "trajectory".
+        Per-condition results are kept up to date in statistics (a SessionStatistics) with every click and
+        written to user<ID>.summary.json by close().
+
+        @param user_id: ID for the user participating
+        @param conditions: A list containing all conditions for this test or a ConditionGrid
+        @param improve_pointing: Whether the improved pointing technique should be used or the standard one
+        @param repetitions: Indicates how often all trials should be repeated
+        @param columnar_output: Whether the records are additionally stored as typed columns in user<ID>.npz,
+                                with the session's seed in the column session_seed
+        @param first_trial: Index of the first trial to run, used to resume a session
+        @param instrument: Whether the latency of the input -> frame cycle is measured and logged per trial
+        @param journal: A SessionJournal, an unfinished session of the same setup found in it is resumed
+        @param seed: Seed of the session's trial plan, random if None (a resumed session keeps its seed)
+        @param collector: Address of a LogCollector the records are also sent to, "host:port" or a Unix socket path
+        @param order: Order of the conditions inside every repetition, "fixed", "latin" or "balanced"
+    """
+
+    def __init__(self, user_id, conditions, improve_pointing, repetitions=4, columnar_output=False, first_trial=0,
+                 instrument=False, journal=None, seed=None, collector=None, order="fixed"):
+        self.start_time_ns = None
+        self.instrumentation = instrumentation.Instrumentation() if instrument else None
+        self.log_fields = LOG_FIELDS + (instrumentation.log_fields() if instrument else [])
+        self.trajectory = TrajectoryRecorder()
+        self.statistics = SessionStatistics()
+        self.user_id = user_id
+        self.conditions = conditions
+        self.improve_pointing = improve_pointing
+        self.repetitions = repetitions
+        self.columnar_output = columnar_output
+        self.collector = collector
+        self.order = order
+        self.init_trials(conditions, repetitions)
+
+        self.elapsed = first_trial
+        self.errors = 0
+        self.mouse_moving = False
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.journal = journal
+        resumed = self.init_journal() if journal is not None else False
+        self.init_logging()
+        if resumed:
+            # records still queued for the logs when the session crashed are only in the journal
+            self.writer.restore(self.journal.records())
+
+    ''' Initializes the order of the single trials
+        The trials are a TrialDesign, which computes the condition of a trial when it is needed
+    '''
+
+    def init_trials(self, conditions, repetitions):
+        self.trials = TrialDesign(conditions, repetitions, self.order, participant_number(self.user_id))
+        print(self.trials)
+
+    ''' Resumes the unfinished session found in the journal or starts a new one in it
+        A resumed session continues with the journaled seed, trial and error count, the trial design is part of
+        the setup that has to match. The statistics come from the journal's last checkpoint and the trials after it.
+
+        @return: Whether a session was resumed
+    '''
+
+    def init_journal(self):
+        info = {"user_id": str(self.user_id), "design": self.trials.to_dict(),
+                "improve_pointing": self.improve_pointing}
+        state = self.journal.recover(info, self.statistics)
+        if state is None:
+            self.statistics = SessionStatistics()
+            self.journal.start(info, self.seed, self.statistics)
+            return False
+        self.seed = state["seed"]
+        self.elapsed = state["elapsed"]
+        self.errors = state["errors"]
+        sys.stderr.write("Resuming the session of user %s at trial %d of %d\n"
+                         % (self.user_id, self.elapsed, len(self.trials)))
+        return True
+
+    ''' Initialize experiment logging
+        Creates a new csv file and writes the corresponding header line
+        Records are written to the csv file and stdout by a background writer
+        With instrumentation the latency percentiles are added as extra columns
+        With a collector address the records are additionally sent to the LogCollector (log_collector.py)
+    '''
+
+    def init_logging(self):
+        sinks = [CsvSink("user" + str(self.user_id) + ".csv", self.log_fields), StdoutSink(self.log_fields)]
+        if self.columnar_output:
+            import columnar_log
+            schema = columnar_log.LOG_SCHEMA + columnar_log.SESSION_SCHEMA + [
+                (name, "d") for name in self.log_fields[len(LOG_FIELDS):]]
+            sinks.append(columnar_log.NpzSink("user" + str(self.user_id) + ".npz", schema))
+        if self.collector is not None:
+            import log_collector
+            sinks.append(log_collector.NetworkSink(self.collector, self.log_fields))
+        self.writer = AsyncTrialWriter(sinks)
+
+    ''' Writes all pending log records and the session summary and closes the log file and the journal'''
+
+    def close(self):
+        if self.writer.closed:
+            return
+        if self.statistics.n:
+            extra = None
+            if self.instrumentation is not None:
+                extra = {"latency": self.instrumentation.session_summary()}
+            self.statistics.save("user" + str(self.user_id) + ".summary.json", extra)
+        if self.journal is not None:
+            self.journal.close(finished=self.elapsed >= len(self.trials))
+        self.writer.close()
+
+    ''' Helper for getting the current [distance, diameter] tuple representing the current trial's settings'''
+
+    def current_trial(self):
+        if self.elapsed >= len(self.trials):
+            return None
+        else:
+            return Trial(*self.trials[self.elapsed])
+
+    ''' Tells the model that the correct target has been hit
+        Updates the current target to the next one and triggers writing the trial results to the csv file
+    '''
+
+    def register_click(self, target_pos, click_pos):
+        click_offset = (target_pos[0] - click_pos[0], target_pos[1] - click_pos[1])
+        record = self.log_time(self.stop_measurement(), click_offset)
+        self.statistics.add(record)
+        if self.journal is not None:
+            self.journal.trial(self.elapsed, record)
+        self.trajectory.reset()
+        self.errors = 0
+        self.elapsed += 1
+
+    ''' Adds a cursor sample to the current trial's trajectory
+
+        @param pos_x: Mouse position on the X-Axis
+        @param pos_y: Mouse position on the Y-Axis
+        @param hovered: Number of targets currently under the cursor
+        @param t_ns: Time of the sample (time.monotonic_ns()), now if not given
+    '''
+
+    def record_sample(self, pos_x, pos_y, hovered, t_ns=None):
+        self.trajectory.record(pos_x, pos_y, hovered, t_ns)
+
+    ''' Writes all useful trial information to the log csv file
+
+        @return: The log record
+    '''
+
+    def log_time(self, time, click_offset):
+        distance, diameters = self.current_trial().get_current_condition()
+        current_values = make_log_record(self.timestamp(), self.user_id, self.elapsed, distance, diameters, time,
+                                         click_offset, self.errors, self.improve_pointing)
+        current_values["trajectory"] = self.trajectory.snapshot()
+        current_values["session_seed"] = self.seed
+        if self.instrumentation is not None:
+            current_values.update(self.instrumentation.trial_summary())
+        self.writer.put(current_values)
+        return current_values
+
+    ''' Tells the model to start the timer and that the mouse is moving
+        Uses the monotonic nanosecond clock, the same clock the trajectory samples are stamped with
+    '''
+
+    def start_measurement(self):
+        if not self.mouse_moving:
+            self.start_time_ns = time.monotonic_ns()
+            self.mouse_moving = True
+
+    ''' Stops counting the time because the mouse is not moving anymore.
+        Returns the elapsed time for the current trial in ms
+    '''
+
+    def stop_measurement(self):
+        if self.mouse_moving:
+            elapsed = self.elapsed_time()
+            self.mouse_moving = False
+            return elapsed
+        else:
+            return -1
+
+    ''' Returns the time in ms since the measurement was last started, 0 if it never was
+        Fractions of a millisecond are kept with microsecond resolution
+    '''
+
+    def elapsed_time(self):
+        if self.start_time_ns is None:
+            return 0
+        return round((time.monotonic_ns() - self.start_time_ns) / 1000000, 3)
+
+    ''' Returns a timestamp in ISO format (local time, seconds precision)'''
+
+    def timestamp(self):
+        return datetime.datetime.now().replace(microsecond=0).isoformat()
+
+    ''' Helper to increment the error count for the current trial'''
+
+    def increment_error_count(self, amount):
+        self.errors += amount
+        if self.journal is not None:
+            self.journal.error(self.elapsed, self.errors)
+
+
+class Trial:
+    """
+        Stores the settings for a single trial of the experiment
+
+        @param distance: The distance between target and cursor
+        @param diameter: The size of the target to hit
+    """
+
+    def __init__(self, distance, diameter):
+        self.distance = distance
+        self.diameter = diameter
+
+    ''' Helper for accessing this trial's settings'''
+
+    def get_current_condition(self):
+        return self.distance, self.diameter
+
+
+def parse_ini_file(filename):
+    """
+        Reads the information from a ini file
+
+        @return: Integer with the user's id; a list with all conditions (distance, size) for this test or a
+                ConditionGrid; Boolean indicating whether the improved pointing technique should be used or not;
+                the order of the conditions
+    """
+    config = configparser.ConfigParser()
+    config.read(filename)
+    if 'experiment_setup' in config:
+        setup = config['experiment_setup']
+        user_id = setup['UserID']
+        conditions, order = parse_design(setup)
+        improve_pointing = bool(int(setup['ImprovePointing']))
+    else:
+        print("Error: wrong file format.")
+        sys.exit(1)
+    return user_id, conditions, improve_pointing, order
+
+
+def parse_json_file(filename):
+    """
+        Reads the information from a json file
+
+        @return: Integer with the user's id; a list with all conditions (distance, size) for this test or a
+                 ConditionGrid; Boolean indicating whether the improved pointing technique should be used or not;
+                 the order of the conditions
+    """
+    setup = json.load(open(filename))
+    if "UserID" not in setup or ("Conditions" not in setup and "Distances" not in setup):
+        print("Error: wrong file format.")
+        sys.exit(1)
+    user_id = setup["UserID"]
+    conditions, order = parse_design(setup)
+    improve_pointing = bool(int(setup["ImprovePointing"]))
+    return user_id, conditions, improve_pointing, order
+
+
+def parse_design(setup):
+    """
+        Reads the conditions and their order from the setup section of an ini file or a json setup
+        Either Conditions ("distance,size;distance,size;...") or Distances and Sizes (comma separated) are given
+
+        @return: A list of (distance, size) tuples or a ConditionGrid; the order
+    """
+    if "Conditions" in setup:
+        conditions_string = setup['Conditions']
+        # inspired by: https://stackoverflow.com/questions/9763116/parse-a-tuple-from-a-string
+        conditions = [tuple(map(int, x.split(","))) for x in conditions_string.split(";")]
+        default_order = "fixed"
+    elif "Distances" in setup and "Sizes" in setup:
+        conditions = ConditionGrid([int(x) for x in setup["Distances"].split(",")],
+                                   [int(x) for x in setup["Sizes"].split(",")])
+        default_order = "balanced"
+    else:
+        print("Error: wrong file format.")
+        sys.exit(1)
+    order = setup.get("Order", default_order).strip().lower()
+    if order not in ORDERS:
+        print("Error: unknown order %s." % order)
+        sys.exit(1)
+    return conditions, order
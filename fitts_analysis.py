@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+
+
+import sys
+
+import numpy as np
+import pandas
+
+"""
+FITTS' LAW ANALYSIS
+Computes the usual pointing performance measures for any number of users, conditions and pointing techniques
+with grouped, vectorized pandas operations instead of one boolean mask per user and technique:
+
+    data = load_data("data.csv")
+    conditions = condition_summary(data)      # one row per user, technique, distance and size
+    throughput(conditions)                    # mean throughput per user and technique
+    fitts_regression(conditions)              # MT = a + b * IDe per user and technique
+
+Index of difficulty:    ID  = log2(D / W + 1)
+Effective width:        We  = 4.133 * SD, SD is the bivariate spread of the click offsets sqrt(var(x) + var(y))
+Effective ID:           IDe = log2(D / We + 1)
+Throughput:             TP  = IDe / MT (bits/s)
+
+usage: python3 fitts_analysis.py [data.csv | log.npz]
+"""
+
+MOVEMENT_TIME = 'movement_time (ms)'
+NUMBER_ERRORS = 'number_of_errors'
+GROUP_COLUMNS = ['user_id', 'improved_pointing']
+CONDITION_COLUMNS = ['target_distance', 'target_size']
+COLUMNS = ['user_id', 'trial', 'target_distance', 'target_size', MOVEMENT_TIME, 'click_offset_x',
+           'click_offset_y', NUMBER_ERRORS, 'improved_pointing']
+
+
+''' Loads a merged csv log or a columnar .npz log and keeps only the columns needed for the analysis'''
+
+
+def load_data(filename):
+    if filename.endswith('.npz'):
+        import columnar_log
+        data = pandas.DataFrame(columnar_log.load_columns(filename, COLUMNS))
+    else:
+        data = pandas.read_csv(filename, delimiter=';', usecols=COLUMNS)
+    # drop header lines repeated inside appended logs and failed measurements
+    data = data[data['trial'].astype(str) != 'trial']
+    data = data.astype({'target_distance': float, 'target_size': float, MOVEMENT_TIME: float,
+                        'click_offset_x': float, 'click_offset_y': float, NUMBER_ERRORS: int})
+    data['improved_pointing'] = data['improved_pointing'].astype(str).str.lower().isin(['true', '1'])
+    return data[data[MOVEMENT_TIME] >= 0]
+
+
+''' Summarizes every condition of every group in a single grouped pass
+
+    @param data: Trial data as returned by load_data
+    @param by: Columns identifying a group, user and technique by default
+
+    @return: DataFrame with one row per group and condition
+'''
+
+
+def condition_summary(data, by=GROUP_COLUMNS):
+    keys = list(by) + CONDITION_COLUMNS
+    grouped = data.groupby(keys, sort=True)
+    summary = grouped.agg(trials=(MOVEMENT_TIME, 'size'),
+                          mean_mt=(MOVEMENT_TIME, 'mean'),
+                          median_mt=(MOVEMENT_TIME, 'median'),
+                          errors=(NUMBER_ERRORS, 'sum'),
+                          var_x=('click_offset_x', 'var'),
+                          var_y=('click_offset_y', 'var')).reset_index()
+    summary['error_rate'] = summary['errors'] / (summary['errors'] + summary['trials'])
+    summary['id'] = np.log2(summary['target_distance'] / summary['target_size'] + 1)
+    summary['we'] = 4.133 * np.sqrt(summary['var_x'].fillna(0) + summary['var_y'].fillna(0))
+    # a single trial or identical offsets give no spread, fall back to the nominal width
+    summary['we'] = summary['we'].where(summary['we'] > 0, summary['target_size'])
+    summary['ide'] = np.log2(summary['target_distance'] / summary['we'] + 1)
+    summary['throughput'] = summary['ide'] / (summary['mean_mt'] / 1000)
+    return summary.drop(columns=['var_x', 'var_y'])
+
+
+''' Mean of the condition throughputs per group (bits/s)'''
+
+
+def throughput(summary, by=GROUP_COLUMNS):
+    return summary.groupby(list(by))['throughput'].mean()
+
+
+''' Fits MT = a + b * x per group with a closed-form least squares solution over grouped sums
+
+    @param summary: Result of condition_summary
+    @param by: Columns identifying a group
+    @param x: Predictor column, the effective index of difficulty by default
+
+    @return: DataFrame with intercept (ms), slope (ms/bit), r_squared and the number of conditions per group
+'''
+
+
+def fitts_regression(summary, by=GROUP_COLUMNS, x='ide'):
+    frame = summary[list(by)].copy()
+    frame['x'] = summary[x]
+    frame['y'] = summary['mean_mt']
+    frame['xx'] = frame['x'] * frame['x']
+    frame['xy'] = frame['x'] * frame['y']
+    frame['yy'] = frame['y'] * frame['y']
+    sums = frame.groupby(list(by)).agg(n=('x', 'size'), sx=('x', 'sum'), sy=('y', 'sum'), sxx=('xx', 'sum'),
+                                       sxy=('xy', 'sum'), syy=('yy', 'sum'))
+    n = sums['n']
+    cov = sums['sxy'] - sums['sx'] * sums['sy'] / n
+    var_x = sums['sxx'] - sums['sx'] * sums['sx'] / n
+    var_y = sums['syy'] - sums['sy'] * sums['sy'] / n
+    result = pandas.DataFrame(index=sums.index)
+    result['slope'] = cov / var_x.where(var_x > 0)
+    result['intercept'] = (sums['sy'] - result['slope'] * sums['sx']) / n
+    result['r_squared'] = cov * cov / (var_x * var_y).where(var_x * var_y > 0)
+    result['conditions'] = n
+    return result
+
+
+''' Runs the complete analysis
+
+    @return: A dictionary with the condition summary, throughputs and regressions
+'''
+
+
+def analyze(data, by=GROUP_COLUMNS):
+    summary = condition_summary(data, by)
+    return {"conditions": summary, "throughput": throughput(summary, by),
+            "regression": fitts_regression(summary, by)}
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'data.csv'
+    results = analyze(load_data(filename))
+    with pandas.option_context('display.width', 160, 'display.max_rows', 200):
+        for name in ("conditions", "throughput", "regression"):
+            print("== %s ==" % name)
+            print(results[name])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+
+from PyQt5 import QtCore, QtGui
+
+"""
+FRAME SCHEDULER
+High polling rate mice deliver several move events per display frame. The scheduler runs the (expensive)
+callback doing hit-testing and repainting once per frame, so the render cost no longer depends on the input
+rate. The callback still gets every raw sample of the frame with the time it arrived, the newest one last,
+so the caller can record the complete path.
+"""
+
+
+class FrameScheduler(QtCore.QObject):
+    """
+        Coalesces cursor samples and runs a callback at most once per frame tick
+
+        @param callback: Function taking a list of (pos_x, pos_y, t_ns) samples, called once per frame with all
+                         samples that arrived since the last call
+        @param interval_ms: Length of a frame, defaults to the primary screen's refresh interval
+        @param parent: Parent QObject
+    """
+
+    DEFAULT_REFRESH_RATE = 60
+
+    def __init__(self, callback, interval_ms=None, parent=None):
+        super(FrameScheduler, self).__init__(parent)
+        self.callback = callback
+        if interval_ms is None:
+            interval_ms = 1000 / self.refresh_rate()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(max(1, int(interval_ms)))
+        self.timer.timeout.connect(self.tick)
+        self.pending = []
+
+    ''' Returns the refresh rate of the primary screen in Hz'''
+
+    def refresh_rate(self):
+        screen = QtGui.QGuiApplication.primaryScreen()
+        if screen is None or screen.refreshRate() <= 0:
+            return self.DEFAULT_REFRESH_RATE
+        return screen.refreshRate()
+
+    ''' Schedules a sample for the next frame tick
+
+        @param pos_x: New mouse position on the X-Axis
+        @param pos_y: New mouse position on the Y-Axis
+        @param t_ns: Time the sample arrived
+    '''
+
+    def submit(self, pos_x, pos_y, t_ns=None):
+        self.pending.append((pos_x, pos_y, t_ns))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    ''' Runs the callback for the pending samples
+        The timer is stopped after a frame without new samples so an idle cursor costs nothing
+    '''
+
+    def tick(self):
+        if not self.pending:
+            self.timer.stop()
+            return
+        self.flush()
+
+    ''' Immediately runs the callback for the pending samples, e.g. before a click is processed'''
+
+    def flush(self):
+        if self.pending:
+            samples = self.pending
+            self.pending = []
+            self.callback(samples)
+
+    ''' Drops the pending samples without running the callback'''
+
+    def discard(self):
+        self.pending = []
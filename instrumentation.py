@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+
+import array
+import time
+
+"""
+LATENCY INSTRUMENTATION
+Opt-in timing of the phases of the experiment's input -> frame cycle:
+
+    event_to_frame  from the first mouse move event not yet shown to the end of the paintEvent showing it
+    hit_test        get_target_ids_under_cursor() while processing a move
+    draw_targets    drawTargets() inside paintEvent
+    draw_pointer    draw_pointer() inside paintEvent
+
+Timings go into fixed-size log-linear histograms (a few KB per phase, no matter how long a trial takes).
+At the end of every trial the p50, p95 and max of each phase are attached to the trial's log row, so trials
+whose movement time was contaminated by rendering stalls can be excluded in the analysis. The percentiles over
+all trials of the session are added to the session summary (user<ID>.summary.json).
+"""
+
+PHASES = ["event_to_frame", "hit_test", "draw_targets", "draw_pointer"]
+STATISTICS = [("p50", 50), ("p95", 95), ("max", 100)]
+
+
+class LatencyHistogram(object):
+    """
+        Fixed-size histogram of durations in nanoseconds
+        Values below 2^SUB_BITS ns get their own bucket, larger values share buckets whose width
+        grows with the value, so every bucket is at most 1 / 2^(SUB_BITS - 1) (about 3%) wide relative to its values.
+        Values above 2^MAX_BITS ns (about 69 s) are counted in the last bucket, the exact maximum is kept separately.
+    """
+
+    SUB_BITS = 6
+    MAX_BITS = 36
+
+    def __init__(self):
+        self.half = 1 << (self.SUB_BITS - 1)
+        self.counts = array.array('q', bytes(8 * (self.bucket((1 << self.MAX_BITS) - 1) + 1)))
+        self.count = 0
+        self.max = 0
+
+    ''' Returns the bucket index of a value'''
+
+    def bucket(self, value):
+        exponent = max(value.bit_length() - self.SUB_BITS, 0)
+        return exponent * self.half + (value >> exponent)
+
+    ''' Returns the value in the middle of a bucket'''
+
+    def bucket_value(self, index):
+        if index < 2 * self.half:
+            return index
+        exponent = index // self.half - 1
+        mantissa = index - exponent * self.half
+        return ((2 * mantissa + 1) << exponent) // 2
+
+    ''' Adds a duration in nanoseconds'''
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self.counts[min(self.bucket(value), len(self.counts) - 1)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    ''' Returns the given percentile in nanoseconds, exact for 100, None if nothing was recorded'''
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        if percent >= 100:
+            return self.max
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    ''' Adds all values of another histogram'''
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.count = 0
+        self.max = 0
+
+
+''' Returns the names of the log columns added by the instrumentation, in microseconds'''
+
+
+def log_fields():
+    return ["%s_%s (us)" % (phase, name) for phase in PHASES for name, percent in STATISTICS]
+
+
+class Instrumentation(object):
+    """
+        Collects the phase timings of the current trial and of the whole session
+
+        Usage inside the widget:
+            start = instrumentation.clock()
+            ...
+            instrumentation.record("draw_targets", start)
+    """
+
+    def __init__(self):
+        self.clock = time.perf_counter_ns
+        self.trial = {phase: LatencyHistogram() for phase in PHASES}
+        self.session = {phase: LatencyHistogram() for phase in PHASES}
+        self.pending_event = None
+
+    ''' Records the time passed since start for the given phase'''
+
+    def record(self, phase, start):
+        self.trial[phase].record(self.clock() - start)
+
+    ''' Remembers the arrival of an input event, only the oldest event not yet shown on screen counts'''
+
+    def event_received(self):
+        if self.pending_event is None:
+            self.pending_event = self.clock()
+
+    ''' Records the latency of the pending input event once a frame has been drawn'''
+
+    def frame_presented(self):
+        if self.pending_event is not None:
+            self.record("event_to_frame", self.pending_event)
+            self.pending_event = None
+
+    ''' Summarizes the current trial and starts the next one
+
+        @return: A dictionary mapping the names of log_fields() to the percentiles in microseconds
+                 (None for phases without measurements)
+    '''
+
+    def trial_summary(self):
+        summary = {}
+        for phase in PHASES:
+            histogram = self.trial[phase]
+            for name, percent in STATISTICS:
+                value = histogram.percentile(percent)
+                summary["%s_%s (us)" % (phase, name)] = None if value is None else round(value / 1000, 1)
+            self.session[phase].merge(histogram)
+            histogram.reset()
+        return summary
+
+    ''' Summarizes all trials of the session so far
+
+        @return: A dictionary mapping every phase to its number of measurements and percentiles in microseconds
+    '''
+
+    def session_summary(self):
+        summary = {}
+        for phase in PHASES:
+            histogram = self.session[phase]
+            summary[phase] = {"count": histogram.count}
+            for name, percent in STATISTICS:
+                value = histogram.percentile(percent)
+                summary[phase][name + " (us)"] = None if value is None else round(value / 1000, 1)
+        return summary
@@ -0,0 +1,380 @@
+#!/usr/bin/python3
+
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import instrumentation
+from experiment_model import LOG_FIELDS
+from trial_logger import RECORD_KEY_FIELDS, record_key
+
+"""
+MULTI-STATION LOG COLLECTION
+Lab stations running the experiment at the same time can send their trial records to one collector, which
+writes them into a single merged csv file (the same format log_ingest.py produces from copied logs).
+Each station keeps writing its local user<ID>.csv as before. The network sink is an additional trial logger sink.
+
+Protocol: every message is a 4-byte big-endian length followed by that many bytes of utf-8 json.
+    station -> collector   {"type": "hello", "station": name, "fields": [...]}     once per connection
+    station -> collector   {"type": "batch", "seq": n, "records": [{...}, ...]}
+    collector -> station   {"type": "ack", "seq": n}                               after the batch is on disk
+Batches are written and synced to disk by a single writer thread, one after the other in the order they arrived,
+so the event loop keeps serving the other stations while a batch is synced.
+A station sends its next batch only after the previous one was acknowledged. Records that were not acknowledged
+are sent again after a reconnect, so the collector drops records it already stored. A record is identified by
+its user, trial and timestamp (KEY_FIELDS), and a restarted collector reads the keys back from its store.
+
+Addresses are host:port for TCP or a file system path for a Unix socket. Everything runs on localhost, too:
+
+    python3 log_collector.py -o data.csv --tcp 127.0.0.1:9500 --unix /tmp/pointing.sock
+    python3 pointing_experiment.py --collector=127.0.0.1:9500 setup.ini
+
+usage: python3 log_collector.py [-o data.csv] [--tcp HOST:PORT] [--unix PATH]
+"""
+
+KEY_FIELDS = RECORD_KEY_FIELDS
+MAX_MESSAGE = 16 * 1024 * 1024
+HEADER = struct.Struct(">I")
+
+
+''' Parses an address given on the command line
+
+    @param address: "host:port" for TCP, a path (containing a "/") for a Unix socket
+
+    @return: A (host, port) tuple or the path
+'''
+
+
+def parse_address(address):
+    if "/" in address:
+        return address
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        raise ValueError("%s is neither host:port nor a socket path" % address)
+    return host or "127.0.0.1", int(port)
+
+
+''' Serializes a message into a length-prefixed frame'''
+
+
+def encode_message(message):
+    payload = json.dumps(message, default=str).encode("utf-8")
+    if len(payload) > MAX_MESSAGE:
+        raise ValueError("message of %d bytes exceeds the limit of %d bytes" % (len(payload), MAX_MESSAGE))
+    return HEADER.pack(len(payload)) + payload
+
+
+''' Decodes the payload of a frame, the length has to be checked before reading it'''
+
+
+def decode_message(payload):
+    message = json.loads(payload.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("message is not a json object")
+    return message
+
+
+''' Reads exactly length bytes from a blocking socket'''
+
+
+def receive_exactly(connection, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by the collector")
+        data.extend(chunk)
+    return bytes(data)
+
+
+''' Reads one message from a blocking socket'''
+
+
+def receive_message(connection):
+    length, = HEADER.unpack(receive_exactly(connection, HEADER.size))
+    if length > MAX_MESSAGE:
+        raise ValueError("message of %d bytes exceeds the limit of %d bytes" % (length, MAX_MESSAGE))
+    return decode_message(receive_exactly(connection, length))
+
+
+class NetworkSink(object):
+    """
+        Trial logger sink sending records to a LogCollector
+        Records are queued and sent in batches by a background thread, which connects on demand and reconnects with
+        an increasing delay whenever the connection fails, so the experiment never waits for the network.
+        At most max_pending records are queued, write_rows() blocks the (background) log writer beyond that.
+
+        @param address: Address of the collector, "host:port" or a Unix socket path
+        @param fields: The names of the columns that are sent
+        @param station: Name of this station, host name and process ID by default
+        @param batch_size: Maximum number of records per message
+        @param max_pending: Maximum number of records waiting for their acknowledgment
+        @param timeout: Time in seconds a connection attempt or an acknowledgment may take
+        @param close_timeout: Time in seconds close() waits for the remaining records to be delivered
+    """
+
+    RETRY_DELAYS = (0.2, 5.0)
+
+    def __init__(self, address, fields, station=None, batch_size=64, max_pending=10000, timeout=10.0,
+                 close_timeout=5.0):
+        self.address = parse_address(address)
+        self.fields = fields
+        self.station = station or "%s:%d" % (socket.gethostname(), os.getpid())
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.close_timeout = close_timeout
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.connection = None
+        self.sequence = 0
+        self.closing = False
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="NetworkSink", daemon=True)
+        self.thread.start()
+
+    def write_rows(self, rows):
+        with self.condition:
+            for row in rows:
+                while len(self.pending) >= self.max_pending and not self.closed:
+                    self.condition.wait()
+                self.pending.append({field: row.get(field) for field in self.fields})
+            self.condition.notify_all()
+
+    ''' Records are delivered by the background thread, close() waits for them'''
+
+    def flush(self):
+        pass
+
+    ''' Returns all given records, the collector drops the ones it already stored'''
+
+    def missing_records(self, records):
+        return list(records)
+
+    ''' Waits up to close_timeout seconds until all records are acknowledged and stops the sender thread'''
+
+    def close(self):
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join(self.close_timeout)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            if self.pending:
+                sys.stderr.write("%d trial records were not delivered to the collector at %s, "
+                                 "they are only in the local log\n" % (len(self.pending), self.address))
+
+    ''' Main loop of the sender thread'''
+
+    def run(self):
+        delay = self.RETRY_DELAYS[0]
+        reported = False
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if self.closed or not self.pending:
+                    break
+            try:
+                if self.connection is None:
+                    self.connect()
+                self.send_batch()
+                delay = self.RETRY_DELAYS[0]
+                reported = False
+            except (OSError, ValueError) as error:
+                self.disconnect()
+                if not reported:
+                    sys.stderr.write("Collector at %s unavailable (%s), retrying\n" % (self.address, error))
+                    reported = True
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed, delay)
+                delay = min(2 * delay, self.RETRY_DELAYS[1])
+        self.disconnect()
+
+    def connect(self):
+        if isinstance(self.address, tuple):
+            connection = socket.create_connection(self.address, self.timeout)
+        else:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.address)
+            except OSError:
+                connection.close()
+                raise
+        self.connection = connection
+        self.connection.sendall(encode_message({"type": "hello", "station": self.station, "fields": self.fields}))
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    ''' Sends the oldest pending records and removes them once the collector acknowledged them'''
+
+    def send_batch(self):
+        with self.condition:
+            batch = list(itertools.islice(self.pending, self.batch_size))
+        self.sequence += 1
+        self.connection.sendall(encode_message({"type": "batch", "seq": self.sequence, "records": batch}))
+        reply = receive_message(self.connection)
+        if reply.get("type") != "ack" or reply.get("seq") != self.sequence:
+            raise ValueError("unexpected reply %r" % reply)
+        with self.condition:
+            for _ in batch:
+                self.pending.popleft()
+            self.condition.notify_all()
+
+
+class LogCollector(object):
+    """
+        Asyncio service receiving trial records from many stations and storing each record once
+
+        @param store_filename: The merged csv file, records are appended if it exists
+        @param fields: The columns of a new store, all columns the experiment can log by default
+    """
+
+    def __init__(self, store_filename, fields=None):
+        self.store_filename = store_filename
+        self.fields = fields or LOG_FIELDS + instrumentation.log_fields()
+        self.seen = set()
+        self.load_store()
+        self.store = open(store_filename, "a", newline="")
+        self.out = csv.DictWriter(self.store, self.fields, delimiter=";", quoting=csv.QUOTE_ALL,
+                                  extrasaction="ignore")
+        if self.store.tell() == 0:
+            self.out.writeheader()
+        self.store_writer = concurrent.futures.ThreadPoolExecutor(1, "LogCollectorStore")
+        self.servers = []
+        self.stations = 0
+        self.records = 0
+        self.duplicates = 0
+
+    ''' Reads the keys of the records already in the store, an existing store keeps its columns'''
+
+    def load_store(self):
+        if not os.path.exists(self.store_filename):
+            return
+        with open(self.store_filename, newline="") as store:
+            reader = csv.DictReader(store, delimiter=";")
+            if reader.fieldnames:
+                self.fields = reader.fieldnames
+            for row in reader:
+                self.seen.add(self.key(row))
+
+    ''' Returns the key identifying a record, values are compared as they appear in the csv file'''
+
+    def key(self, record):
+        return record_key(record)
+
+    async def start_tcp(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        self.servers.append(server)
+        return server
+
+    async def start_unix(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        self.servers.append(server)
+        return server
+
+    ''' Serves a single station until it disconnects'''
+
+    async def handle(self, reader, writer):
+        station = writer.get_extra_info("peername") or "unix socket"
+        self.stations += 1
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                length, = HEADER.unpack(header)
+                if length > MAX_MESSAGE:
+                    raise ValueError("message of %d bytes exceeds the limit of %d bytes" % (length, MAX_MESSAGE))
+                message = decode_message(await reader.readexactly(length))
+                if message.get("type") == "hello":
+                    station = message.get("station", station)
+                elif message.get("type") == "batch":
+                    await asyncio.get_running_loop().run_in_executor(self.store_writer, self.store_records,
+                                                                     message["records"])
+                    writer.write(encode_message({"type": "ack", "seq": message["seq"]}))
+                    await writer.drain()
+                else:
+                    raise ValueError("unknown message type %r" % message.get("type"))
+        except (OSError, ValueError, KeyError, asyncio.IncompleteReadError) as error:
+            sys.stderr.write("Dropping station %s: %s\n" % (station, error))
+        finally:
+            self.stations -= 1
+            writer.close()
+
+    ''' Appends the records not stored yet and syncs the store, so an acknowledged batch survives a crash
+        Runs on the store_writer thread, which is the only one touching the store and the keys of stored records
+    '''
+
+    def store_records(self, records):
+        for record in records:
+            key = self.key(record)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            self.out.writerow(record)
+            self.records += 1
+        self.store.flush()
+        os.fsync(self.store.fileno())
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(None, self.store_writer.shutdown)
+        self.store.close()
+
+
+async def serve(collector, tcp, unix):
+    if tcp is not None:
+        await collector.start_tcp(*parse_address(tcp))
+    if unix is not None:
+        await collector.start_unix(unix)
+    start = time.monotonic()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            sys.stderr.write("%d stations connected, %d records stored, %d duplicates dropped in %d s\n"
+                             % (collector.stations, collector.records, collector.duplicates,
+                                time.monotonic() - start))
+    finally:
+        await collector.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collects the trial records of many stations into one csv file")
+    parser.add_argument("-o", "--output", default="data.csv")
+    parser.add_argument("--tcp", help="HOST:PORT to listen on (default: 127.0.0.1:9500 if --unix is not given)")
+    parser.add_argument("--unix", help="Unix socket path to listen on")
+    args = parser.parse_args()
+    if args.tcp is None and args.unix is None:
+        args.tcp = "127.0.0.1:9500"
+    collector = LogCollector(args.output)
+    try:
+        asyncio.run(serve(collector, args.tcp, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
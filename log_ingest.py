@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+"""
+LOG INGESTION
+Merges the per-session logs (user<ID>.csv) written by PointingExperimentModel into one data.csv that the
+analysis notebook reads. For every log the byte offset up to which it has been merged is remembered in a
+small state file, so each run only reads the rows appended since the last one. Header lines repeated inside
+a log are dropped. If a log was truncated or rewritten (detected by a checksum over its first bytes),
+the merged file is rebuilt from scratch.
+Logs may have different columns (e.g. with and without instrumentation): every row is read with the header of
+its own log and written under the merged header, the union of all columns, leaving the columns its log does not
+have empty. A log bringing new columns extends the merged header, which rewrites the merged file once.
+
+usage: python3 log_ingest.py [-d log directory] [-o data.csv] [--watch SECONDS]
+"""
+
+HEADER_START = "timestamp (ISO)"
+HEAD_BYTES = 1024
+
+
+class LogIngestor(object):
+    """
+        Incrementally appends the rows of many csv logs to a single merged csv file
+
+        @param pattern: Glob pattern selecting the per-session logs
+        @param merged_filename: The merged csv file
+        @param state_filename: Json file keeping the ingestion offsets, next to the merged file by default
+    """
+
+    def __init__(self, pattern, merged_filename, state_filename=None):
+        self.pattern = pattern
+        self.merged_filename = merged_filename
+        self.state_filename = state_filename or merged_filename + ".ingest.json"
+        self.state = self.load_state()
+
+    ''' Reads the offsets of the previous run, or starts with an empty state'''
+
+    def load_state(self):
+        if not os.path.exists(self.state_filename) or not os.path.exists(self.merged_filename):
+            return {"header": None, "files": {}}
+        with open(self.state_filename) as state_file:
+            return json.load(state_file)
+
+    ''' Atomically replaces the state file'''
+
+    def save_state(self):
+        temp_name = self.state_filename + ".tmp"
+        with open(temp_name, "w") as state_file:
+            json.dump(self.state, state_file, indent=1)
+        os.replace(temp_name, self.state_filename)
+
+    ''' Helper calculating the checksum over the first bytes of a file'''
+
+    def head_checksum(self, filename, length):
+        with open(filename, "rb") as logfile:
+            return hashlib.sha1(logfile.read(length)).hexdigest()
+
+    ''' Checks whether a log still starts with the bytes that were ingested earlier'''
+
+    def is_unchanged(self, filename, entry):
+        if os.path.getsize(filename) < entry["offset"]:
+            return False
+        return self.head_checksum(filename, entry["head_length"]) == entry["head_checksum"]
+
+    ''' Ingests all new rows of all logs matching the pattern
+
+        @return: The number of rows appended to the merged file
+    '''
+
+    def ingest(self):
+        filenames = sorted(name for name in glob.glob(self.pattern)
+                           if os.path.abspath(name) != os.path.abspath(self.merged_filename))
+        for filename in filenames:
+            entry = self.state["files"].get(filename)
+            if entry is not None and not self.is_unchanged(filename, entry):
+                sys.stderr.write("%s was rewritten, rebuilding %s\n" % (filename, self.merged_filename))
+                return self.rebuild()
+        records = []
+        for filename in filenames:
+            records.extend(self.ingest_file(filename))
+        header = list(self.state["header"] or [])
+        new_fields = [field for record in records for field in record if field not in header]
+        if new_fields:
+            for field in new_fields:
+                if field not in header:
+                    header.append(field)
+            self.extend_merged_header(header)
+        with open(self.merged_filename, "a", newline="") as merged:
+            out = csv.DictWriter(merged, header, delimiter=";", quoting=csv.QUOTE_ALL, restval="")
+            if merged.tell() == 0:
+                out.writeheader()
+            out.writerows(records)
+            merged.flush()
+            os.fsync(merged.fileno())
+        self.state["header"] = header
+        self.save_state()
+        return len(records)
+
+    ''' Rewrites the merged file under a header with additional columns, the new columns are left empty'''
+
+    def extend_merged_header(self, header):
+        if not os.path.exists(self.merged_filename) or not os.path.getsize(self.merged_filename):
+            return
+        temp_name = self.merged_filename + ".tmp"
+        with open(self.merged_filename, newline="") as merged, open(temp_name, "w", newline="") as extended:
+            out = csv.DictWriter(extended, header, delimiter=";", quoting=csv.QUOTE_ALL, restval="")
+            out.writeheader()
+            out.writerows(csv.DictReader(merged, delimiter=";"))
+            extended.flush()
+            os.fsync(extended.fileno())
+        os.replace(temp_name, self.merged_filename)
+
+    ''' Drops the merged file and the state and ingests all logs again'''
+
+    def rebuild(self):
+        if os.path.exists(self.merged_filename):
+            os.remove(self.merged_filename)
+        self.state = {"header": None, "files": {}}
+        return self.ingest()
+
+    ''' Reads the complete lines written to a log since the last run
+        Rows are read with the last header line of the log, which is kept in the state for the next run.
+        Rows that do not have as many values as the header are skipped with a warning.
+
+        @param filename: The log to read
+
+        @return: A list with one dictionary per new row
+    '''
+
+    def ingest_file(self, filename):
+        entry = self.state["files"].setdefault(filename, {"offset": 0, "head_length": 0, "head_checksum": None})
+        with open(filename, "rb") as logfile:
+            logfile.seek(entry["offset"])
+            data = logfile.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return []
+        records = []
+        skipped = 0
+        header = entry.get("header") or (self.state["header"] if entry["offset"] else None)
+        for row in csv.reader(io.StringIO(data[:end].decode("utf-8"), newline=""), delimiter=";"):
+            if not row:
+                continue
+            if row[0] == HEADER_START:
+                header = entry["header"] = row
+                continue
+            if header is None or len(row) != len(header):
+                skipped += 1
+                continue
+            records.append(dict(zip(header, row)))
+        if skipped:
+            sys.stderr.write("%s: skipped %d rows that do not match the header of the log\n" % (filename, skipped))
+        entry["offset"] += end
+        entry["head_length"] = min(entry["offset"], HEAD_BYTES)
+        entry["head_checksum"] = self.head_checksum(filename, entry["head_length"])
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merges the per-session trial logs into one csv file")
+    parser.add_argument("-d", "--directory", default=".", help="directory containing the user<ID>.csv logs")
+    parser.add_argument("-p", "--pattern", default="user*.csv")
+    parser.add_argument("-o", "--output", default="data.csv")
+    parser.add_argument("--watch", type=float, help="keep running and ingest new rows every SECONDS")
+    args = parser.parse_args()
+    ingestor = LogIngestor(os.path.join(args.directory, args.pattern), args.output)
+    while True:
+        rows = ingestor.ingest()
+        if rows or not args.watch:
+            print("%d new rows merged into %s" % (rows, args.output))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
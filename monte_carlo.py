@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import experiment_model
+import simulation
+from trial_logger import CsvSink
+
+"""
+MONTE CARLO PARTICIPANT SIMULATION
+Simulates many synthetic participants for power analyses before a study is run.
+Every participant gets its own Fitts' law parameters drawn from a population model and runs the complete
+session of the given setup file twice: once with the standard pointing technique and once with the
+improved one. Participants are distributed over a process pool and their records are streamed, in
+participant order, into a csv file with the same columns as the logs of PointingExperimentModel,
+so fitts_analysis.py can be used on the result directly.
+
+An existing output file is only replaced with --overwrite, appending a second run would mix both.
+
+usage: python3 monte_carlo.py <setup file> [-n participants] [-o simulation.csv] [--overwrite] [-j processes]
+                              [--seed N]
+"""
+
+
+class PopulationModel(object):
+    """
+        Distribution of the movement parameters of the simulated participants
+        All parameters are drawn from normal distributions and clipped to plausible minimums.
+
+        @param intercept: Mean and standard deviation of the Fitts' law intercept in ms
+        @param slope: Mean and standard deviation of the Fitts' law slope in ms/bit
+        @param endpoint_spread: Mean and standard deviation of the end point scatter (1.0 = nominal width)
+        @param time_noise: Relative trial-to-trial standard deviation of the movement time
+    """
+
+    def __init__(self, intercept=(200, 40), slope=(150, 30), endpoint_spread=(1.0, 0.15), time_noise=0.1):
+        self.intercept = intercept
+        self.slope = slope
+        self.endpoint_spread = endpoint_spread
+        self.time_noise = time_noise
+
+    ''' Draws the movement model of a single participant'''
+
+    def sample(self, rng):
+        return simulation.FittsMovementModel(intercept=max(50.0, rng.gauss(*self.intercept)),
+                                             slope=max(30.0, rng.gauss(*self.slope)),
+                                             time_noise=self.time_noise,
+                                             endpoint_spread=max(0.3, rng.gauss(*self.endpoint_spread)))
+
+
+''' Simulates both sessions of a single participant
+    Everything is derived from the seed and the participant number, so the result does not depend
+    on which process runs the participant
+
+    @param job: Tuple (participant, conditions, repetitions, seed, population, bubble_cursor, order)
+
+    @return: A list of log records
+'''
+
+
+def simulate_participant(job):
+    participant, conditions, repetitions, seed, population, bubble_cursor, order = job
+    rng = random.Random("%s:participant:%d" % (seed, participant))
+    movement_model = population.sample(rng)
+    plan_seed = rng.randrange(2 ** 32)
+    records = []
+    for improve_pointing in (False, True):
+        session = simulation.HeadlessSimulation("sim%d" % participant, conditions, improve_pointing, repetitions,
+                                                movement_model=movement_model, seed=plan_seed,
+                                                hit_test_samples=False, bubble_cursor=bubble_cursor,
+                                                order=order)
+        records.extend(session.run())
+    return records
+
+
+class MonteCarloSimulation(object):
+    """
+        Runs many simulated participants on a process pool
+
+        @param conditions: A list of (distance, size) tuples or a ConditionGrid
+        @param participants: Number of simulated participants
+        @param repetitions: Indicates how often all trials should be repeated
+        @param seed: Seed of the whole run, the same seed always produces the same records
+        @param population: PopulationModel the participants are drawn from
+        @param processes: Number of worker processes, one per CPU core by default
+        @param bubble_cursor: Whether the improved pointing uses the dynamic BubbleCursor instead of the fat bubble
+        @param order: Order of the conditions, latin and balanced orders give every participant its own row
+    """
+
+    def __init__(self, conditions, participants, repetitions=4, seed=None, population=None, processes=None,
+                 bubble_cursor=False, order="fixed"):
+        self.conditions = conditions
+        self.participants = participants
+        self.repetitions = repetitions
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.population = population or PopulationModel()
+        self.processes = processes or multiprocessing.cpu_count()
+        self.bubble_cursor = bubble_cursor
+        self.order = order
+
+    def jobs(self):
+        for participant in range(self.participants):
+            yield (participant, self.conditions, self.repetitions, self.seed, self.population, self.bubble_cursor,
+                   self.order)
+
+    ''' Runs all participants
+
+        @return: A generator yielding the records of one participant after the other, in participant order
+    '''
+
+    def run(self):
+        if self.processes == 1:
+            for job in self.jobs():
+                yield simulate_participant(job)
+            return
+        # a few participants per task keep the inter-process traffic low without starving the last workers
+        chunk_size = max(1, min(16, self.participants // (self.processes * 8)))
+        with multiprocessing.Pool(self.processes) as pool:
+            for records in pool.imap(simulate_participant, self.jobs(), chunk_size):
+                yield records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of many participants")
+    parser.add_argument("setup", help="ini or json setup file")
+    parser.add_argument("-n", "--participants", type=int, default=100)
+    parser.add_argument("-o", "--output", default="simulation.csv")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing output file")
+    parser.add_argument("-r", "--repetitions", type=int, default=4)
+    parser.add_argument("-j", "--processes", type=int, help="worker processes (default: number of CPU cores)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--bubble-cursor", action="store_true",
+                        help="use the dynamic bubble cursor for improved pointing")
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        if not args.overwrite:
+            parser.error("%s already exists, use --overwrite to replace it" % args.output)
+        os.remove(args.output)
+    if args.setup.endswith('.json'):
+        user_id, conditions, improve_pointing, order = experiment_model.parse_json_file(args.setup)
+    else:
+        user_id, conditions, improve_pointing, order = experiment_model.parse_ini_file(args.setup)
+    monte_carlo = MonteCarloSimulation(conditions, args.participants, args.repetitions, args.seed,
+                                       processes=args.processes, bubble_cursor=args.bubble_cursor, order=order)
+    sink = CsvSink(args.output, experiment_model.LOG_FIELDS)
+    start = time.perf_counter()
+    rows = 0
+    for records in monte_carlo.run():
+        sink.write_rows(records)
+        rows += len(records)
+    sink.close()
+    duration = time.perf_counter() - start
+    sys.stderr.write("%d participants (%d trials) in %.1f s with %d processes, seed %d\n"
+                     % (args.participants, rows, duration, monte_carlo.processes, monte_carlo.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+
+
+import json
+import math
+import os
+
+"""
+ONLINE SESSION STATISTICS
+Per-condition results that are updated with every completed trial while the session runs, so they can be shown
+during the session and exported at its end without reading the log again. The measures are the ones of
+fitts_analysis.py and give the same values for the trials of a session:
+
+Movement time:          running mean and sample variance (Welford)
+Effective width:        We  = 4.133 * sqrt(var(x) + var(y)) of the click offsets, the nominal width while there is
+                        no spread
+Error rate:             errors / (errors + trials)
+Throughput:             TP  = IDe / MT with IDe = log2(D / We + 1), and its mean over the conditions
+Fitts' regression:      MT = a + b * IDe over the conditions, from running sums
+
+Adding a trial only touches its own condition: the condition's old contribution to the regression sums is
+replaced by its new one, so every update takes constant time no matter how many trials and conditions there are.
+The running values can be saved as a json serializable state (to_state) and restored (load_state), e.g. with the
+checkpoints of the session journal, so a resumed session does not read all of its records again.
+"""
+
+
+class RunningMoments(object):
+    """
+        Running count, mean and variance of a series of values (Welford's algorithm)
+    """
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    ''' Returns the sample variance, 0 for less than two values'''
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def to_state(self):
+        return [self.count, self.mean, self.m2]
+
+    def load_state(self, state):
+        self.count, self.mean, self.m2 = state
+
+
+class ConditionStatistics(object):
+    """
+        Running results of all trials of one condition
+
+        @param distance: The distance between target and cursor
+        @param size: The size of the targets
+    """
+
+    def __init__(self, distance, size):
+        self.distance = distance
+        self.size = size
+        self.movement_time = RunningMoments()
+        self.offset_x = RunningMoments()
+        self.offset_y = RunningMoments()
+        self.errors = 0
+        self.contribution = None
+
+    ''' Adds the result of a trial'''
+
+    def add(self, movement_time, offset_x, offset_y, errors):
+        self.movement_time.add(movement_time)
+        self.offset_x.add(offset_x)
+        self.offset_y.add(offset_y)
+        self.errors += errors
+
+    @property
+    def trials(self):
+        return self.movement_time.count
+
+    def error_rate(self):
+        return self.errors / (self.errors + self.trials) if self.trials else 0.0
+
+    ''' Nominal index of difficulty'''
+
+    def index_of_difficulty(self):
+        return math.log2(self.distance / self.size + 1)
+
+    ''' Effective width, the nominal size as long as the clicks show no spread'''
+
+    def effective_width(self):
+        width = 4.133 * math.sqrt(self.offset_x.variance() + self.offset_y.variance())
+        return width if width > 0 else self.size
+
+    def effective_index_of_difficulty(self):
+        return math.log2(self.distance / self.effective_width() + 1)
+
+    ''' Throughput in bits/s, None before the first trial or for a zero movement time'''
+
+    def throughput(self):
+        if not self.trials or self.movement_time.mean <= 0:
+            return None
+        return self.effective_index_of_difficulty() / (self.movement_time.mean / 1000)
+
+    def to_dict(self):
+        throughput = self.throughput()
+        return {"target_distance": self.distance, "target_size": self.size, "trials": self.trials,
+                "mean_mt": self.movement_time.mean, "std_mt": self.movement_time.std(), "errors": self.errors,
+                "error_rate": self.error_rate(), "id": self.index_of_difficulty(), "we": self.effective_width(),
+                "ide": self.effective_index_of_difficulty(), "throughput": throughput}
+
+
+class SessionStatistics(object):
+    """
+        Running per-condition results of a session and the Fitts' regression over its conditions
+        Trials with a failed measurement (negative movement time) are skipped like in fitts_analysis.py
+
+        Usage:
+            statistics = SessionStatistics()
+            statistics.add(record)           # a log record of PointingExperimentModel
+            statistics.regression()          # (intercept, slope, r_squared)
+    """
+
+    def __init__(self):
+        self.conditions = {}
+        self.version = 0
+        # sums over the conditions of x = IDe, y = mean movement time and the throughput
+        self.n = 0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+        self.syy = 0.0
+        self.throughput_sum = 0.0
+        self.throughput_count = 0
+
+    ''' Adds a completed trial
+
+        @param record: A log record with the columns of LOG_FIELDS
+    '''
+
+    def add(self, record):
+        movement_time = float(record["movement_time (ms)"])
+        if movement_time < 0:
+            return
+        key = (record["target_distance"], record["target_size"])
+        condition = self.conditions.get(key)
+        if condition is None:
+            condition = self.conditions[key] = ConditionStatistics(*key)
+        condition.add(movement_time, float(record["click_offset_x"]), float(record["click_offset_y"]),
+                      int(record["number_of_errors"]))
+        self.update_sums(condition)
+        self.version += 1
+
+    ''' Replaces the contribution of a condition to the regression and throughput sums'''
+
+    def update_sums(self, condition):
+        if condition.contribution is not None:
+            self.add_contribution(condition.contribution, -1)
+        x = condition.effective_index_of_difficulty()
+        y = condition.movement_time.mean
+        throughput = condition.throughput()
+        condition.contribution = (x, y, throughput)
+        self.add_contribution(condition.contribution, 1)
+
+    def add_contribution(self, contribution, sign):
+        x, y, throughput = contribution
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.sxy += sign * x * y
+        self.syy += sign * y * y
+        if throughput is not None:
+            self.throughput_sum += sign * throughput
+            self.throughput_count += sign
+
+    ''' Mean of the condition throughputs in bits/s, None before the first trial'''
+
+    def throughput(self):
+        return self.throughput_sum / self.throughput_count if self.throughput_count else None
+
+    ''' Least squares fit MT = a + b * IDe over the conditions
+
+        @return: Tuple (intercept in ms, slope in ms/bit, r_squared), None for values that cannot be determined yet
+    '''
+
+    def regression(self):
+        if not self.n:
+            return None, None, None
+        cov = self.sxy - self.sx * self.sy / self.n
+        var_x = self.sxx - self.sx * self.sx / self.n
+        var_y = self.syy - self.sy * self.sy / self.n
+        # the incrementally updated sums carry rounding errors, a spread this small counts as none
+        if var_x <= 1e-9 * max(1.0, self.sxx):
+            return None, None, None
+        slope = cov / var_x
+        intercept = (self.sy - slope * self.sx) / self.n
+        r_squared = cov * cov / (var_x * var_y) if var_y > 1e-9 * max(1.0, self.syy) else None
+        return intercept, slope, r_squared
+
+    ''' Returns the overlay text, one line per condition and one for the regression'''
+
+    def lines(self):
+        lines = []
+        for (distance, size), condition in sorted(self.conditions.items()):
+            throughput = condition.throughput()
+            lines.append("D %d W %d: n=%d  MT %.0f ± %.0f ms  We %.1f  err %.0f%%  TP %s" % (
+                distance, size, condition.trials, condition.movement_time.mean, condition.movement_time.std(),
+                condition.effective_width(), 100 * condition.error_rate(),
+                "-" if throughput is None else "%.2f bit/s" % throughput))
+        intercept, slope, r_squared = self.regression()
+        throughput = self.throughput()
+        lines.append("TP %s  MT = %s" % (
+            "-" if throughput is None else "%.2f bit/s" % throughput,
+            "-" if slope is None else "%.0f + %.0f * IDe ms (R² %s)" % (
+                intercept, slope, "-" if r_squared is None else "%.3f" % r_squared)))
+        return lines
+
+    ''' Returns the running values of all conditions as json serializable lists'''
+
+    def to_state(self):
+        return [[condition.distance, condition.size, condition.movement_time.to_state(),
+                 condition.offset_x.to_state(), condition.offset_y.to_state(), condition.errors]
+                for condition in self.conditions.values()]
+
+    ''' Replaces all values with a state returned by to_state(), the regression sums are recomputed'''
+
+    def load_state(self, state):
+        self.__init__()
+        for distance, size, movement_time, offset_x, offset_y, errors in state:
+            condition = self.conditions[(distance, size)] = ConditionStatistics(distance, size)
+            condition.movement_time.load_state(movement_time)
+            condition.offset_x.load_state(offset_x)
+            condition.offset_y.load_state(offset_y)
+            condition.errors = errors
+            self.update_sums(condition)
+        self.version += 1
+
+    def to_dict(self):
+        intercept, slope, r_squared = self.regression()
+        return {"conditions": [condition.to_dict() for key, condition in sorted(self.conditions.items())],
+                "throughput": self.throughput(),
+                "regression": {"intercept": intercept, "slope": slope, "r_squared": r_squared,
+                               "conditions": self.n}}
+
+    ''' Atomically writes the summary as json
+
+        @param extra: Dictionary of additional entries of the summary, e.g. the session's latencies
+    '''
+
+    def save(self, filename, extra=None):
+        summary = self.to_dict()
+        summary.update(extra or {})
+        temp_name = filename + ".tmp"
+        with open(temp_name, "w") as summary_file:
+            json.dump(summary, summary_file, indent=1)
+        os.replace(temp_name, filename)
@@ -1,217 +1,195 @@
 #!/usr/bin/python3
 
 
-import configparser
-import csv
-import json
 import math
-import random
+import os
 import sys
+import time
+import traceback
 
 try:
     import pointing_technique as pt
 except ImportError:
     print("Could not import pointing_technique.py")
+import target_layout
+from experiment_model import (LOG_FIELDS, make_log_record, PointingExperimentModel, Trial, parse_ini_file,
+                              parse_json_file)
+from trial_plan import TrialPlan
+from session_journal import SessionJournal
+from target_set import TargetSet, TargetView
+from sprite_cache import SpriteCache
+from frame_scheduler import FrameScheduler
 from PyQt5 import QtGui, QtWidgets, QtCore
 
 # This script was created by Alexander Frummet and Marco Batzdorf
 # and is based on the "fitts_law_test.py" script
 
-""" setup ini file format:
-[experiment_setup]
-UserID = 1
-Conditions = 100,10;100,25;250,75;100,50;250,50;100,75;250,25;150,10;250,10;150,25;200,75;150,50;200,50;150,75;200,25;
-             200,10
-ImprovePointing = 0
 """
-
-""" setup json file format:
-{
-"UserID" : "1",
-"Conditions": "100,10;100,25;250,75;100,50;250,50;100,75;250,25;150,10;250,10;150,25;200,75;150,50;200,50;150,75;200,25;
-              200,10",
-"ImprovePointing": "0"
-}
+The experiment UI: targets, the experiment widget and main()
+The model, the trial log format and the setup file parsers live in the Qt-free experiment_model.py
+and are re-exported here
 """
 
 
-class PointingExperimentModel(object):
+class Target(TargetView):
     """
-        This experiment model keeps track of all information concerning a pointing test.
-        The experiment settings are given via instantiation parameters and the trial order is generated in a
-        counterbalanced way.
-        Further all information are logged to stdout and stored in a file in csv format.
-
-        @param user_id: ID for the user participating
-        @param conditions: A list containing all conditions for this test
-        @param improve_pointing: Whether the improved pointing technique should be used or the standard one
-        @param repetitions: Indicates how often all trials should be repeated
+        Represents a target that can be displayed on the participant's screen
+        Targets are represented by a circle and can be highlighted
+        The default color is white but can be given any color
+        A target is a view on one entry of a TargetSet, position and diameter are read from the set's arrays
+
+        @param target_set: The TargetSet holding the circle's center and diameter
+        @param target_id: Index of the target inside the set
     """
 
-    def __init__(self, user_id, conditions, improve_pointing, repetitions=4):
-        self.timer = QtCore.QTime()
-        self.user_id = user_id
-        self.conditions = conditions
-        self.improve_pointing = improve_pointing
-        self.repetitions = repetitions
-        self.init_trials(conditions, repetitions)
-
-        self.elapsed = 0
-        self.errors = 0
-        self.mouse_moving = False
-        self.init_logging()
-        print(
-            "\"timestamp (ISO)\";\"user_id\";\"trial\";\"target_distance\";\"target_size\";\"movement_time (ms)\";"
-            "\"click_offset_x\";\"click_offset_y\";\"number_of_errors\";\"improved_pointing\"")
-
-    ''' Initializes the order of the single trials '''
-
-    def init_trials(self, conditions, repetitions):
-        self.trials = repetitions * conditions
-        print(self.trials)
-
-        for i in range(len(self.trials)):
-            self.trials[i] = Trial(self.trials[i][0], self.trials[i][1])
-
-    ''' Initialize experiment logging
-        Creates a new csv file and writes the corresponding header line
-    '''
+    __slots__ = ()
 
-    def init_logging(self):
-        self.logfile = open("user" + str(self.user_id) + ".csv", "a")
-        self.out = csv.DictWriter(self.logfile,
-                                  ["timestamp (ISO)", "user_id", "trial", "target_distance", "target_size",
-                                   "movement_time (ms)", "click_offset_x", "click_offset_y",
-                                   "number_of_errors", "improved_pointing"], delimiter=";", quoting=csv.QUOTE_ALL)
-        self.out.writeheader()
+    COLOR_RED = QtGui.QColor(200, 34, 20)
+    COLOR_WHITE = QtGui.QColor(255, 255, 255)
+    COLOR_GREEN = QtGui.QColor(59, 255, 0)
+    sprite_cache = None
 
-    ''' Helper for getting the current [distance, diameter] tuple representing the current trial's settings'''
+    ''' Draws the standard representation of this target to the screen'''
 
-    def current_trial(self):
-        if self.elapsed >= len(self.trials):
-            return None
-        else:
-            return self.trials[self.elapsed]
+    def draw(self, painter):
+        self.draw_colored(painter, self.COLOR_WHITE)
+        return
 
-    ''' Tells the model that the correct target has been hit
-        Updates the current target to the next one and triggers writing the trial results to the csv file
-    '''
+    ''' Highlight the circle with a red color'''
+
+    def draw_highlighted(self, painter):
+        self.draw_colored(painter, self.COLOR_RED, "highlighted")
 
-    def register_click(self, target_pos, click_pos):
-        click_offset = (target_pos[0] - click_pos[0], target_pos[1] - click_pos[1])
-        self.log_time(self.stop_measurement(), click_offset)
-        self.errors = 0
-        self.elapsed += 1
-
-    ''' Writes all useful trial information to the log csv file'''
-
-    def log_time(self, time, click_offset):
-        distance, diameters = self.current_trial().get_current_condition()
-        current_values = {"timestamp (ISO)": self.timestamp(), "user_id": self.user_id,
-                          "trial": self.elapsed, "target_distance": distance,
-                          "target_size": diameters, "movement_time (ms)": time,
-                          "click_offset_x": click_offset[0], "click_offset_y": click_offset[1],
-                          "number_of_errors": self.errors, "improved_pointing": self.improve_pointing
-                          }
-        self.out.writerow(current_values)
-        print("\"%s\";\"%s\";\"%d\";\"%d\";\"%d\";\"%d\";\"%d\";\"%d\";\"%d\";\"%s\"" % (
-            self.timestamp(), self.user_id, self.elapsed, distance, diameters, time, click_offset[0], click_offset[1],
-            self.errors, self.improve_pointing))
-
-    ''' Tells the model to start the timer and that the mouse is moving '''
-
-    def start_measurement(self):
-        if not self.mouse_moving:
-            self.timer.start()
-            self.mouse_moving = True
-
-    ''' Stops counting the time because the mouse is not moving anymore.
-        Returns the elapsed time for the current trial
+    ''' Draws the target to the screen with the specified color
+        Blits a pre-rendered sprite if a SpriteCache is set, the painter's pen is used as outline
     '''
 
-    def stop_measurement(self):
-        if self.mouse_moving:
-            elapsed = self.timer.elapsed()
-            self.mouse_moving = False
-            return elapsed
-        else:
-            return -1
+    def draw_colored(self, painter, color, state=None):
+        if self.sprite_cache is not None:
+            self.sprite_cache.draw(painter, self.pos_x, self.pos_y, self.diameter, color, painter.pen().color(),
+                                   state)
+            return
+        painter.setBrush(color)
+        painter.drawEllipse(QtCore.QPointF(self.pos_x, self.pos_y), self.diameter / 2, self.diameter / 2)
+        return
 
-    ''' Returns a timestamp'''
+    ''' Returns the screen area covered by this target, including a margin for the outline'''
 
-    def timestamp(self):
-        return QtCore.QDateTime.currentDateTime().toString(QtCore.Qt.ISODate)
+    def bounding_rect(self):
+        return bounds_to_rect(self.pos_x - self.diameter / 2, self.pos_y - self.diameter / 2,
+                              self.diameter, self.diameter)
 
-    ''' Helper to increment the error count for the current trial'''
 
-    def increment_error_count(self, amount):
-        self.errors += amount
+def bounds_to_rect(x, y, width, height, margin=2):
+    """
+        Converts floating point bounds into a QRect that fully contains them
 
+        @param margin: Additional pixels on every side covering pen width and antialiasing
 
-class Trial:
+        @return: A QRect
     """
-        Stores the settings for a single trial of the experiment
+    left = int(math.floor(x)) - margin
+    top = int(math.floor(y)) - margin
+    return QtCore.QRect(left, top, int(math.ceil(x + width)) + margin - left + 1,
+                        int(math.ceil(y + height)) + margin - top + 1)
+
 
-        @param distance: The distance between target and cursor
-        @param diameter: The size of the target to hit
+class ExperimentScene(object):
+    """
+        Draws a frame of the experiment: the timer text, the targets and the pointer
+        Shared by the experiment widget and the offscreen session replay (session_replay.py).
+        Subclasses provide model (elapsed, trials, elapsed_time() and instrumentation), targets,
+        pointing_technique, text_font, text_height, width() and rect().
+        With show_statistics the model's running per-condition results are drawn below the timer text
+        (requires model.statistics and statistics_font).
     """
 
-    def __init__(self, distance, diameter):
-        self.distance = distance
-        self.diameter = diameter
+    TEXT_COLOR = QtGui.QColor(168, 34, 3)
+    show_statistics = False
+    statistics_lines = ()
+    statistics_version = None
 
-    ''' Helper for accessing this trial's settings'''
+    ''' Draws all elements inside the given region
 
-    def get_current_condition(self):
-        return self.distance, self.diameter
+        @param qp: QPainter drawing to the widget or image
+        @param region: The QRegion that has to be redrawn, None redraws everything
+    '''
 
+    def paintScene(self, qp, region=None):
+        if region is None or region.intersects(self.textRect()):
+            self.drawText(None, qp)
+        if self.show_statistics and (region is None or region.intersects(self.statisticsRect())):
+            self.drawStatistics(qp)
+        qp.setPen(self.TEXT_COLOR)
+        instrumentation = self.model.instrumentation
+        if instrumentation is None:
+            self.drawTargets(qp, region)
+            self.pointing_technique.draw_pointer(qp)
+            return
+        start = instrumentation.clock()
+        self.drawTargets(qp, region)
+        instrumentation.record("draw_targets", start)
+        start = instrumentation.clock()
+        self.pointing_technique.draw_pointer(qp)
+        instrumentation.record("draw_pointer", start)
 
-class Target:
-    """
-        Represents a target that can be displayed on the participant's screen
-        Targets are represented by a circle and can be highlighted
-        The default color is white but can be given any color
+    ''' Returns the screen area the timer text is drawn in'''
 
-        @param position_x: X-Coordinate of the circle's center
-        @param position_y: Y-Coordinate of the circle's center
-        @param diameter: Two times the radius, defining the circle's extends
-    """
+    def textRect(self):
+        return QtCore.QRect(0, 0, self.width(), self.text_height)
 
-    COLOR_RED = QtGui.QColor(200, 34, 20)
-    COLOR_WHITE = QtGui.QColor(255, 255, 255)
+    ''' Returns the text showing the trial and the passed time for this test'''
 
-    def __init__(self, position_x, position_y, diameter):
-        self.pos_x = position_x
-        self.pos_y = position_y
-        self.diameter = diameter
+    def timerText(self):
+        return "%d / %d (%05d ms)" % (self.model.elapsed, len(self.model.trials), self.model.elapsed_time())
 
-    def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+    ''' Draws a text showing the passed time for this test'''
 
-    ''' Draws the standard representation of this target to the screen'''
+    def drawText(self, event, qp):
+        qp.setPen(self.TEXT_COLOR)
+        qp.setFont(self.text_font)
+        self.text = self.timerText()
+        qp.drawText(self.rect(), QtCore.Qt.AlignTop, self.text)
 
-    def draw(self, painter):
-        painter.setBrush(self.COLOR_WHITE)
-        painter.drawEllipse(QtCore.QPoint(self.pos_x, self.pos_y), self.diameter / 2, self.diameter / 2)
-        return
+    ''' Returns the screen area of the statistics overlay, its text is only formatted again after a click'''
 
-    ''' Highlight the circle with a red color'''
+    def statisticsRect(self):
+        statistics = self.model.statistics
+        if statistics.version != self.statistics_version:
+            self.statistics_lines = statistics.lines() if statistics.n else []
+            self.statistics_version = statistics.version
+        line_height = QtGui.QFontMetrics(self.statistics_font).height()
+        return QtCore.QRect(0, self.text_height, self.width(), line_height * len(self.statistics_lines))
 
-    def draw_highlighted(self, painter):
-        painter.setBrush(self.COLOR_RED)
-        painter.drawEllipse(QtCore.QPoint(self.pos_x, self.pos_y),
-                            self.diameter / 2,
-                            self.diameter / 2)
+    ''' Draws the running per-condition results of the session'''
 
-    ''' Draws the target to the screen with the specified color'''
+    def drawStatistics(self, qp):
+        rect = self.statisticsRect()
+        qp.setPen(self.TEXT_COLOR)
+        qp.setFont(self.statistics_font)
+        qp.drawText(rect, QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft, "\n".join(self.statistics_lines))
 
-    def draw_colored(self, painter, color):
-        painter.setBrush(color)
-        painter.drawEllipse(QtCore.QPoint(self.pos_x, self.pos_y), self.diameter / 2, self.diameter / 2)
-        return
+    ''' Responsible for drawing all targets depending on their current state (hovered, main target, normal target)
+        Targets outside of the given region are skipped
+
+        @param region: The QRegion that has to be redrawn, None redraws everything
+    '''
+
+    def drawTargets(self, qp, region=None):
+        for idx in range(len(self.targets)):
+            if region is not None and not region.intersects(self.targets[idx].bounding_rect()):
+                continue
+            if idx == 0:
+                self.targets[idx].draw_colored(qp, Target.COLOR_GREEN)
+            else:
+                self.targets[idx].draw(qp)
+        highlighted = self.pointing_technique.get_target_ids_under_cursor()
+        for target in self.targets.select(highlighted):
+            if region is None or region.intersects(target.bounding_rect()):
+                target.draw_highlighted(qp)
 
 
-class PointingExperimentTest(QtWidgets.QWidget):
+class PointingExperimentTest(QtWidgets.QWidget, ExperimentScene):
     """
         Main class for executing the pointing experiment/test
         Initializes and keeps track of the ui and pointing technique
@@ -219,6 +197,10 @@ class PointingExperimentTest(QtWidgets.QWidget):
         Also responsible for keeping the given experiment model up to date
 
         @param model: The experiment model used for this Test
+        @param coalesce_mouse_events: Whether hit-testing and repainting run once per frame instead of once per
+                                      mouse event, defaults to COALESCE_MOUSE_EVENTS
+        @param plan: The TrialPlan providing angles and layouts, a new plan with the model's seed if None
+        @param show_statistics: Whether the running per-condition results are shown below the timer text
     """
 
     UI_WIDTH = 1920
@@ -226,11 +208,27 @@ class PointingExperimentTest(QtWidgets.QWidget):
     BUBBLE_RADIUS = 20
     MAX_NUM_TARGETS = 10
     MIN_NUM_TARGETS = 3
+    COALESCE_MOUSE_EVENTS = False
+    PREFETCH_TRIALS = 32
 
-    def __init__(self, model):
+    def __init__(self, model, coalesce_mouse_events=None, plan=None, show_statistics=False):
         super(PointingExperimentTest, self).__init__()
         self.model = model
-        self.start_pos = (self.UI_WIDTH / 2, self.UI_HEIGHT / 2)
+        self.show_statistics = show_statistics
+        if coalesce_mouse_events is None:
+            coalesce_mouse_events = self.COALESCE_MOUSE_EVENTS
+        self.scheduler = FrameScheduler(self.processMoves, parent=self) if coalesce_mouse_events else None
+        # Qt's integer coordinates reject floats on Python 3.10+
+        self.start_pos = (self.UI_WIDTH // 2, self.UI_HEIGHT // 2)
+        if plan is None:
+            plan = TrialPlan(model.conditions, model.repetitions, model.seed, self.UI_WIDTH, self.UI_HEIGHT,
+                             self.start_pos, self.MIN_NUM_TARGETS, self.MAX_NUM_TARGETS, model.trials.order,
+                             model.trials.participant)
+        self.plan = plan
+        self.changed_targets = set()
+        self.sprite_cache = SpriteCache()
+        Target.sprite_cache = self.sprite_cache
+        self.pointing_techniques = {}
         self.initUI()
         self.init_next_trial()
 
@@ -240,6 +238,9 @@ class PointingExperimentTest(QtWidgets.QWidget):
 
     def initUI(self):
         self.text = "Please click on the target"
+        self.text_font = QtGui.QFont('Decorative', 32)
+        self.text_height = QtGui.QFontMetrics(self.text_font).height()
+        self.statistics_font = QtGui.QFont('Decorative', 12)
         self.setGeometry(0, 0, self.UI_WIDTH, self.UI_HEIGHT)
         self.setWindowTitle('PointingExperimentTest')
         self.setFocusPolicy(QtCore.Qt.StrongFocus)
@@ -249,66 +250,41 @@ class PointingExperimentTest(QtWidgets.QWidget):
 
     ''' Prepares and sets all variables for the next test
         Updates the UI and model and sets appropriate pointing technique
+        The pointing techniques are kept across trials and only get the new targets
+        The layouts of the next PREFETCH_TRIALS trials are generated in the background,
+        the ones of the trials before the current one are dropped
     '''
 
     def init_next_trial(self):
-        if self.model.improve_pointing:
-            self.pointing_technique = pt.PointingTechniqueFatBubble([], Target, self.BUBBLE_RADIUS)
-        else:
-            self.pointing_technique = pt.StandardPointingTechnique([], Target)
+        if self.scheduler is not None:
+            self.scheduler.discard()
+        self.initTargets()
+        self.plan.evict(self.model.elapsed)
+        self.plan.prefetch(self.model.elapsed + 1, self.PREFETCH_TRIALS)
+        self.pointing_technique = self.createPointingTechnique(self.targets, self.model.improve_pointing)
         QtGui.QCursor.setPos(self.mapToGlobal(QtCore.QPoint(self.start_pos[0], self.start_pos[1])))
         self.pointing_technique.filter(self.start_pos[0], self.start_pos[1])
-        self.random_angle_in_rad = self.getRandomAngleInRad()
-        self.initTargets()
-        self.pointing_technique.update_targets(self.targets)
         self.update()
 
-    ''' Returns a randomly generated angle in Radians'''
-
-    def getRandomAngleInRad(self):
-        return math.radians(random.randint(0, 360))
-
     ''' Initialize all targets representes to the participant
-        The target size is defined by the current trial settings
+        Angle and layout of the current trial are taken from the trial plan,
+        the target size is defined by the current trial settings
         and the amount is set via MAX_NUM_TARGETS and MIN_NUM_TARGETS
 
-        Tries to avoid overlapping targets
-        Ignores the none overlapping restriction if the targets are too many
-        and/or too big to be placed in that manner after a few tries
+        Targets never overlap, if not all of them fit the trial is shown with fewer distractors
 
     '''
 
     def initTargets(self):
-        number_of_targets = random.randint(self.MIN_NUM_TARGETS, self.MAX_NUM_TARGETS)
-        self.targets = []
-        if self.model.current_trial() is not None:
-            distance, size = self.model.current_trial().get_current_condition()
-            pos = self.getMainTargetPos(distance)
-            self.targets.append(Target(pos[0], pos[1], size))
-        else:
-            sys.stderr.write("no targets left...")
-            sys.exit(1)
-        for number in range(number_of_targets):
-            can_draw = False
-            MAX_RETRIES = 3
-            retry_count = 0
-            while (not can_draw and retry_count < MAX_RETRIES):
-                pos_x = random.randint(size + 0, self.UI_WIDTH - size)
-                pos_y = random.randint(0 + size, self.UI_HEIGHT - size)
-                not_occupied = True
-                for e in self.targets:
-                    if pt.GeometryUtils.are_circles_intersecting(pos_x, pos_y, size, e.pos_x, e.pos_y, e.diameter):
-                        not_occupied = False
-                retry_count += 1
-                can_draw = not_occupied
-            self.targets.append(Target(pos_x, pos_y, size))
+        planned = self.plan.trial(self.model.elapsed)
+        self.random_angle_in_rad = planned.angle
+        self.targets = TargetSet(planned.layout, Target)
+        self.changed_targets = set()
 
     ''' Helper for getting the center position of the target that has to be clicked'''
 
     def getMainTargetPos(self, distance):
-        x = self.start_pos[0] + distance * math.cos(self.random_angle_in_rad)
-        y = self.start_pos[1] + distance * math.sin(self.random_angle_in_rad)
-        return (x, y)
+        return target_layout.main_target_position(self.start_pos, distance, self.random_angle_in_rad)
 
     ''' Helper for getting the target that has to be clicked'''
 
@@ -322,20 +298,43 @@ class PointingExperimentTest(QtWidgets.QWidget):
     def togglePointingTechnique(self):
         if not self.model.improve_pointing:
             return
-        if type(self.pointing_technique) == pt.PointingTechniqueFatBubble:
-            self.pointing_technique = pt.StandardPointingTechnique(self.targets, Target)
-        else:
-            self.pointing_technique = pt.PointingTechniqueFatBubble(self.targets, Target, self.BUBBLE_RADIUS)
+        bubble = type(self.pointing_technique) != pt.PointingTechniqueFatBubble
+        self.pointing_technique = self.createPointingTechnique(self.targets, bubble)
+
+    ''' Returns the pointing technique used for the given targets
+        Each technique is only created once and reused for all following trials
+
+        @param bubble: Whether the improved pointing technique or the standard one should be used
+    '''
+
+    def createPointingTechnique(self, targets, bubble):
+        technique = self.pointing_techniques.get(bubble)
+        if technique is None:
+            if bubble:
+                technique = pt.PointingTechniqueFatBubble([], Target, self.BUBBLE_RADIUS)
+            else:
+                technique = pt.StandardPointingTechnique([], Target)
+            technique.sprite_cache = self.sprite_cache
+            technique.hover_changed = self.hoverChanged
+            self.pointing_techniques[bubble] = technique
+        technique.update_targets(targets)
+        return technique
 
     ''' Processes all click events for the mouse
-        and checks if the main target has been hit
+        and checks if the main target has been hit (comparing target IDs with the hits cached by the technique)
     '''
 
     def mousePressEvent(self, ev):
+        if self.scheduler is not None:
+            self.scheduler.flush()
         if ev.button() == QtCore.Qt.LeftButton:
             main_target = self.getMainTarget()
-            if main_target in self.pointing_technique.get_targets_under_cursor():
+            if main_target.id in self.pointing_technique.get_target_ids_under_cursor():
                 self.model.register_click([main_target.pos_x, main_target.pos_y], [ev.x(), ev.y()])
+                if self.model.current_trial() is None:
+                    # closing the last window ends the event loop, closeEvent writes the log and the summary
+                    self.close()
+                    return
                 self.init_next_trial()
             else:
                 self.model.increment_error_count(1)
@@ -345,44 +344,110 @@ class PointingExperimentTest(QtWidgets.QWidget):
             self.pointing_technique.filter(ev.x(), ev.y())
         self.update()
 
-    ''' Processes all movement events for the mouse and reroutes them to the pointing technique'''
+    ''' Processes all movement events for the mouse and reroutes them to the pointing technique
+        The measurement starts with the raw event, while hit-testing, recording the trajectory samples and
+        repainting are deferred to the next frame if mouse events are coalesced
+    '''
 
     def mouseMoveEvent(self, ev):
-        self.pointing_technique.filter(ev.x(), ev.y())
+        t_ns = time.monotonic_ns()
+        if self.model.instrumentation is not None:
+            self.model.instrumentation.event_received()
         if (abs(ev.x() - self.start_pos[0]) > 5) or (abs(ev.y() - self.start_pos[1]) > 5):
             self.model.start_measurement()
-        self.update()
+        if self.scheduler is not None:
+            self.scheduler.submit(ev.x(), ev.y(), t_ns)
+        else:
+            self.processMove(ev.x(), ev.y(), t_ns)
         return
 
-    ''' Draws all elements to the screen'''
+    ''' Moves the pointer to the given position, see processMoves
+
+        @param t_ns: Time the mouse event arrived (time.monotonic_ns()), now if not given
+    '''
+
+    def processMove(self, pos_x, pos_y, t_ns=None):
+        self.processMoves([(pos_x, pos_y, t_ns)])
+
+    ''' Moves the pointer to the newest of the given samples and repaints the areas that changed
+        The pointing technique hit-tests the new position once and reports changed targets via hoverChanged.
+        Afterwards every sample is added to the trajectory with the number of targets under the new position,
+        the hover state shown in the frame the samples belong to
+
+        @param samples: A list of (pos_x, pos_y, t_ns) tuples, the newest one last
+    '''
+
+    def processMoves(self, samples):
+        pos_x, pos_y = samples[-1][:2]
+        old_bounds = self.pointing_technique.pointer_bounds()
+        instrumentation = self.model.instrumentation
+        if instrumentation is not None:
+            start = instrumentation.clock()
+            self.pointing_technique.filter(pos_x, pos_y)
+            instrumentation.record("hit_test", start)
+        else:
+            self.pointing_technique.filter(pos_x, pos_y)
+        hovered = len(self.pointing_technique.get_target_ids_under_cursor())
+        for sample_x, sample_y, sample_t_ns in samples:
+            self.model.record_sample(sample_x, sample_y, hovered, sample_t_ns)
+        self.update(self.dirtyRegion(old_bounds))
+
+    ''' Called by the pointing technique when the pointer entered or left targets
+
+        @param entered: IDs of the targets that are hovered now
+        @param left: IDs of the targets that are not hovered anymore
+    '''
+
+    def hoverChanged(self, entered, left):
+        self.changed_targets.update(entered)
+        self.changed_targets.update(left)
+
+    ''' Collects the screen areas that changed since the last mouse move:
+        the old and new pointer bounds, every target whose highlight state changed and the timer text if it shows
+        something else now. While the hovered targets stay the same no target is repainted
+
+        @param old_bounds: The pointer bounds before the pointer was moved
+
+        @return: A QRegion that has to be repainted
+    '''
+
+    def dirtyRegion(self, old_bounds):
+        region = QtGui.QRegion()
+        if self.timerText() != self.text:
+            region = region.united(self.textRect())
+        new_bounds = self.pointing_technique.pointer_bounds()
+        for bounds in (old_bounds, new_bounds):
+            if bounds is not None:
+                region = region.united(bounds_to_rect(*bounds))
+        for target_id in self.changed_targets:
+            region = region.united(self.targets[target_id].bounding_rect())
+        self.changed_targets.clear()
+        return region
+
+    ''' Draws all elements to the screen
+        Only the parts inside the event's region are redrawn
+    '''
 
     def paintEvent(self, event):
+        self.sprite_cache.set_device_pixel_ratio(self.devicePixelRatioF())
         qp = QtGui.QPainter()
         qp.begin(self)
-        self.drawText(event, qp)
-        self.drawTargets(qp)
-        self.pointing_technique.draw_pointer(qp)
+        self.paintScene(qp, event.region())
         qp.end()
+        if self.model.instrumentation is not None:
+            self.model.instrumentation.frame_presented()
 
-    ''' Draws a text showing the passed time for this test'''
+    ''' Flushes and closes the experiment log when the window is closed'''
 
-    def drawText(self, event, qp):
-        qp.setPen(QtGui.QColor(168, 34, 3))
-        qp.setFont(QtGui.QFont('Decorative', 32))
-        self.text = "%d / %d (%05d ms)" % (self.model.elapsed, len(self.model.trials), self.model.timer.elapsed())
-        qp.drawText(event.rect(), QtCore.Qt.AlignTop, self.text)
+    def closeEvent(self, event):
+        self.model.close()
+        super(PointingExperimentTest, self).closeEvent(event)
 
-    ''' Responsible for drawing all targets depending on their current state (hovered, main target, normal target)'''
+    ''' Drops all cached sprites when the window size changes'''
 
-    def drawTargets(self, qp):
-        for idx in range(len(self.targets)):
-            if idx == 0:
-                self.targets[idx].draw_colored(qp, QtGui.QColor(59, 255, 0))
-            else:
-                self.targets[idx].draw(qp)
-        highlighted = self.pointing_technique.get_targets_under_cursor()
-        for target in highlighted:
-            target.draw_highlighted(qp)
+    def resizeEvent(self, event):
+        self.sprite_cache.invalidate()
+        super(PointingExperimentTest, self).resizeEvent(event)
 
 
 def main():
@@ -391,65 +456,87 @@ def main():
         Reads in a ini or json file passed as a command line parameter (see definition above)
         and initializes the experiment model with this information
         Starts the QtApplication afterwards with the newly created model
+        The option --instrument adds per-trial latency percentiles to the log,
+        --collector=<host:port or socket path> additionally sends the records to a LogCollector
+        --statistics shows the running per-condition results during the session
+        and --columnar additionally stores the records with their trajectories in user<ID>.npz (see session_replay.py)
 
-    """
-    try:
-        app = QtWidgets.QApplication(sys.argv)
-        if len(sys.argv) < 2:
-            sys.stderr.write("Usage: %s <setup file>\n" % sys.argv[0])
-            sys.exit(1)
-        if sys.argv[1].endswith('.ini'):
-            id, conditions, improve_pointing = parse_ini_file(sys.argv[1])
-        if sys.argv[1].endswith('.json'):
-            id, conditions, improve_pointing = parse_json_file(sys.argv[1])
-        model = PointingExperimentModel(id, conditions, improve_pointing)
-        test = PointingExperimentTest(model)
-        sys.exit(app.exec_())
-    except Exception:
-        print("An error occured!")
-
-
-def parse_ini_file(filename):
-    """
-        Reads the information from a ini file
+        Every session is journaled to user<ID>.journal. If the application crashed, starting it again with the
+        same setup file continues the session at the first unfinished trial with the same layouts.
+        An optional trial plan file keeps the angles and layouts of the session as json: it is created on the first
+        start and reused afterwards, a session without journal can be continued at the given first trial.
+
+        Errors are not hidden: the log and the journal are closed and the traceback is printed.
 
-        @return: Integer with the user's id; a list with all possible target sizes for this test;
-                a list with all possible target distances for this test; Boolean indicating whether the improved
-                pointing technique should be used or not
     """
-    config = configparser.ConfigParser()
-    config.read(filename)
-    if 'experiment_setup' in config:
-        setup = config['experiment_setup']
-        user_id = setup['UserID']
-        conditions_string = setup['Conditions']
-        # inspired by: https://stackoverflow.com/questions/9763116/parse-a-tuple-from-a-string
-        conditions = [tuple(map(int, x.split(","))) for x in conditions_string.split(";")]
-        improve_pointing = bool(int(setup['ImprovePointing']))
-    else:
-        print("Error: wrong file format.")
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    instrument = "--instrument" in sys.argv[1:]
+    show_statistics = "--statistics" in sys.argv[1:]
+    columnar_output = "--columnar" in sys.argv[1:]
+    collector = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--collector="):
+            collector = arg[len("--collector="):]
+    args = [arg for arg in sys.argv
+            if arg not in ("--instrument", "--statistics", "--columnar") and not arg.startswith("--collector=")]
+    if len(args) < 2 or not args[1].endswith(('.ini', '.json')):
+        sys.stderr.write("Usage: %s [--instrument] [--statistics] [--columnar] [--collector=<address>] "
+                         "<setup file> [<plan file> [<first trial>]]\n" % args[0])
         sys.exit(1)
-    return user_id, conditions, improve_pointing
+    if args[1].endswith('.ini'):
+        id, conditions, improve_pointing, order = parse_ini_file(args[1])
+    else:
+        id, conditions, improve_pointing, order = parse_json_file(args[1])
+    first_trial = int(args[3]) if len(args) > 3 else 0
+    # a saved plan fixes the seed, so the journal and the logs name the session the layouts belong to
+    plan = TrialPlan.load(args[2]) if len(args) > 2 and os.path.exists(args[2]) else None
+    journal = SessionJournal("user" + str(id) + ".journal")
+    model = PointingExperimentModel(id, conditions, improve_pointing, first_trial=first_trial,
+                                    columnar_output=columnar_output, instrument=instrument, journal=journal,
+                                    seed=None if plan is None else plan.seed, collector=collector, order=order)
+
+    def excepthook(exc_type, exc_value, exc_traceback):
+        traceback.print_exception(exc_type, exc_value, exc_traceback)
+        app.exit(1)
+
+    # PyQt aborts the process on exceptions raised inside event handlers unless a hook is installed
+    sys.excepthook = excepthook
+    if model.current_trial() is None:
+        sys.stderr.write("All %d trials of user %s are already done\n" % (len(model.trials), id))
+        model.close()
+        sys.exit(0)
+    try:
+        if len(args) > 2:
+            plan = load_plan(args[2], model, plan)
+        test = PointingExperimentTest(model, plan=plan, show_statistics=show_statistics)
+        exit_code = app.exec_()
+    finally:
+        model.close()
+    sys.exit(exit_code)
 
 
-def parse_json_file(filename):
+def load_plan(filename, model, plan=None):
     """
-        Reads the information from a json file
+        Checks the trial plan read from the given file against the model's session,
+        or creates and stores a new plan with the model's seed if the file does not exist yet
 
-        @return: Integer with the user's id; a list with all possible target sizes for this test;
-                 a list with all possible target distances for this test; Boolean indicating whether the improved
-                 pointing technique should be used or not
+        @param plan: The TrialPlan read from the file, None if there is no file
+        @return: A TrialPlan for the model's trial design and seed
     """
-    setup = json.load(open(filename))
-    if "UserID" not in setup or "Conditions" not in setup:
-        print("Error: wrong file format.")
-        sys.exit(1)
-    user_id = setup["UserID"]
-    conditions_string = setup['Conditions']
-    # inspired by: https://stackoverflow.com/questions/9763116/parse-a-tuple-from-a-string
-    conditions = [tuple(map(int, x.split(","))) for x in conditions_string.split(";")]
-    improve_pointing = bool(int(setup["ImprovePointing"]))
-    return user_id, conditions, improve_pointing
+    if plan is not None:
+        if not plan.matches(model.trials):
+            sys.stderr.write("%s was made for different conditions\n" % filename)
+            sys.exit(1)
+        if plan.seed != model.seed:
+            sys.stderr.write("%s has the seed %s, but the journaled session of user %s uses the seed %s\n"
+                             % (filename, plan.seed, model.user_id, model.seed))
+            sys.exit(1)
+        return plan
+    plan = TrialPlan(model.conditions, model.repetitions, model.seed, PointingExperimentTest.UI_WIDTH,
+                     PointingExperimentTest.UI_HEIGHT, None, PointingExperimentTest.MIN_NUM_TARGETS,
+                     PointingExperimentTest.MAX_NUM_TARGETS, model.trials.order, model.trials.participant)
+    plan.save(filename)
+    return plan
 
 
 if __name__ == '__main__':
@@ -1,8 +1,13 @@
 #!usr/bin/python3
 
 
+import heapq
 import math
-from PyQt5 import QtGui, QtCore
+
+from target_set import TargetSet, target_columns
+
+# NumPy is imported by load_numpy() on first use, it takes most of the time of importing this module
+np = None
 
 # This script was created by Alexander Frummet and Marco Batzdorf
 
@@ -15,6 +20,13 @@ especially when they are quite small. Due to the bigger size of this pointer in
 we hope that hitting targets becomes much faster. As already mentioned, there is the ability to switch of the
 circle and return to standard pointing when there are small targets lying next to each other so that a selection
 with the bubble pointer becomes quite hard or even impossible
+
+BUBBLE CURSOR (implemented as class BubbleCursor)
+The original technique by Grossman & Balakrishnan: the bubble resizes dynamically so that it always captures
+exactly one target, the one closest to the cursor
+
+This module does not import PyQt: colors are RGB tuples and the draw methods load the Qt drawing layer
+(qt_drawing.py) on first use, so hit-testing and GeometryUtils can be used without a display.
 """
 
 
@@ -25,16 +37,25 @@ class StandardPointingTechnique(object):
 
         No modifications or filtering are done to any mouse actions
 
-        @param targets: A list of all targets displayed to the user
+        Hits are computed at most once per cursor position and cached until the next filter() call.
+        If hover_changed is set, the hits are computed right in filter() and hover_changed(entered, left)
+        is called with the IDs of the targets the pointer entered and left, but only if the set of hovered
+        targets changed.
+
+        @param targets: A TargetSet or a list of all targets displayed to the user
         @param Target: Base class reference for a Target
+        @param spatial_index: SpatialIndex subclass used for hit-testing (chosen by target count by default)
 
     """
 
     targets = []
+    sprite_cache = None
+    hover_changed = None
 
-    def __init__(self, targets, Target):
-        self.targets = targets
+    def __init__(self, targets, Target, spatial_index=None):
         self.target_class = Target
+        self.index_class = spatial_index
+        self.update_targets(targets)
 
     ''' Filtering, storing and manipulating mouse move events
 
@@ -45,6 +66,19 @@ class StandardPointingTechnique(object):
     def filter(self, pos_x, pos_y):
         self.cursor_pos_x = pos_x
         self.cursor_pos_y = pos_y
+        self.hits = None
+        if self.hover_changed is not None:
+            self.update_hover()
+
+    ''' Compares the hits at the current position with the hovered targets and reports the difference'''
+
+    def update_hover(self):
+        previous = self.hovered
+        hits = self.get_target_ids_under_cursor()
+        if hits != previous:
+            self.hovered = hits
+            self.hover_changed([idx for idx in hits if idx not in previous],
+                               [idx for idx in previous if idx not in hits])
 
     ''' Draws the pointer's visual representation to the screen
 
@@ -54,6 +88,15 @@ class StandardPointingTechnique(object):
     def draw_pointer(self, painter):
         return
 
+    ''' Returns the area covered by the pointer's visual representation
+        Used to repaint only the parts of the screen the pointer moved over
+
+        @return: Tuple (x, y, width, height) or None if the pointer draws nothing
+    '''
+
+    def pointer_bounds(self):
+        return None
+
     ''' Checking which of the given targets is currently under
         the pointer's clickable area
 
@@ -61,22 +104,40 @@ class StandardPointingTechnique(object):
     '''
 
     def get_targets_under_cursor(self):
+        return self.index.select(self.get_target_ids_under_cursor())
 
-        hits = []
-        for target in self.targets:
-            if GeometryUtils.is_point_inside_circle([self.cursor_pos_x, self.cursor_pos_y],
+    ''' Like get_targets_under_cursor, but returns the IDs (positions in the target list) of the targets
+        The result is cached until the cursor moves
 
-                                                    [target.pos_x, target.pos_y], target.diameter):
-                hits.append(target)
-        return hits
+        @return: The ascending IDs of all targets that are currently under the pointer
+    '''
+
+    def get_target_ids_under_cursor(self):
+        if self.hits is None:
+            self.hits = list(self.hit_test())
+        return self.hits
+
+    ''' Hit-tests the current cursor position against the spatial index, overridden by the other techniques
+
+        @return: The ascending IDs of all targets under the pointer
+    '''
+
+    def hit_test(self):
+        return self.index.query_point_ids(self.cursor_pos_x, self.cursor_pos_y)
 
     ''' Helper class to replace the current targets with new ones
+        Rebuilds the spatial index used for hit-testing
+        Starts without hovered targets, no hover events are sent for the old targets
 
         @param targets: The new list of targets replacing the old target list
     '''
 
     def update_targets(self, targets):
         self.targets = targets
+        index_class = self.index_class or SpatialIndex.default_for(targets)
+        self.index = index_class(targets)
+        self.hits = None
+        self.hovered = []
 
 
 class PointingTechniqueFatBubble(StandardPointingTechnique):
@@ -88,43 +149,362 @@ class PointingTechniqueFatBubble(StandardPointingTechnique):
         @param targets: A list of all targets displayed to the user
         @param Target: Base class reference for a Target
         @param bubble_radius: Defines the extends of this pointer(bubble)
+        @param spatial_index: SpatialIndex subclass used for hit-testing (chosen by target count by default)
 
     """
 
-    COLOR_BLUE = QtGui.QColor(0, 0, 255)
+    COLOR_BLUE = (0, 0, 255)
 
-    def __init__(self, targets, Target, bubble_radius=20):
-        super().__init__(targets, Target)
+    def __init__(self, targets, Target, bubble_radius=20, spatial_index=None):
+        super().__init__(targets, Target, spatial_index)
         self.cursor_area_radius = bubble_radius
 
     ''' In addition to the system's standard pointer representation a blue circle
         is drawn around the center
+        Blits a pre-rendered sprite if a SpriteCache is set
 
         @param painter: PyQt QPainter object that can draw to the canvas
     '''
 
     def draw_pointer(self, painter):
-        painter.setBrush(self.COLOR_BLUE)
-        painter.drawEllipse(QtCore.QPoint(self.cursor_pos_x, self.cursor_pos_y), self.cursor_area_radius,
-                            self.cursor_area_radius)
+        import qt_drawing
+        qt_drawing.draw_sprite(painter, self.sprite_cache, self.cursor_pos_x, self.cursor_pos_y,
+                               self.cursor_area_radius, self.COLOR_BLUE, "pointer")
+
+    def pointer_bounds(self):
+        radius = self.cursor_area_radius
+        return self.cursor_pos_x - radius, self.cursor_pos_y - radius, 2 * radius, 2 * radius
 
     ''' Checking which of the given targets is currently under
         the pointer's clickable area
 
-        @return: A list of all targets that are currently under the pointer
+        @return: The ascending IDs of all targets that are currently under the pointer
     '''
 
-    def get_targets_under_cursor(self):
+    def hit_test(self):
+        return self.index.query_circle_ids(self.cursor_pos_x, self.cursor_pos_y, self.cursor_area_radius)
+
+
+class BubbleCursor(StandardPointingTechnique):
+    """
+        Bubble Cursor (Grossman & Balakrishnan 2005)
+        The bubble always captures the target whose edge is closest to the cursor. Its radius is
+        min(ConD of the nearest target, IntD of the second nearest target), where IntD is the distance to a
+        target's closest edge and ConD the distance to its farthest edge. If the bubble can not contain the
+        captured target completely, a second circle is drawn around that target.
+
+        The two nearest targets are queried with the ones of the previous cursor position as a hint,
+        which keeps the number of tested targets small while the cursor moves continuously.
+
+        @param targets: A TargetSet or a list of all targets displayed to the user
+        @param Target: Base class reference for a Target
+        @param spatial_index: SpatialIndex subclass used for the nearest target queries, UniformGridIndex by default
+
+    """
+
+    COLOR_BLUE = (0, 0, 255)
+    CAPTURE_MARGIN = 3
+
+    def __init__(self, targets, Target, spatial_index=None):
+        super().__init__(targets, Target, spatial_index or UniformGridIndex)
+
+    ''' Replaces the targets and forgets the nearest targets of the previous trial'''
+
+    def update_targets(self, targets):
+        super().update_targets(targets)
+        self.nearest = []
+        self.captured = None
+        self.cursor_area_radius = 0
+        self.capture_radius = 0
+
+    ''' Stores the new mouse position and resizes the bubble for it'''
+
+    def filter(self, pos_x, pos_y):
+        self.resize_bubble(pos_x, pos_y)
+        super().filter(pos_x, pos_y)
+
+    ''' Captures the nearest target and calculates the bubble's radius for the given position'''
+
+    def resize_bubble(self, pos_x, pos_y):
+        self.nearest = self.index.query_nearest(pos_x, pos_y, 2, [idx for distance, idx in self.nearest])
+        if not self.nearest:
+            self.captured = None
+            self.cursor_area_radius = 0
+            self.capture_radius = 0
+            return
+        int_distance, self.captured = self.nearest[0]
+        radius = self.index.diameters[self.captured] / 2
+        containment_distance = int_distance + 2 * radius
+        if len(self.nearest) > 1:
+            self.cursor_area_radius = max(0, min(containment_distance, self.nearest[1][0]))
+        else:
+            self.cursor_area_radius = containment_distance
+        # the captured target sticks out of the bubble, so it gets its own circle
+        self.capture_radius = radius + self.CAPTURE_MARGIN if self.cursor_area_radius < containment_distance else 0
+
+    ''' Draws the bubble and, if needed, the circle around the captured target
+
+        @param painter: PyQt QPainter object that can draw to the canvas
+    '''
+
+    def draw_pointer(self, painter):
+        import qt_drawing
+        qt_drawing.draw_circle(painter, self.cursor_pos_x, self.cursor_pos_y, self.cursor_area_radius, self.COLOR_BLUE)
+        if self.capture_radius:
+            qt_drawing.draw_circle(painter, self.index.xs[self.captured], self.index.ys[self.captured],
+                                   self.capture_radius)
+
+    def pointer_bounds(self):
+        radius = self.cursor_area_radius
+        left, top = self.cursor_pos_x - radius, self.cursor_pos_y - radius
+        right, bottom = self.cursor_pos_x + radius, self.cursor_pos_y + radius
+        if self.capture_radius:
+            pos_x, pos_y = self.index.xs[self.captured], self.index.ys[self.captured]
+            left, top = min(left, pos_x - self.capture_radius), min(top, pos_y - self.capture_radius)
+            right, bottom = max(right, pos_x + self.capture_radius), max(bottom, pos_y + self.capture_radius)
+        return left, top, right - left, bottom - top
+
+    ''' Returns the ID of the captured target, the bubble always captures exactly one target if there are any'''
+
+    def hit_test(self):
+        return [] if self.captured is None else [self.captured]
+
+
+class SpatialIndex(object):
+    """
+        Base class for the spatial indices used by the pointing techniques for hit-testing
+        Answers point-in-circle and circle-overlap queries against a static list of targets.
+        This base implementation simply tests every target and is used as a reference
+        for the faster indices below.
+        Queries work on the coordinate columns of the targets and return target IDs (positions in the target list),
+        the object returning variants map these IDs back to targets.
+
+        @param targets: A TargetSet or a list of all targets displayed to the user
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.xs, self.ys, self.diameters = target_columns(targets)
+        self.max_radius = max(self.diameters) / 2 if len(self.diameters) else 0
+
+    ''' Picks the index that answers queries fastest for the given targets
+        Large target lists use the vectorized ArrayIndex if NumPy is available
+
+        @return: A SpatialIndex subclass
+    '''
+
+    @staticmethod
+    def default_for(targets):
+        if len(targets) >= ArrayIndex.MIN_TARGETS and load_numpy(required=False) is not None:
+            return ArrayIndex
+        return UniformGridIndex
+
+    ''' Returns the indices of all targets that could possibly touch the given circle
+
+        @param pos_x: X-Coordinate of the query circle's center
+        @param pos_y: Y-Coordinate of the query circle's center
+        @param radius: Radius of the query circle
+
+        @return: An iterable of target indices in ascending order
+    '''
+
+    def candidates(self, pos_x, pos_y, radius):
+        return range(len(self.targets))
+
+    ''' Checks which targets contain the given point
+
+        @return: A list of all targets containing the point, in the order of the target list
+    '''
+
+    def query_point(self, pos_x, pos_y):
+        return self.select(self.query_point_ids(pos_x, pos_y))
+
+    ''' Checks which targets are intersecting the given circle
+
+        @return: A list of all targets intersecting the circle, in the order of the target list
+    '''
+
+    def query_circle(self, pos_x, pos_y, radius):
+        return self.select(self.query_circle_ids(pos_x, pos_y, radius))
+
+    ''' Returns the IDs of all targets containing the given point, in ascending order'''
+
+    def query_point_ids(self, pos_x, pos_y):
+        return self.query_circle_ids(pos_x, pos_y, 0)
+
+    ''' Returns the IDs of all targets intersecting the given circle, in ascending order
+        Distances are compared squared so no square root is needed per target
+    '''
+
+    def query_circle_ids(self, pos_x, pos_y, radius):
         hits = []
-        for target in self.targets:
-            if GeometryUtils.are_circles_intersecting(self.cursor_pos_x,
-                                                      self.cursor_pos_y,
-                                                      self.cursor_area_radius,
-                                                      target.pos_x, target.pos_y,
-                                                      target.diameter / 2):
-                hits.append(target)
+        xs = self.xs
+        ys = self.ys
+        diameters = self.diameters
+        for idx in self.candidates(pos_x, pos_y, radius):
+            dx = xs[idx] - pos_x
+            dy = ys[idx] - pos_y
+            reach = radius + diameters[idx] / 2
+            if dx * dx + dy * dy <= reach * reach:
+                hits.append(idx)
         return hits
 
+    ''' Finds the targets whose edges are closest to the given point
+        The distance to a target's edge (IntD) is the distance to its center minus its radius,
+        negative if the point is inside the target.
+        Targets found for a previous, nearby point are passed as hint: the largest of their distances bounds
+        the search, so only the candidates around the point have to be tested instead of every target.
+
+        @param count: How many targets should be found
+        @param hint: IDs of targets that are probably close to the point, e.g. the result for the last position
+
+        @return: A list of up to count (distance, ID) tuples, nearest first
+    '''
+
+    def query_nearest(self, pos_x, pos_y, count=2, hint=()):
+        xs = self.xs
+        ys = self.ys
+        diameters = self.diameters
+        hint = set(idx for idx in hint if idx < len(xs))
+        if hint and len(hint) >= min(count, len(xs)):
+            bound = max(math.hypot(xs[idx] - pos_x, ys[idx] - pos_y) - diameters[idx] / 2 for idx in hint)
+            candidates = self.candidates(pos_x, pos_y, max(bound, 0) + self.max_radius)
+        else:
+            candidates = range(len(xs))
+        return heapq.nsmallest(count, ((math.hypot(xs[idx] - pos_x, ys[idx] - pos_y) - diameters[idx] / 2, idx)
+                                       for idx in candidates))
+
+    ''' Maps target IDs to the targets
+
+        @param ids: An iterable of target IDs
+
+        @return: A list of targets
+    '''
+
+    def select(self, ids):
+        if isinstance(self.targets, TargetSet):
+            return self.targets.select(ids)
+        targets = self.targets
+        return [targets[idx] for idx in ids]
+
+
+class UniformGridIndex(SpatialIndex):
+    """
+        Spatial index bucketing the targets into a uniform grid
+        The cell size is derived from the largest target so every target only covers a few cells
+        and a query only has to look at the targets stored in the cells it overlaps.
+
+        @param targets: A list of all targets displayed to the user
+        @param cell_size: Edge length of a grid cell, defaults to the largest target diameter
+    """
+
+    MIN_CELL_SIZE = 16
+
+    def __init__(self, targets, cell_size=None):
+        super().__init__(targets)
+        if cell_size is None:
+            cell_size = max(list(self.diameters) + [self.MIN_CELL_SIZE])
+        self.cell_size = cell_size
+        self.cells = {}
+        for idx, (pos_x, pos_y, diameter) in enumerate(zip(self.xs, self.ys, self.diameters)):
+            for cell in self._cells_covering(pos_x, pos_y, diameter / 2):
+                self.cells.setdefault(cell, []).append(idx)
+
+    ''' Helper returning the range (min_x, max_x, min_y, max_y) of the grid cells overlapping a circle's bounding box'''
+
+    def _cell_range(self, pos_x, pos_y, radius):
+        size = self.cell_size
+        return (math.floor((pos_x - radius) / size), math.floor((pos_x + radius) / size),
+                math.floor((pos_y - radius) / size), math.floor((pos_y + radius) / size))
+
+    ''' Helper yielding the grid coordinates of all cells overlapping the bounding box of a circle'''
+
+    def _cells_covering(self, pos_x, pos_y, radius):
+        min_x, max_x, min_y, max_y = self._cell_range(pos_x, pos_y, radius)
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                yield cell_x, cell_y
+
+    ''' Large query circles (e.g. nearest target searches) cover more cells than there are occupied ones,
+        in that case the occupied cells are filtered instead
+    '''
+
+    def candidates(self, pos_x, pos_y, radius):
+        found = set()
+        cells = self.cells
+        min_x, max_x, min_y, max_y = self._cell_range(pos_x, pos_y, radius)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(cells):
+            for (cell_x, cell_y), bucket in cells.items():
+                if min_x <= cell_x <= max_x and min_y <= cell_y <= max_y:
+                    found.update(bucket)
+            return sorted(found)
+        for cell in self._cells_covering(pos_x, pos_y, radius):
+            bucket = cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return sorted(found)
+
+
+''' Imports NumPy when it is needed the first time
+
+    @param required: Whether a missing NumPy raises an ImportError or returns None
+
+    @return: The numpy module
+'''
+
+
+def load_numpy(required=True):
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            if required:
+                raise ImportError("NumPy is required for the vectorized hit-testing")
+            return None
+        np = numpy
+    return np
+
+
+class ArrayIndex(SpatialIndex):
+    """
+        Spatial index storing all target positions and radii in NumPy arrays
+        Every query is answered by a single vectorized call to the batch functions of GeometryUtils,
+        which pays off for target lists with thousands of entries.
+
+        @param targets: A list of all targets displayed to the user
+    """
+
+    MIN_TARGETS = 2000
+
+    def __init__(self, targets):
+        super().__init__(targets)
+        self.centers, diameters = GeometryUtils.targets_to_arrays(targets)
+        self.radii = diameters / 2
+
+    def candidates(self, pos_x, pos_y, radius):
+        mask = GeometryUtils.circles_intersecting_circles([[pos_x, pos_y]], [radius],
+                                                          self.centers, self.radii)[0]
+        return np.flatnonzero(mask)
+
+    ''' Returns the IDs of all targets intersecting the given circle as an integer array'''
+
+    def query_circle_ids(self, pos_x, pos_y, radius):
+        return self.candidates(pos_x, pos_y, radius)
+
+    ''' Finds the targets whose edges are closest to the given point with a single vectorized pass,
+        the hint is not needed
+    '''
+
+    def query_nearest(self, pos_x, pos_y, count=2, hint=()):
+        if not len(self.radii):
+            return []
+        distances = GeometryUtils.distances_between_points([[pos_x, pos_y]], self.centers)[0] - self.radii
+        count = min(count, len(distances))
+        nearest = np.argpartition(distances, count - 1)[:count]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [(float(distances[idx]), int(idx)) for idx in nearest]
+
 
 class GeometryUtils:
     """
@@ -141,7 +521,7 @@ class GeometryUtils:
 
     @staticmethod
     def calculate_distance_between_points(point1, point2):
-        return math.sqrt(math.pow(point2[0] - point1[0], 2) + math.pow(point2[1] - point1[1], 2))
+        return math.hypot(point2[0] - point1[0], point2[1] - point1[1])
 
     ''' Checks if two circles are colliding with each other
 
@@ -176,3 +556,124 @@ class GeometryUtils:
         if distance <= diameter / 2:
             return True
         return False
+
+    ''' Converts a list of targets into arrays usable by the batch functions below
+
+        @param targets: A TargetSet or a list of objects with pos_x, pos_y and diameter attributes
+
+        @return: A (N, 2) array of center points and a (N,) array of diameters
+    '''
+
+    @staticmethod
+    def targets_to_arrays(targets):
+        load_numpy()
+        xs, ys, diameters = target_columns(targets)
+        centers = np.column_stack([np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)]).reshape(-1, 2)
+        return centers, np.array(diameters, dtype=float)
+
+    ''' Calculates the distances between every point of one set and every point of another set
+
+        @param points1: Array-like of shape (N, 2)
+        @param points2: Array-like of shape (M, 2)
+
+        @return: Array of shape (N, M) holding all distances
+    '''
+
+    @staticmethod
+    def distances_between_points(points1, points2):
+        load_numpy()
+        return np.sqrt(GeometryUtils._squared_distances(points1, points2))
+
+    ''' Checks every point against every circle, the batch version of is_point_inside_circle
+
+        @param points: Array-like of shape (N, 2)
+        @param centers: Array-like of shape (M, 2) with the circles' center points
+        @param diameters: Array-like of shape (M,) with the circles' diameters
+
+        @return: Boolean mask of shape (N, M), True where point n is inside circle m
+    '''
+
+    @staticmethod
+    def points_inside_circles(points, centers, diameters):
+        load_numpy()
+        radii = np.asarray(diameters, dtype=float) / 2
+        return GeometryUtils._squared_distances(points, centers) <= radii * radii
+
+    ''' Checks every circle of one set against every circle of another set,
+        the batch version of are_circles_intersecting
+
+        @param centers1: Array-like of shape (N, 2)
+        @param radii1: Array-like of shape (N,)
+        @param centers2: Array-like of shape (M, 2)
+        @param radii2: Array-like of shape (M,)
+
+        @return: Boolean mask of shape (N, M), True where circle n intersects circle m
+    '''
+
+    @staticmethod
+    def circles_intersecting_circles(centers1, radii1, centers2, radii2):
+        load_numpy()
+        reach = np.asarray(radii1, dtype=float)[:, None] + np.asarray(radii2, dtype=float)[None, :]
+        return GeometryUtils._squared_distances(centers1, centers2) <= reach * reach
+
+    ''' Finds all (point, circle) pairs where the point lies inside the circle
+        The points are processed in chunks so that large recordings never build the full N x M matrix at once
+
+        @param points: Array-like of shape (N, 2), e.g. recorded cursor samples
+        @param centers: Array-like of shape (M, 2) with the circles' center points
+        @param diameters: Array-like of shape (M,) with the circles' diameters
+        @param chunk_size: Number of points tested per vectorized call
+
+        @return: Two integer arrays holding the point indices and the matching circle indices
+    '''
+
+    @staticmethod
+    def circles_containing_points(points, centers, diameters, chunk_size=8192):
+        load_numpy()
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        point_indices = []
+        circle_indices = []
+        for start in range(0, len(points), chunk_size):
+            mask = GeometryUtils.points_inside_circles(points[start:start + chunk_size], centers, diameters)
+            rows, cols = np.nonzero(mask)
+            point_indices.append(rows + start)
+            circle_indices.append(cols)
+        if not point_indices:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(point_indices), np.concatenate(circle_indices)
+
+    ''' Calculates which circles of a layout overlap each other
+
+        @param centers: Array-like of shape (N, 2) with the circles' center points
+        @param radii: Array-like of shape (N,) with the circles' radii
+
+        @return: Symmetric boolean matrix of shape (N, N) with a False diagonal
+    '''
+
+    @staticmethod
+    def overlap_matrix(centers, radii):
+        load_numpy()
+        overlaps = GeometryUtils.circles_intersecting_circles(centers, radii, centers, radii)
+        np.fill_diagonal(overlaps, False)
+        return overlaps
+
+    ''' Lists all pairs of overlapping circles of a layout
+
+        @return: Integer array of shape (K, 2) holding index pairs (i, j) with i < j
+    '''
+
+    @staticmethod
+    def overlapping_pairs(centers, radii):
+        load_numpy()
+        return np.argwhere(np.triu(GeometryUtils.overlap_matrix(centers, radii)))
+
+    ''' Helper calculating the squared distances between two point sets via broadcasting'''
+
+    @staticmethod
+    def _squared_distances(points1, points2):
+        load_numpy()
+        points1 = np.asarray(points1, dtype=float).reshape(-1, 2)
+        points2 = np.asarray(points2, dtype=float).reshape(-1, 2)
+        dx = points1[:, 0, None] - points2[None, :, 0]
+        dy = points1[:, 1, None] - points2[None, :, 1]
+        return dx * dx + dy * dy
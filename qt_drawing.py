@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+
+from PyQt5 import QtGui, QtCore
+
+"""
+QT DRAWING LAYER
+Drawing helpers for the pointing techniques. The techniques themselves only store colors as RGB tuples and
+import this module on their first draw call, so hit-testing and the geometry code never load PyQt.
+"""
+
+_colors = {}
+
+
+''' Returns the QColor for an (r, g, b) tuple, every color is only created once'''
+
+
+def color(rgb):
+    qcolor = _colors.get(rgb)
+    if qcolor is None:
+        qcolor = _colors[rgb] = QtGui.QColor(*rgb)
+    return qcolor
+
+
+''' Draws a circle with the painter's pen
+
+    @param painter: PyQt QPainter object that can draw to the canvas
+    @param fill: (r, g, b) tuple of the fill color, None draws only the outline
+'''
+
+
+def draw_circle(painter, pos_x, pos_y, radius, fill=None):
+    painter.setBrush(color(fill) if fill is not None else QtCore.Qt.NoBrush)
+    painter.drawEllipse(QtCore.QPointF(pos_x, pos_y), radius, radius)
+
+
+''' Draws a circle from the sprite cache, falls back to draw_circle if there is no cache
+
+    @param sprite_cache: A SpriteCache or None
+    @param state: Additional key of the sprite, see SpriteCache.sprite
+'''
+
+
+def draw_sprite(painter, sprite_cache, pos_x, pos_y, radius, fill, state=None):
+    if sprite_cache is None:
+        draw_circle(painter, pos_x, pos_y, radius, fill)
+        return
+    sprite_cache.draw(painter, pos_x, pos_y, 2 * radius, color(fill), painter.pen().color(), state)
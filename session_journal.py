@@ -0,0 +1,289 @@
+#!/usr/bin/python3
+
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+"""
+SESSION JOURNAL
+Append-only journal of everything that changes the state of a running session: the session itself
+(setup including the trial design, and seed), every missed click and every completed trial including its log record.
+Every event is one json line handed to the operating system right away, so a crash of the application
+loses nothing. fsync runs on a background thread in batches (every SYNC_EVERY events or SYNC_INTERVAL seconds),
+which bounds what a power loss can take without ever blocking the UI thread on the disk.
+
+Every CHECKPOINT_EVERY completed trials the current state and the journal offset it belongs to are written to
+a checkpoint file, together with the state of the session's running statistics if the journal keeps them.
+Recovering a session only replays the events written after the last checkpoint, so resuming
+takes time proportional to the new records, not to the whole session. A torn last line is cut off.
+
+usage: python3 session_journal.py <user.journal> [-o records.csv]   exports the journaled trial records
+"""
+
+SYNC_EVERY = 8
+SYNC_INTERVAL = 1.0
+CHECKPOINT_EVERY = 16
+
+
+class SessionJournal(object):
+    """
+        Crash-safe, append-only journal of a single session
+
+        @param filename: The journal file, the checkpoint is stored next to it
+        @param sync_every: Number of events after which the journal is synced to disk
+        @param sync_interval: Longest time in seconds an event stays unsynced
+        @param checkpoint_every: Number of completed trials between two checkpoints
+
+        The statistics passed to recover() or start() (an object with add(record), to_state() and load_state(state)
+        like online_stats.SessionStatistics) are saved with every checkpoint and restored by recover().
+    """
+
+    def __init__(self, filename, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        self.filename = filename
+        self.checkpoint_filename = filename + ".checkpoint"
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.fd = None
+        self.state = None
+        self.offset = 0
+        self.unsynced = 0
+        self.trials_since_checkpoint = 0
+        self.statistics = None
+        self.sync_requested = threading.Event()
+        self.closed = False
+        self.sync_thread = None
+
+    ''' Looks for an unfinished session with the given setup in the journal
+
+        @param info: Dictionary describing the setup (user, conditions, ...), only a journal of the same setup is used
+        @param statistics: Running statistics that are restored from the checkpoint and updated with the trials
+                           journaled after it, they are only valid if a session is returned
+
+        @return: The state of the unfinished session (a dictionary with info, seed, elapsed and errors)
+                 or None if there is none
+    '''
+
+    def recover(self, info, statistics=None):
+        if not os.path.exists(self.filename):
+            return None
+        state, offset, statistics_state = self.load_checkpoint()
+        if statistics is not None and statistics_state is not None:
+            statistics.load_state(statistics_state)
+        with open(self.filename, "rb") as journal:
+            journal.seek(offset)
+            data = journal.read()
+        position = 0
+        while True:
+            end = data.find(b"\n", position)
+            if end < 0:
+                break
+            try:
+                event = json.loads(data[position:end].decode("utf-8"))
+            except ValueError:
+                break
+            state = apply_event(state, event)
+            if statistics is not None and state is not None and event["event"] == "trial":
+                statistics.add(event["record"])
+            position = end + 1
+        if position < len(data):
+            sys.stderr.write("%s: dropping %d bytes of a torn event\n" % (self.filename, len(data) - position))
+        if state is None or state["ended"] or state["info"] != info:
+            self.archive()
+            return None
+        self.statistics = statistics
+        self.open(offset + position, state)
+        return state
+
+    ''' Reads the last checkpoint, falls back to replaying from the start if it does not match the journal'''
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_filename):
+            return None, 0, None
+        try:
+            with open(self.checkpoint_filename) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except ValueError:
+            return None, 0, None
+        # after a power loss the journal may be shorter than the checkpoint, then everything is replayed
+        if checkpoint["offset"] > os.path.getsize(self.filename):
+            return None, 0, None
+        return checkpoint["state"], checkpoint["offset"], checkpoint.get("statistics")
+
+    ''' Moves a finished or foreign journal out of the way'''
+
+    def archive(self):
+        suffix = time.strftime(".%Y%m%d-%H%M%S")
+        os.replace(self.filename, self.filename + suffix)
+        if os.path.exists(self.checkpoint_filename):
+            os.remove(self.checkpoint_filename)
+
+    ''' Starts a new session in the journal
+
+        @param info: Dictionary describing the setup, compared by recover()
+        @param seed: Seed of the session's trial plan
+        @param statistics: Running statistics of the session saved with every checkpoint
+    '''
+
+    def start(self, info, seed, statistics=None):
+        self.statistics = statistics
+        self.open(0, None)
+        self.append({"event": "session", "info": info, "seed": seed})
+        self.write_checkpoint()
+
+    ''' Opens the journal for appending, cutting off everything behind offset'''
+
+    def open(self, offset, state):
+        self.fd = os.open(self.filename, os.O_WRONLY | os.O_CREAT, 0o644)
+        os.ftruncate(self.fd, offset)
+        os.lseek(self.fd, offset, os.SEEK_SET)
+        self.offset = offset
+        self.state = state
+        self.sync_thread = threading.Thread(target=self.run, daemon=True)
+        self.sync_thread.start()
+
+    ''' Appends an event, the event is handed to the operating system before this returns'''
+
+    def append(self, event):
+        line = (json.dumps(event, default=str) + "\n").encode("utf-8")
+        os.write(self.fd, line)
+        self.offset += len(line)
+        self.state = apply_event(self.state, event)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync_requested.set()
+        if event["event"] == "trial":
+            self.trials_since_checkpoint += 1
+            if self.trials_since_checkpoint >= self.checkpoint_every:
+                self.write_checkpoint()
+
+    ''' Journals a missed click'''
+
+    def error(self, elapsed, errors):
+        self.append({"event": "error", "elapsed": elapsed, "errors": errors})
+
+    ''' Journals a completed trial together with its log record (without the trajectory)'''
+
+    def trial(self, elapsed, record):
+        self.append({"event": "trial", "elapsed": elapsed,
+                     "record": {key: value for key, value in record.items() if key != "trajectory"}})
+
+    ''' Returns the log records of all trials journaled in this session, in order
+        The journal holds the session's records even if a crash kept them from the log files
+    '''
+
+    def records(self):
+        return list(journal_records(self.filename))
+
+    ''' Atomically stores the current state and the journal offset it belongs to'''
+
+    def write_checkpoint(self):
+        temp_name = self.checkpoint_filename + ".tmp"
+        with open(temp_name, "w") as checkpoint_file:
+            checkpoint = {"offset": self.offset, "state": self.state}
+            if self.statistics is not None:
+                checkpoint["statistics"] = self.statistics.to_state()
+            json.dump(checkpoint, checkpoint_file, default=str)
+        os.replace(temp_name, self.checkpoint_filename)
+        self.trials_since_checkpoint = 0
+
+    ''' Background thread syncing the journal in batches'''
+
+    def run(self):
+        while not self.closed:
+            self.sync_requested.wait(self.sync_interval)
+            self.sync_requested.clear()
+            self.sync()
+
+    def sync(self):
+        if self.unsynced and self.fd is not None:
+            self.unsynced = 0
+            os.fsync(self.fd)
+
+    ''' Syncs and closes the journal
+
+        @param finished: Whether the session is complete, a finished session is not resumed
+    '''
+
+    def close(self, finished=False):
+        if self.fd is None:
+            return
+        if finished:
+            self.append({"event": "end"})
+        self.closed = True
+        self.sync_requested.set()
+        self.sync_thread.join()
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.fd = None
+        if not finished:
+            self.write_checkpoint()
+
+
+''' Applies a journal event to a session state
+
+    @param state: The state before the event, None before the session event
+
+    @return: The new state
+'''
+
+
+def apply_event(state, event):
+    kind = event["event"]
+    if kind == "session":
+        return {"info": event["info"], "seed": event["seed"], "elapsed": 0, "errors": 0, "ended": False}
+    if state is None:
+        return None
+    if kind == "error":
+        state["elapsed"] = event["elapsed"]
+        state["errors"] = event["errors"]
+    elif kind == "trial":
+        state["elapsed"] = event["elapsed"] + 1
+        state["errors"] = 0
+    elif kind == "end":
+        state["ended"] = True
+    return state
+
+
+''' Reads all trial records of a journal (including archived ones), in order
+
+    @return: A generator yielding one log record per completed trial
+'''
+
+
+def journal_records(filename):
+    with open(filename, "rb") as journal:
+        for line in journal:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                event = json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            if event["event"] == "trial":
+                yield event["record"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports the trial records of a session journal as csv")
+    parser.add_argument("journal")
+    parser.add_argument("-o", "--output", help="csv file to write to (default: stdout)")
+    args = parser.parse_args()
+    records = list(journal_records(args.journal))
+    fields = list(records[0]) if records else []
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    out = csv.DictWriter(output, fields, delimiter=";", quoting=csv.QUOTE_ALL)
+    out.writeheader()
+    out.writerows(records)
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import columnar_log
+import pointing_technique as pt
+from pointing_experiment import ExperimentScene, PointingExperimentTest, Target
+from sprite_cache import SpriteCache
+from target_set import TargetSet
+from trial_design import TrialDesign
+from trial_plan import TrialPlan
+from PyQt5 import QtGui
+
+"""
+OFFSCREEN SESSION REPLAY
+Renders a recorded session frame by frame into offscreen images, as fast as the CPU allows, to audit
+sessions visually without re-running them by hand. The layouts of the trials come from the session's trial plan
+(a saved plan file or the seed in the session journal), the cursor path from the trajectory columns of the
+session's .npz log (pointing_experiment.py --columnar). A participant's .npz file holds all of their sessions,
+only the rows whose session_seed is the seed of the plan are replayed. Frames are drawn by the experiment
+widget's own drawing code (ExperimentScene: drawText, drawTargets, draw_pointer) at a fixed frame rate,
+every frame shows the last cursor sample before it. Sessions with improved pointing are shown with the fat
+bubble, since toggling it is not logged.
+
+Frames are rendered on a process pool, every worker has its own offscreen QGuiApplication. They are written
+as a numbered image sequence or streamed in order as raw 32-bit BGRA frames, e.g. into ffmpeg.
+Drawing a frame takes about a millisecond, so exporting is bound by encoding: PNG files are small but slow
+to write, BMP or PPM are several times faster, streaming raw frames is the fastest.
+
+    python3 session_replay.py user1.npz --journal user1.journal -o frames/ --format bmp
+    python3 session_replay.py user1.npz --plan user1.plan.json -o - | \\
+        ffmpeg -f rawvideo -pix_fmt bgra -s 1920x800 -r 60 -i - user1.mp4
+
+usage: python3 session_replay.py <log.npz> (--plan <plan file> | --journal <journal>) [-o frames/] [--format png]
+                                 [--fps 60] [-j N]
+"""
+
+FRAMES_PER_JOB = 16
+FRAME_NAME = "frame%06d.%s"
+
+
+class ReplayState(object):
+    """
+        Stands in for the experiment model while a frame is drawn
+
+        @param trials: Number of trials of the session
+    """
+
+    instrumentation = None
+
+    def __init__(self, trials):
+        self.trials = range(trials)
+        self.elapsed = 0
+        self.time_ms = 0
+
+    def elapsed_time(self):
+        return self.time_ms
+
+
+class ReplayRenderer(ExperimentScene):
+    """
+        Draws single frames of a session into an offscreen QImage
+        Creates an offscreen QGuiApplication if the process has none yet
+
+        @param trials: Number of trials of the session
+        @param width: Width of the frames, the experiment's screen width by default
+        @param height: Height of the frames, the experiment's screen height by default
+    """
+
+    def __init__(self, trials, width=PointingExperimentTest.UI_WIDTH, height=PointingExperimentTest.UI_HEIGHT):
+        if QtGui.QGuiApplication.instance() is None:
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        self.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication(["session_replay"])
+        self.image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+        self.background = QtGui.QGuiApplication.palette().color(QtGui.QPalette.Window)
+        self.model = ReplayState(trials)
+        self.text_font = QtGui.QFont('Decorative', 32)
+        self.text_height = QtGui.QFontMetrics(self.text_font).height()
+        self.sprite_cache = SpriteCache()
+        Target.sprite_cache = self.sprite_cache
+        self.pointing_techniques = {}
+        self.targets = TargetSet([], Target)
+        self.pointing_technique = None
+
+    def width(self):
+        return self.image.width()
+
+    def rect(self):
+        return self.image.rect()
+
+    ''' Shows the given trial in the following frames
+
+        @param index: Position of the trial in the session
+        @param layout: A list of (x, y, diameter) tuples, main target first
+        @param bubble: Whether the improved pointing technique is drawn
+    '''
+
+    def set_trial(self, index, layout, bubble):
+        self.model.elapsed = index
+        self.targets = TargetSet(layout, Target)
+        technique = self.pointing_techniques.get(bubble)
+        if technique is None:
+            if bubble:
+                technique = pt.PointingTechniqueFatBubble([], Target, PointingExperimentTest.BUBBLE_RADIUS)
+            else:
+                technique = pt.StandardPointingTechnique([], Target)
+            technique.sprite_cache = self.sprite_cache
+            self.pointing_techniques[bubble] = technique
+        technique.update_targets(self.targets)
+        self.pointing_technique = technique
+
+    ''' Draws a complete frame
+
+        @param time_ms: Time since the start of the trial shown by the timer text
+        @param pos_x: Cursor position on the X-Axis
+        @param pos_y: Cursor position on the Y-Axis
+
+        @return: The QImage, it is reused by the next call
+    '''
+
+    def render(self, time_ms, pos_x, pos_y):
+        self.model.time_ms = time_ms
+        self.pointing_technique.filter(pos_x, pos_y)
+        self.image.fill(self.background)
+        qp = QtGui.QPainter(self.image)
+        self.paintScene(qp)
+        qp.end()
+        return self.image
+
+
+''' Returns the raw pixels of a frame as bytes (BGRA on little endian machines)'''
+
+
+def image_bytes(image):
+    bits = image.constBits()
+    bits.setsize(image.bytesPerLine() * image.height())
+    return bytes(bits)
+
+
+''' Picks the cursor sample shown in every frame of a trial
+
+    @param t_ns: The trajectory's timestamps in nanoseconds
+    @param fps: Frame rate of the replay
+
+    @return: Two arrays with the time of every frame in ms since the first sample and the index of its sample
+'''
+
+
+def frame_samples(t_ns, fps):
+    if not len(t_ns):
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    offsets = np.arange(int((t_ns[-1] - t_ns[0]) * fps // 1000000000) + 1) * (1e9 / fps)
+    samples = np.searchsorted(t_ns, t_ns[0] + offsets, side="right") - 1
+    return offsets / 1e6, samples
+
+
+''' Reads the trial plan of a session from its journal, the same plan the experiment widget uses'''
+
+
+def plan_from_journal(filename):
+    with open(filename) as journal:
+        session = json.loads(journal.readline())
+    if session.get("event") != "session":
+        raise ValueError("%s: not a session journal" % filename)
+    design = TrialDesign.from_dict(session["info"]["design"])
+    return TrialPlan(design.conditions, design.repetitions, session["seed"], PointingExperimentTest.UI_WIDTH,
+                     PointingExperimentTest.UI_HEIGHT, None, PointingExperimentTest.MIN_NUM_TARGETS,
+                     PointingExperimentTest.MAX_NUM_TARGETS, design.order, design.participant)
+
+
+_renderer = None
+_output_dir = None
+_image_format = None
+
+
+''' Sets up the renderer of a worker process
+
+    @param trials: Number of trials of the session
+    @param output_dir: Directory the frames are saved to, None returns the raw frames
+    @param image_format: File extension of the saved frames, e.g. "png"
+'''
+
+
+def init_worker(trials, output_dir, image_format):
+    global _renderer, _output_dir, _image_format
+    _renderer = ReplayRenderer(trials)
+    _output_dir = output_dir
+    _image_format = image_format
+
+
+''' Renders the frames of a job in a worker process
+
+    @param job: Tuple (number of the first frame, trial index, layout, bubble, [(time_ms, x, y), ...])
+
+    @return: The number of saved frames, or a list with the raw bytes of every frame if there is no output directory
+'''
+
+
+def render_job(job):
+    first_frame, index, layout, bubble, frames = job
+    _renderer.set_trial(index, layout, bubble)
+    rendered = []
+    for number, (time_ms, pos_x, pos_y) in enumerate(frames, first_frame):
+        image = _renderer.render(time_ms, pos_x, pos_y)
+        if _output_dir is None:
+            rendered.append(image_bytes(image))
+        elif not image.save(os.path.join(_output_dir, FRAME_NAME % (number, _image_format))):
+            raise IOError("could not write frame %d to %s" % (number, _output_dir))
+    return rendered if _output_dir is None else len(frames)
+
+
+class SessionReplay(object):
+    """
+        Replays the trials of a recorded session on a pool of rendering processes
+        Rows of other sessions in the log (another session_seed than the plan's seed) are skipped,
+        logs without a session_seed column are taken to hold the plan's session only
+
+        @param columns: The log columns as returned by columnar_log.load_columns()
+        @param plan: The session's TrialPlan
+        @param fps: Frame rate of the replay
+        @param processes: Number of worker processes, one per CPU core by default
+    """
+
+    def __init__(self, columns, plan, fps=60, processes=None):
+        self.columns = columns
+        self.plan = plan
+        self.fps = fps
+        self.processes = processes or multiprocessing.cpu_count()
+        seeds = columns.get("session_seed")
+        self.rows = [row for row in range(len(columns["trial"])) if seeds is None or seeds[row] == plan.seed]
+        if not self.rows:
+            raise ValueError("the log contains no trials of the session with seed %s" % plan.seed)
+
+    ''' Splits the session into jobs of at most FRAMES_PER_JOB frames, in frame order'''
+
+    def jobs(self):
+        offsets = self.columns["trajectory_offsets"]
+        frame_number = 0
+        for row in self.rows:
+            index = self.columns["trial"][row]
+            t_ns = self.columns["trajectory_t_ns"][offsets[row]:offsets[row + 1]]
+            xs = self.columns["trajectory_x"][offsets[row]:offsets[row + 1]]
+            ys = self.columns["trajectory_y"][offsets[row]:offsets[row + 1]]
+            times, samples = frame_samples(t_ns, self.fps)
+            frames = list(zip(times.astype(int).tolist(), xs[samples].tolist(), ys[samples].tolist()))
+            layout = self.plan.trial(int(index)).layout
+            bubble = bool(self.columns["improved_pointing"][row])
+            for start in range(0, len(frames), FRAMES_PER_JOB):
+                yield frame_number + start, int(index), layout, bubble, frames[start:start + FRAMES_PER_JOB]
+            frame_number += len(frames)
+
+    ''' Renders all frames
+
+        @param output_dir: Directory the frames are saved to, None returns the raw frames
+        @param image_format: File extension of the saved frames
+
+        @return: A generator yielding the result of render_job() for every job, in frame order
+    '''
+
+    def run(self, output_dir=None, image_format="png"):
+        args = (len(self.plan), output_dir, image_format)
+        if self.processes == 1:
+            init_worker(*args)
+            for job in self.jobs():
+                yield render_job(job)
+            return
+        with multiprocessing.Pool(self.processes, init_worker, args) as pool:
+            for result in pool.imap(render_job, self.jobs()):
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders a recorded session into offscreen frames")
+    parser.add_argument("log", help=".npz log of the session (columnar output)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--plan", help="trial plan file of the session")
+    source.add_argument("--journal", help="session journal, the plan is regenerated from its seed")
+    parser.add_argument("-o", "--output", default="frames",
+                        help="directory for the frames, - streams raw BGRA frames to stdout")
+    parser.add_argument("--format", default="png", help="image format of the frames, e.g. png, jpg, bmp or ppm")
+    parser.add_argument("--fps", type=float, default=60)
+    parser.add_argument("-j", "--processes", type=int, help="worker processes (default: number of CPU cores)")
+    args = parser.parse_args()
+    plan = TrialPlan.load(args.plan) if args.plan else plan_from_journal(args.journal)
+    names = ["trial", "improved_pointing", "trajectory_offsets"] + [name for name, typecode in
+                                                                     columnar_log.TRAJECTORY_COLUMNS]
+    if "session_seed" in columnar_log.column_names(args.log):
+        names.append("session_seed")
+    columns = columnar_log.load_columns(args.log, names)
+    replay = SessionReplay(columns, plan, args.fps, args.processes)
+    stream = args.output == "-"
+    if not stream:
+        os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    frames = 0
+    for result in replay.run(None if stream else args.output, args.format):
+        if stream:
+            for frame in result:
+                sys.stdout.buffer.write(frame)
+            frames += len(result)
+        else:
+            frames += result
+    duration = time.perf_counter() - start
+    sys.stderr.write("%d frames (%.1f s at %g fps) in %.1f s with %d processes\n"
+                     % (frames, frames / args.fps, args.fps, duration, replay.processes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+
+
+import argparse
+import csv
+import datetime
+import math
+import random
+import sys
+
+try:
+    import pointing_technique as pt
+except ImportError:
+    print("Could not import pointing_technique.py")
+import experiment_model
+from target_set import TargetSet, TargetView
+from trial_design import participant_number
+from trial_plan import TrialPlan
+
+"""
+HEADLESS SIMULATION
+Runs the pointing experiment without a Qt event loop. Cursor trajectories are either generated from a
+Fitts' law movement model or taken from a recording, and are fed through the same filter() and
+get_target_ids_under_cursor() calls the experiment UI uses. Angles and layouts come from a TrialPlan, like in
+PointingExperimentTest, so a simulation and a real session with the same seed see the same layouts.
+Every trial produces the same record as PointingExperimentModel.log_time, so simulated and real logs
+can be analyzed together.
+
+usage: python3 simulation.py <setup file> [-o output.csv] [--seed N]
+"""
+
+
+class FittsMovementModel(object):
+    """
+        Generates synthetic cursor movements following Fitts' law
+        The movement time is a + b * log2(D / W + 1) with multiplicative noise,
+        the path follows a minimum-jerk velocity profile and the end point scatters
+        normally around the target so that the effective width matches W.
+        W is the width the participant aims at: the target size, or the larger area a pointing technique selects
+        the target with (see HeadlessSimulation.aim_width).
+
+        @param intercept: Fitts' law intercept a in ms
+        @param slope: Fitts' law slope b in ms/bit
+        @param sample_rate: Mouse polling rate in Hz used for the generated samples
+        @param time_noise: Relative standard deviation of the movement time
+        @param endpoint_spread: Scales the end point scatter, 1.0 means an effective width equal to W
+    """
+
+    def __init__(self, intercept=200, slope=150, sample_rate=125, time_noise=0.1, endpoint_spread=1.0):
+        self.intercept = intercept
+        self.slope = slope
+        self.sample_rate = sample_rate
+        self.time_noise = time_noise
+        self.endpoint_spread = endpoint_spread
+
+    ''' Returns a noisy movement time in ms for the given distance and target size'''
+
+    def movement_time(self, distance, size, rng):
+        index_of_difficulty = math.log2(distance / size + 1)
+        mean = self.intercept + self.slope * index_of_difficulty
+        return max(1.0, rng.gauss(mean, mean * self.time_noise))
+
+    ''' Generates the samples of a single movement towards a target
+
+        @param start: Tuple with the cursor's starting position
+        @param target: Tuple with the center of the target aimed at
+        @param size: Width aimed at, the diameter of the area that selects the target
+        @param rng: random.Random instance
+
+        @return: The movement duration in ms and a list of (t_ms, x, y) samples ending at the click position
+    '''
+
+    def trajectory(self, start, target, size, rng):
+        distance = max(1.0, math.hypot(target[0] - start[0], target[1] - start[1]))
+        duration = self.movement_time(distance, size, rng)
+        spread = self.endpoint_spread * size / 4.133
+        end_x = target[0] + rng.gauss(0, spread)
+        end_y = target[1] + rng.gauss(0, spread)
+        count = max(1, int(duration * self.sample_rate / 1000))
+        samples = []
+        for step in range(1, count + 1):
+            tau = step / count
+            progress = tau * tau * tau * (10 - 15 * tau + 6 * tau * tau)
+            samples.append((duration * tau,
+                            int(round(start[0] + (end_x - start[0]) * progress)),
+                            int(round(start[1] + (end_y - start[1]) * progress))))
+        return duration, samples
+
+
+class HeadlessSimulation(object):
+    """
+        Simulates complete pointing experiment sessions without any UI
+        Uses the same trial order as PointingExperimentModel and the same pointing technique classes
+        as PointingExperimentTest.
+
+        @param user_id: ID written to the user_id column of every record
+        @param conditions: A list of (distance, size) tuples or a ConditionGrid
+        @param improve_pointing: Whether PointingTechniqueFatBubble or StandardPointingTechnique is used
+        @param repetitions: Indicates how often all trials should be repeated
+        @param bubble_radius: Radius of the bubble pointer
+        @param movement_model: Generates the cursor trajectories, a FittsMovementModel by default
+        @param seed: Seed for the trial plan and the movement model, makes runs reproducible
+        @param hit_test_samples: Whether every sample is hit-tested like a paint event would, or only the clicks
+        @param bubble_cursor: Whether the improved pointing uses the dynamic BubbleCursor instead of the fat bubble
+        @param order: Order of the conditions, counterbalanced by the user ID like in PointingExperimentModel
+    """
+
+    UI_WIDTH = 1920
+    UI_HEIGHT = 800
+    MAX_NUM_TARGETS = 10
+    MIN_NUM_TARGETS = 3
+    MOVE_THRESHOLD = 5
+    MAX_CORRECTIONS = 10
+
+    def __init__(self, user_id, conditions, improve_pointing, repetitions=4, bubble_radius=20,
+                 movement_model=None, seed=None, hit_test_samples=True, bubble_cursor=False, order="fixed"):
+        self.user_id = user_id
+        self.conditions = conditions
+        self.improve_pointing = improve_pointing
+        self.repetitions = repetitions
+        self.bubble_radius = bubble_radius
+        self.movement_model = movement_model or FittsMovementModel()
+        self.rng = random.Random(seed)
+        self.bubble_cursor = bubble_cursor
+        self.hit_test_samples = hit_test_samples
+        self.start_pos = (self.UI_WIDTH / 2, self.UI_HEIGHT / 2)
+        self.plan = TrialPlan(conditions, repetitions, seed, self.UI_WIDTH, self.UI_HEIGHT, self.start_pos,
+                              self.MIN_NUM_TARGETS, self.MAX_NUM_TARGETS, order, participant_number(user_id))
+        if improve_pointing and bubble_cursor:
+            self.pointing_technique = pt.BubbleCursor([], TargetView)
+        elif improve_pointing:
+            self.pointing_technique = pt.PointingTechniqueFatBubble([], TargetView, bubble_radius)
+        else:
+            self.pointing_technique = pt.StandardPointingTechnique([], TargetView)
+
+    ''' Runs all trials of one session
+
+        @return: A generator yielding one log record per trial
+    '''
+
+    def run(self):
+        timestamp = datetime.datetime.now().replace(microsecond=0).isoformat()
+        for trial in range(len(self.plan)):
+            yield self.run_trial(self.plan.trial(trial), timestamp)
+
+    ''' Returns the width of the area that selects the main target with the session's pointing technique
+        The fat bubble adds its radius on both sides of the target. The bubble cursor selects the target closest
+        to the cursor, so its area reaches halfway to the nearest other target on both sides:
+        about the distance between the two centers, at least the target size.
+
+        @param targets: The TargetSet of the trial, main target first
+        @param size: The nominal target size
+    '''
+
+    def aim_width(self, targets, size):
+        if not self.improve_pointing:
+            return size
+        if not self.bubble_cursor:
+            return size + 2 * self.bubble_radius
+        main_target = targets[0]
+        spacing = min([math.hypot(target.pos_x - main_target.pos_x, target.pos_y - main_target.pos_y)
+                       for target in targets if target.id != main_target.id] or [size])
+        return max(size, spacing)
+
+    ''' Simulates a single trial: takes the layout from the plan, moves towards the main target and clicks
+        until it is hit, counting every missed click as an error
+
+        @param planned: The PlannedTrial to simulate
+
+        @return: The trial's log record
+    '''
+
+    def run_trial(self, planned, timestamp):
+        rng = self.rng
+        trial = planned.index
+        distance, size = planned.get_current_condition()
+        targets = TargetSet(planned.layout)
+        main_target = targets[0]
+        technique = self.pointing_technique
+        technique.update_targets(targets)
+        technique.filter(*self.start_pos)
+
+        width = self.aim_width(targets, size)
+        position = self.start_pos
+        movement_time = 0.0
+        errors = 0
+        while True:
+            duration, samples = self.movement_model.trajectory(position, (main_target.pos_x, main_target.pos_y),
+                                                               width, rng)
+            self.feed(samples)
+            movement_time += duration
+            position = samples[-1][1:]
+            if self.is_hit(main_target.id) or errors >= self.MAX_CORRECTIONS:
+                break
+            errors += 1
+        click_offset = (main_target.pos_x - position[0], main_target.pos_y - position[1])
+        return experiment_model.make_log_record(timestamp, self.user_id, trial, distance, size,
+                                                   round(movement_time, 3), click_offset, errors, self.improve_pointing)
+
+    ''' Feeds cursor samples through the pointing technique like mouseMoveEvent and paintEvent do
+
+        @param samples: An iterable of (t_ms, x, y) samples
+    '''
+
+    def feed(self, samples):
+        technique = self.pointing_technique
+        for t, pos_x, pos_y in samples:
+            technique.filter(pos_x, pos_y)
+            if self.hit_test_samples:
+                technique.get_target_ids_under_cursor()
+
+    ''' Checks whether a click at the current cursor position would select the target with the given ID'''
+
+    def is_hit(self, target_id):
+        return target_id in self.pointing_technique.get_target_ids_under_cursor()
+
+    ''' Replays a recorded trajectory against a layout
+
+        @param layout: A list of (x, y, diameter) tuples, main target first
+        @param samples: An iterable of (t_ms, x, y) samples
+
+        @return: A generator yielding the sample together with the IDs of the targets under the cursor
+    '''
+
+    def replay(self, layout, samples):
+        technique = self.pointing_technique
+        technique.update_targets(TargetSet(layout))
+        for sample in samples:
+            technique.filter(sample[1], sample[2])
+            yield sample, list(technique.get_target_ids_under_cursor())
+
+
+def main():
+    """
+        Simulates a session for the setup file passed as command line parameter
+        and writes the records in the experiment's csv format
+    """
+    parser = argparse.ArgumentParser(description="Headless simulation of the pointing experiment")
+    parser.add_argument("setup", help="ini or json setup file")
+    parser.add_argument("-o", "--output", help="csv file to write to (default: stdout)")
+    parser.add_argument("-r", "--repetitions", type=int, default=4)
+    parser.add_argument("--bubble-radius", type=int, default=20)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--bubble-cursor", action="store_true",
+                        help="use the dynamic bubble cursor for improved pointing")
+    args = parser.parse_args()
+    if args.setup.endswith('.json'):
+        user_id, conditions, improve_pointing, order = experiment_model.parse_json_file(args.setup)
+    else:
+        user_id, conditions, improve_pointing, order = experiment_model.parse_ini_file(args.setup)
+    simulation = HeadlessSimulation(user_id, conditions, improve_pointing, args.repetitions,
+                                    args.bubble_radius, seed=args.seed, bubble_cursor=args.bubble_cursor,
+                                    order=order)
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    out = csv.DictWriter(output, experiment_model.LOG_FIELDS, delimiter=";", quoting=csv.QUOTE_ALL)
+    out.writeheader()
+    for record in simulation.run():
+        out.writerow(record)
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
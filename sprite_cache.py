@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+
+import collections
+import math
+from PyQt5 import QtGui, QtCore
+
+"""
+SPRITE CACHE
+Targets and the bubble pointer are plain filled circles that only differ in diameter and color.
+Instead of rasterizing an antialiased ellipse for every target on every paint, each combination is
+rendered once into a transparent QPixmap and afterwards only blitted to the screen.
+"""
+
+
+class SpriteCache(object):
+    """
+        LRU cache of pre-rendered circle sprites keyed by (diameter, color, outline, state, device pixel ratio)
+
+        @param capacity: Maximum number of sprites kept, the least recently used ones are evicted first
+    """
+
+    MARGIN = 2
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.sprites = collections.OrderedDict()
+        self.device_pixel_ratio = 1.0
+        self.hits = 0
+        self.misses = 0
+
+    ''' Share of sprite lookups that did not have to render anything'''
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    ''' Drops all sprites, e.g. after the widget was resized or moved to another screen'''
+
+    def invalidate(self):
+        self.sprites.clear()
+
+    ''' Updates the device pixel ratio sprites are rendered for
+        All sprites are dropped if the ratio changed since they were rendered
+
+        @param ratio: The paint device's devicePixelRatioF()
+    '''
+
+    def set_device_pixel_ratio(self, ratio):
+        if ratio != self.device_pixel_ratio:
+            self.device_pixel_ratio = ratio
+            self.invalidate()
+
+    ''' Returns the sprite for a circle, rendering it if it is not cached yet
+
+        @param diameter: Diameter of the circle in logical pixels
+        @param color: QColor the circle is filled with
+        @param outline: QColor of the circle's outline
+        @param state: Additional key component, e.g. "highlighted", so states never share sprites
+
+        @return: The QPixmap and the offset from its top left corner to the circle's center
+    '''
+
+    def sprite(self, diameter, color, outline, state=None):
+        key = (diameter, color.rgba(), outline.rgba(), state, self.device_pixel_ratio)
+        entry = self.sprites.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return entry
+        self.misses += 1
+        entry = self.render(diameter, color, outline)
+        self.sprites[key] = entry
+        if len(self.sprites) > self.capacity:
+            self.sprites.popitem(last=False)
+        return entry
+
+    ''' Rasterizes a single circle into a transparent pixmap'''
+
+    def render(self, diameter, color, outline):
+        half = int(math.ceil(diameter / 2)) + self.MARGIN
+        size = 2 * half + 1
+        ratio = self.device_pixel_ratio
+        pixmap = QtGui.QPixmap(int(math.ceil(size * ratio)), int(math.ceil(size * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(outline)
+        painter.setBrush(color)
+        painter.drawEllipse(QtCore.QPointF(half + 0.5, half + 0.5), diameter / 2, diameter / 2)
+        painter.end()
+        return pixmap, half
+
+    ''' Blits the sprite of a circle centered at the given position
+
+        @param painter: PyQt QPainter object that can draw to the canvas
+        @param pos_x: X-Coordinate of the circle's center
+        @param pos_y: Y-Coordinate of the circle's center
+    '''
+
+    def draw(self, painter, pos_x, pos_y, diameter, color, outline, state=None):
+        pixmap, half = self.sprite(diameter, color, outline, state)
+        painter.drawPixmap(int(pos_x) - half, int(pos_y) - half, pixmap)
@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+
+
+import math
+import random
+
+"""
+Target layout generation for the pointing experiment
+The functions here only work with plain (x, y, diameter) tuples, so the experiment UI
+and the headless simulation share the exact same layouts
+"""
+
+DART_ATTEMPTS = 20
+POISSON_ATTEMPTS = 30
+
+''' Calculates the center of the target that has to be clicked
+
+    @param start_pos: Tuple with the cursor's starting position
+    @param distance: Distance between the starting position and the main target
+    @param angle: Direction of the main target in radians
+
+    @return: Tuple with the x- and y-coordinates of the main target
+'''
+
+
+def main_target_position(start_pos, distance, angle):
+    x = start_pos[0] + distance * math.cos(angle)
+    y = start_pos[1] + distance * math.sin(angle)
+    return (x, y)
+
+
+class LayoutError(Exception):
+    """
+        Raised if not all distractors can be placed without overlapping
+
+        @param layout: The partial layout containing all targets that could be placed
+        @param requested: The number of distractors that was asked for
+    """
+
+    def __init__(self, layout, requested):
+        super().__init__("only %d of %d distractors fit without overlapping" % (len(layout) - 1, requested))
+        self.layout = layout
+        self.requested = requested
+
+
+class LayoutGrid(object):
+    """
+        Background grid for the layout generation
+        The cell size guarantees at most one target center per cell, so checking a new position
+        only needs the few cells around it instead of every placed target.
+
+        @param min_distance: Smallest allowed distance between two target centers
+    """
+
+    def __init__(self, min_distance):
+        self.min_distance = min_distance
+        self.cell_size = max(min_distance / math.sqrt(2), 1)
+        self.reach = int(math.ceil(min_distance / self.cell_size))
+        self.cells = {}
+
+    def _cell(self, pos_x, pos_y):
+        return int(pos_x // self.cell_size), int(pos_y // self.cell_size)
+
+    ''' Checks whether a target at the given position keeps the minimum distance to all placed targets'''
+
+    def is_free(self, pos_x, pos_y):
+        cell_x, cell_y = self._cell(pos_x, pos_y)
+        limit = self.min_distance * self.min_distance
+        reach = self.reach
+        cells = self.cells
+        for neighbour_x in range(cell_x - reach, cell_x + reach + 1):
+            for neighbour_y in range(cell_y - reach, cell_y + reach + 1):
+                for other_x, other_y in cells.get((neighbour_x, neighbour_y), ()):
+                    dx = other_x - pos_x
+                    dy = other_y - pos_y
+                    if dx * dx + dy * dy <= limit:
+                        return False
+        return True
+
+    def add(self, pos_x, pos_y):
+        self.cells.setdefault(self._cell(pos_x, pos_y), []).append((pos_x, pos_y))
+
+
+''' Generates the targets for a single trial
+    The first entry is always the main target at the distance and angle of the condition,
+    followed by the given number of distractors. Distractors keep the same spacing as before
+    (circles with twice the target diameter never intersect) to each other and to the main target.
+
+    Distractors are first placed by rejection sampling, checking each position against a background grid.
+    If that does not find enough positions, the remaining free space is filled by Poisson-disk sampling
+    and the missing distractors are picked from these candidates.
+    A LayoutError containing the partial layout is raised if the distractors still do not fit.
+
+    @param distance: Distance between the starting position and the main target
+    @param size: Diameter of all targets
+    @param angle: Direction of the main target in radians
+    @param start_pos: Tuple with the cursor's starting position
+    @param width: Width of the area the targets are placed in
+    @param height: Height of the area the targets are placed in
+    @param number_of_distractors: How many additional targets should be placed
+    @param rng: Random number generator to use (random.Random instance or the random module)
+
+    @return: A list of (x, y, diameter) tuples
+'''
+
+
+def generate_layout(distance, size, angle, start_pos, width, height, number_of_distractors, rng=random):
+    pos = main_target_position(start_pos, distance, angle)
+    layout = [(pos[0], pos[1], size)]
+    grid = LayoutGrid(2 * size)
+    grid.add(pos[0], pos[1])
+    attempts = DART_ATTEMPTS * number_of_distractors
+    while len(layout) <= number_of_distractors and attempts > 0:
+        attempts -= 1
+        pos_x = rng.randint(size, width - size)
+        pos_y = rng.randint(size, height - size)
+        if grid.is_free(pos_x, pos_y):
+            grid.add(pos_x, pos_y)
+            layout.append((pos_x, pos_y, size))
+    missing = number_of_distractors + 1 - len(layout)
+    if missing > 0:
+        candidates = fill_free_space(grid, layout, size, width, height, rng)
+        layout.extend((pos_x, pos_y, size) for pos_x, pos_y in rng.sample(candidates, min(missing, len(candidates))))
+        if len(layout) <= number_of_distractors:
+            raise LayoutError(layout, number_of_distractors)
+    return layout
+
+
+''' Poisson-disk sampling (Bridson 2007) growing from the already placed targets
+    Adds positions until no free space is left, the grid is updated with all returned positions.
+
+    @return: A list of (x, y) positions keeping the minimum distance to each other and to all placed targets
+'''
+
+
+def fill_free_space(grid, layout, size, width, height, rng):
+    radius = grid.min_distance
+    active = [(pos_x, pos_y) for pos_x, pos_y, diameter in layout]
+    candidates = []
+    # additional random seeds reach free areas that are not connected to any placed target
+    for _ in range(POISSON_ATTEMPTS):
+        pos_x = rng.randint(size, width - size)
+        pos_y = rng.randint(size, height - size)
+        if grid.is_free(pos_x, pos_y):
+            grid.add(pos_x, pos_y)
+            candidates.append((pos_x, pos_y))
+            active.append((pos_x, pos_y))
+    while active:
+        idx = rng.randrange(len(active))
+        center_x, center_y = active[idx]
+        for _ in range(POISSON_ATTEMPTS):
+            angle = rng.random() * 2 * math.pi
+            step = radius * (1.01 + rng.random())
+            pos_x = int(round(center_x + step * math.cos(angle)))
+            pos_y = int(round(center_y + step * math.sin(angle)))
+            if size <= pos_x <= width - size and size <= pos_y <= height - size and grid.is_free(pos_x, pos_y):
+                grid.add(pos_x, pos_y)
+                candidates.append((pos_x, pos_y))
+                active.append((pos_x, pos_y))
+                break
+        else:
+            active[idx] = active[-1]
+            active.pop()
+    return candidates
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+
+import array
+
+"""
+TARGET SETS
+Stores the targets of a trial as a struct of arrays: the x- and y-coordinates and diameters of all targets
+are kept in three contiguous arrays, and a target is identified by its integer ID (its position in the set).
+Hit-tests work on the arrays and return IDs, so checking whether a target was hit is a comparison of integers.
+For code that wants objects (e.g. drawing) the set hands out one lightweight view per target:
+
+    targets = TargetSet(layout, Target)   # layout: [(x, y, diameter), ...]
+    targets[0].pos_x                       # read from targets.xs[0]
+    targets[0] is targets[0]               # views are created once, so identity is stable
+"""
+
+
+class TargetView(object):
+    """
+        Lightweight view on a single target of a TargetSet
+        Has the pos_x, pos_y and diameter attributes of a target, but no per-instance dictionary.
+        Two views are equal if they refer to the same ID of the same set.
+
+        @param target_set: The TargetSet the target belongs to
+        @param target_id: Index of the target inside the set
+    """
+
+    __slots__ = ("target_set", "id")
+
+    def __init__(self, target_set, target_id):
+        self.target_set = target_set
+        self.id = target_id
+
+    @property
+    def pos_x(self):
+        return self.target_set.xs[self.id]
+
+    @property
+    def pos_y(self):
+        return self.target_set.ys[self.id]
+
+    @property
+    def diameter(self):
+        return self.target_set.diameters[self.id]
+
+    def __eq__(self, other):
+        return isinstance(other, TargetView) and self.id == other.id and self.target_set is other.target_set
+
+    def __hash__(self):
+        return hash((id(self.target_set), self.id))
+
+
+class TargetSet(object):
+    """
+        Struct-of-arrays container for the targets of a trial
+        Behaves like a read-only list of views, so it can be used wherever a list of targets is expected
+
+        @param layout: An iterable of (x, y, diameter) tuples, the position defines the target's ID
+        @param view_class: TargetView subclass used for the views, e.g. a class adding drawing code
+    """
+
+    def __init__(self, layout, view_class=TargetView):
+        self.xs = array.array('d')
+        self.ys = array.array('d')
+        self.diameters = array.array('d')
+        for pos_x, pos_y, diameter in layout:
+            self.xs.append(pos_x)
+            self.ys.append(pos_y)
+            self.diameters.append(diameter)
+        self.views = [view_class(self, target_id) for target_id in range(len(self.xs))]
+
+    def __len__(self):
+        return len(self.views)
+
+    def __getitem__(self, target_id):
+        return self.views[target_id]
+
+    def __iter__(self):
+        return iter(self.views)
+
+    ''' Returns the views of the given IDs
+
+        @param ids: An iterable of target IDs
+
+        @return: A list of views in the order of the IDs
+    '''
+
+    def select(self, ids):
+        views = self.views
+        return [views[target_id] for target_id in ids]
+
+
+''' Returns the coordinate columns of any target collection
+    A TargetSet hands out its arrays directly, a list of target objects is converted once
+
+    @param targets: A TargetSet or a list of objects with pos_x, pos_y and diameter attributes
+
+    @return: Three sequences with the x-coordinates, y-coordinates and diameters
+'''
+
+
+def target_columns(targets):
+    if isinstance(targets, TargetSet):
+        return targets.xs, targets.ys, targets.diameters
+    return ([target.pos_x for target in targets], [target.pos_y for target in targets],
+            [target.diameter for target in targets])
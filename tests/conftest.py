@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+# the experiment modules are scripts in the repository root, the widget needs no display
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+SETUP = """[experiment_setup]
+UserID = 77
+Conditions = 200,50;300,25
+ImprovePointing = 0
+"""
+
+
+def send_mouse_event(widget, event_type, pos):
+    from PyQt5 import QtCore, QtGui
+    button = QtCore.Qt.LeftButton if event_type == QtCore.QEvent.MouseButtonPress else QtCore.Qt.NoButton
+    event = QtGui.QMouseEvent(event_type, pos, button, button, QtCore.Qt.NoModifier)
+    if event_type == QtCore.QEvent.MouseButtonPress:
+        widget.mousePressEvent(event)
+    else:
+        widget.mouseMoveEvent(event)
+
+
+''' Moves to and clicks the main target of every trial until the widget closes itself'''
+
+
+def click_all_trials(widget, clicks):
+    from PyQt5 import QtCore
+    while widget.isVisible():
+        target = widget.getMainTarget()
+        # a few samples on the way, the first one far enough from the start to start the measurement
+        for step in (0.25, 0.5, 1.0):
+            pos = QtCore.QPoint(int(widget.start_pos[0] + step * (target.pos_x - widget.start_pos[0])),
+                                int(widget.start_pos[1] + step * (target.pos_y - widget.start_pos[1])))
+            send_mouse_event(widget, QtCore.QEvent.MouseMove, pos)
+        send_mouse_event(widget, QtCore.QEvent.MouseButtonPress, pos)
+        clicks.append(widget.model.elapsed)
+
+
+@pytest.fixture
+def run_session(tmp_path, monkeypatch):
+    """
+        Runs pointing_experiment.main() in a temporary directory with the setup SETUP, clicking every trial
+
+        @return: A function taking extra command line options and an optional plan file name,
+                 returning (exit code, widget, clicks)
+    """
+    from PyQt5 import QtCore
+    import pointing_experiment
+    from pointing_experiment import PointingExperimentTest
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "setup.ini").write_text(SETUP)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    init_ui = PointingExperimentTest.initUI
+
+    def run(*options, plan=None):
+        widgets = []
+        clicks = []
+
+        def start_clicking(widget):
+            init_ui(widget)
+            widgets.append(widget)
+            QtCore.QTimer.singleShot(0, lambda: click_all_trials(widget, clicks))
+
+        monkeypatch.setattr(PointingExperimentTest, "initUI", start_clicking)
+        monkeypatch.setattr(sys, "argv", ["pointing_experiment.py"] + list(options) + ["setup.ini"] +
+                            ([plan] if plan else []))
+        with pytest.raises(SystemExit) as exit_info:
+            pointing_experiment.main()
+        return exit_info.value.code, widgets[0] if widgets else None, clicks
+
+    return run
@@ -0,0 +1,44 @@
+import numpy as np
+
+import columnar_log
+
+
+def test_append_columns_pads_columns_missing_on_either_side(tmp_path):
+    filename = str(tmp_path / "log.npz")
+    columnar_log.append_columns(filename, {"trial": np.array([0, 1]), "user_id": np.array(["1", "1"]),
+                                           "trajectory_offsets": np.array([0, 2, 3]),
+                                           "trajectory_x": np.array([1, 2, 3], dtype=np.int32)})
+    columnar_log.append_columns(filename, {"click_offset_x": np.array([0.5]), "user_id": np.array(["12"]),
+                                           "trajectory_offsets": np.array([0, 1]),
+                                           "trajectory_x": np.array([9], dtype=np.int32),
+                                           "trajectory_y": np.array([7], dtype=np.int32)})
+    columns = columnar_log.load_columns(filename)
+
+    assert columns["trial"].tolist() == [0, 1, columnar_log.MISSING_INTEGER]
+    assert columns["trial"].dtype.kind == "i"
+    np.testing.assert_array_equal(columns["click_offset_x"], [np.nan, np.nan, 0.5])
+    assert columns["user_id"].tolist() == ["1", "1", "12"]
+    assert columns["trajectory_offsets"].tolist() == [0, 2, 3, 4]
+    assert columns["trajectory_x"].tolist() == [1, 2, 3, 9]
+    assert columns["trajectory_y"].tolist() == [-1, -1, -1, 7]
+    assert columns["trajectory_y"].dtype == np.int32
+
+
+def test_npz_sink_appends_full_batches(tmp_path):
+    filename = str(tmp_path / "log.npz")
+    record = {"trial": 0, "target_distance": 200, "target_size": 50, "movement_time (ms)": 300,
+              "click_offset_x": 1.0, "click_offset_y": -1.0, "number_of_errors": 0, "improved_pointing": False}
+    sink = columnar_log.NpzSink(filename, batch_size=3)
+
+    sink.write_rows([dict(record, trial=trial) for trial in range(4)])
+    assert columnar_log.load_columns(filename, ["trial"])["trial"].tolist() == [0, 1, 2]
+    first_chunk = (tmp_path / "log.part000001.npz").read_bytes()
+    sink.close()
+
+    # the first batch is not rewritten, the rest goes into a chunk of its own
+    assert (tmp_path / "log.part000001.npz").read_bytes() == first_chunk
+    assert columnar_log.log_files(filename) == [str(tmp_path / "log.part000001.npz"),
+                                                str(tmp_path / "log.part000002.npz")]
+    columns = columnar_log.load_columns(filename, ["trial", "target_size"])
+    assert columns["trial"].tolist() == [0, 1, 2, 3]
+    assert columns["target_size"].dtype.kind == "i"
@@ -0,0 +1,33 @@
+from PyQt5 import QtGui, QtWidgets
+
+from experiment_model import PointingExperimentModel
+from pointing_experiment import PointingExperimentTest, Target
+
+app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_pointer_move_repaints_only_the_targets_it_touches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = PointingExperimentModel("5", [(600, 20)], False, 1, seed=3)
+    widget = PointingExperimentTest(model)
+    try:
+        image = QtGui.QImage(widget.width(), widget.height(), QtGui.QImage.Format_RGB32)
+        painter = QtGui.QPainter(image)
+        widget.paintScene(painter)
+        drawn = []
+        monkeypatch.setattr(Target, "draw", lambda target, qp: drawn.append(target))
+        monkeypatch.setattr(Target, "draw_colored", lambda target, qp, color: drawn.append(target))
+
+        # the timer still shows the same text, so only the pointer's old and new bounds are dirty
+        widget.processMove(widget.width() - 5, widget.height() - 5)
+        old_bounds = widget.pointing_technique.pointer_bounds()
+        widget.processMove(widget.width() - 3, widget.height() - 3)
+        region = widget.dirtyRegion(old_bounds)
+        assert not region.intersects(widget.textRect())
+        widget.paintScene(painter, region)
+        painter.end()
+
+        assert len(drawn) < len(widget.targets)
+        assert all(region.intersects(target.bounding_rect()) for target in drawn)
+    finally:
+        widget.close()
@@ -0,0 +1,44 @@
+import asyncio
+import csv
+import time
+
+import log_collector
+
+FIELDS = ["timestamp (ISO)", "user_id", "trial"]
+
+
+def test_collector_syncs_batches_off_the_event_loop(tmp_path, monkeypatch):
+    store = str(tmp_path / "data.csv")
+    fsync = log_collector.os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.5)
+        fsync(fd)
+
+    monkeypatch.setattr(log_collector.os, "fsync", slow_fsync)
+    records = [{"timestamp (ISO)": "2024-01-01T00:00:0%d" % trial, "user_id": 1, "trial": trial}
+               for trial in range(3)]
+
+    async def session():
+        loop = asyncio.get_running_loop()
+        collector = log_collector.LogCollector(store, FIELDS)
+        server = await collector.start_tcp("127.0.0.1", 0)
+        address = "127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        sink = log_collector.NetworkSink(address, FIELDS, batch_size=2)
+        sink.write_rows(records + records[:1])
+        delivered = loop.run_in_executor(None, sink.close)
+        gaps = []
+        while not delivered.done():
+            start = time.monotonic()
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - start)
+        await delivered
+        await collector.close()
+        return sink, gaps
+
+    sink, gaps = asyncio.run(session())
+
+    assert not sink.pending
+    assert max(gaps) < 0.25
+    with open(store, newline="") as data:
+        assert [row["trial"] for row in csv.DictReader(data, delimiter=";")] == ["0", "1", "2"]
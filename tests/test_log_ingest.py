@@ -0,0 +1,57 @@
+import csv
+
+import pytest
+
+import instrumentation
+from experiment_model import LOG_FIELDS, make_log_record
+from log_ingest import LogIngestor
+from trial_logger import CsvSink
+
+
+def write_log(filename, user_id, trials, fields=LOG_FIELDS):
+    sink = CsvSink(str(filename), fields)
+    records = []
+    for trial in trials:
+        record = make_log_record("2026-01-01T10:00:00", user_id, trial, 200, 20, 400.5, (1.0, -2.0), 0, False)
+        record.update({field: 7 for field in fields[len(LOG_FIELDS):]})
+        records.append(record)
+    sink.write_rows(records)
+    sink.close()
+
+
+def read_merged(filename):
+    with open(filename, newline="") as merged:
+        reader = csv.reader(merged, delimiter=";")
+        header = next(reader)
+        rows = list(reader)
+    assert all(len(row) == len(header) for row in rows)
+    return header, [dict(zip(header, row)) for row in rows]
+
+
+def test_logs_with_different_columns_are_merged_under_one_header(tmp_path):
+    fields = LOG_FIELDS + instrumentation.log_fields()
+    write_log(tmp_path / "user1.csv", "1", range(2))
+    merged_filename = str(tmp_path / "data.csv")
+    ingestor = LogIngestor(str(tmp_path / "user*.csv"), merged_filename)
+    assert ingestor.ingest() == 2
+
+    write_log(tmp_path / "user2.csv", "2", range(3), fields)
+    write_log(tmp_path / "user1.csv", "1", range(2, 4))
+    assert LogIngestor(str(tmp_path / "user*.csv"), merged_filename).ingest() == 5
+
+    header, rows = read_merged(merged_filename)
+    assert header == fields
+    assert [(row["user_id"], row["trial"]) for row in rows] == [("1", "0"), ("1", "1"), ("1", "2"), ("1", "3"),
+                                                               ("2", "0"), ("2", "1"), ("2", "2")]
+    assert all(row[fields[-1]] == "" for row in rows if row["user_id"] == "1")
+    assert all(row[fields[-1]] == "7" for row in rows if row["user_id"] == "2")
+
+
+def test_fitts_analysis_reads_the_merged_file(tmp_path):
+    pytest.importorskip("pandas")
+    import fitts_analysis
+    write_log(tmp_path / "user1.csv", "1", range(2))
+    write_log(tmp_path / "user2.csv", "2", range(2), LOG_FIELDS + instrumentation.log_fields())
+    LogIngestor(str(tmp_path / "user*.csv"), str(tmp_path / "data.csv")).ingest()
+
+    assert len(fitts_analysis.load_data(str(tmp_path / "data.csv"))) == 4
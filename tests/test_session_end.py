@@ -0,0 +1,29 @@
+import csv
+import json
+
+
+def test_finished_session_writes_log_journal_and_summary(run_session):
+    exit_code, widget, clicks = run_session()
+
+    assert exit_code == 0
+    trials = len(widget.model.trials)
+    assert clicks == list(range(1, trials + 1))
+    assert not widget.isVisible()
+    with open("user77.csv", newline="") as log:
+        rows = list(csv.DictReader(log, delimiter=";"))
+    assert [int(row["trial"]) for row in rows] == list(range(trials))
+    with open("user77.journal") as journal:
+        events = [json.loads(line) for line in journal]
+    assert events[-1] == {"event": "end"}
+    with open("user77.summary.json") as summary:
+        assert sum(condition["trials"] for condition in json.load(summary)["conditions"]) == trials
+
+
+def test_instrumented_session_summary_contains_the_latencies(run_session):
+    exit_code, widget, clicks = run_session("--instrument")
+
+    assert exit_code == 0
+    with open("user77.summary.json") as summary:
+        latency = json.load(summary)["latency"]
+    assert latency["hit_test"]["count"] > 0
+    assert latency["hit_test"]["max (us)"] >= latency["hit_test"]["p50 (us)"]
@@ -0,0 +1,73 @@
+import csv
+import random
+
+import pytest
+
+from online_stats import SessionStatistics
+from session_journal import SessionJournal
+
+INFO = {"user_id": "7", "design": {}, "improve_pointing": False}
+
+
+def make_records(count):
+    rng = random.Random(1)
+    return [{"trial": trial, "target_distance": rng.choice([200, 400]), "target_size": rng.choice([20, 40]),
+             "movement_time (ms)": rng.uniform(300, 900), "click_offset_x": rng.gauss(0, 5),
+             "click_offset_y": rng.gauss(0, 5), "number_of_errors": rng.randrange(2)} for trial in range(count)]
+
+
+@pytest.mark.parametrize("checkpoint_every", [4, 100])
+def test_resumed_statistics_match_the_whole_session(tmp_path, checkpoint_every):
+    filename = str(tmp_path / "user7.journal")
+    records = make_records(10)
+    statistics = SessionStatistics()
+    journal = SessionJournal(filename, checkpoint_every=checkpoint_every)
+    journal.start(INFO, 42, statistics)
+    for elapsed, record in enumerate(records):
+        statistics.add(record)
+        journal.trial(elapsed, record)
+    # a crash: the journal is neither closed nor checkpointed again
+    journal.closed = True
+    journal.sync_thread.join()
+
+    resumed = SessionStatistics()
+    state = SessionJournal(filename, checkpoint_every=checkpoint_every).recover(INFO, resumed)
+
+    assert state["elapsed"] == len(records)
+    expected = statistics.to_dict()
+    actual = resumed.to_dict()
+    for condition, expected_condition in zip(actual["conditions"], expected["conditions"]):
+        assert condition == pytest.approx(expected_condition)
+    assert actual["regression"] == pytest.approx(expected["regression"])
+
+
+def test_resumed_session_logs_the_records_a_crash_kept_from_the_logs(tmp_path, monkeypatch):
+    import columnar_log
+    from experiment_model import PointingExperimentModel
+
+    monkeypatch.chdir(tmp_path)
+    conditions = [(200, 50), (300, 25)]
+    model = PointingExperimentModel(7, conditions, False, repetitions=2, columnar_output=True,
+                                    journal=SessionJournal("user7.journal"))
+    for trial in range(3):
+        model.start_measurement()
+        model.register_click((0, 0), (1, 1))
+    # a crash after the first record reached the csv file, the others were only journaled
+    model.writer.close()
+    model.journal.closed = True
+    model.journal.sync_thread.join()
+    with open("user7.csv", newline="") as log:
+        lines = log.readlines()
+    with open("user7.csv", "w", newline="") as log:
+        log.writelines(lines[:2])
+    for filename in columnar_log.log_files("user7.npz"):
+        (tmp_path / filename).unlink()
+
+    resumed = PointingExperimentModel(7, conditions, False, repetitions=2, columnar_output=True,
+                                      journal=SessionJournal("user7.journal"))
+    resumed.close()
+
+    assert resumed.elapsed == 3
+    with open("user7.csv", newline="") as log:
+        assert [int(row["trial"]) for row in csv.DictReader(log, delimiter=";")] == [0, 1, 2]
+    assert columnar_log.load_columns("user7.npz", ["trial"])["trial"].tolist() == [0, 1, 2]
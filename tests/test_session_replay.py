@@ -0,0 +1,51 @@
+import glob
+
+import pytest
+
+import columnar_log
+from session_replay import SessionReplay, plan_from_journal
+from trial_plan import TrialPlan
+
+
+def test_replay_selects_the_rows_of_the_journaled_session(run_session):
+    run_session("--columnar")
+    exit_code, widget, clicks = run_session("--columnar")
+    # the finished journal of the first session is archived when the second one starts
+    first_journal, = glob.glob("user77.journal.2*")
+    assert exit_code == 0
+    trials = len(widget.model.trials)
+    columns = columnar_log.load_columns("user77.npz")
+    assert len(columns["trial"]) == 2 * trials
+
+    first = SessionReplay(columns, plan_from_journal(first_journal), processes=1)
+    second = SessionReplay(columns, plan_from_journal("user77.journal"), processes=1)
+
+    assert first.rows == list(range(trials))
+    assert second.rows == list(range(trials, 2 * trials))
+    assert second.plan.seed == widget.model.seed
+    jobs = list(second.jobs())
+    assert sorted(set(index for first_frame, index, layout, bubble, frames in jobs)) == list(range(trials))
+    for first_frame, index, layout, bubble, frames in jobs:
+        assert layout == second.plan.trial(index).layout
+
+
+def test_replay_rejects_a_plan_of_another_session(run_session):
+    run_session("--columnar")
+    columns = columnar_log.load_columns("user77.npz")
+    plan = plan_from_journal("user77.journal")
+    plan.seed += 1
+
+    with pytest.raises(ValueError):
+        SessionReplay(columns, plan, processes=1)
+
+
+def test_saved_plan_sets_the_seed_of_the_session(run_session):
+    run_session("--columnar", plan="user77.plan.json")
+    exit_code, widget, clicks = run_session("--columnar", plan="user77.plan.json")
+    assert exit_code == 0
+    plan = TrialPlan.load("user77.plan.json")
+    assert widget.model.seed == plan.seed
+    assert plan_from_journal("user77.journal").seed == plan.seed
+    columns = columnar_log.load_columns("user77.npz")
+    assert set(columns["session_seed"].tolist()) == {plan.seed}
+    assert SessionReplay(columns, plan, processes=1).rows == list(range(2 * len(widget.model.trials)))
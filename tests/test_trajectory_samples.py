@@ -0,0 +1,42 @@
+import csv
+
+import columnar_log
+
+
+def test_samples_are_recorded_after_hit_testing(run_session):
+    exit_code, widget, clicks = run_session("--columnar")
+    assert exit_code == 0
+    columns = columnar_log.load_columns("user77.npz")
+    offsets = columns["trajectory_offsets"]
+    hovered = columns["trajectory_hovered"]
+
+    for row in range(len(columns["trial"])):
+        samples = hovered[offsets[row]:offsets[row + 1]]
+        # the last sample is the click position inside the main target, the ones on the way are outside of it
+        assert len(samples) == 3
+        assert samples[-1] >= 1
+
+
+def test_movement_time_keeps_fractions_of_a_millisecond(run_session):
+    run_session()
+    with open("user77.csv", newline="") as log:
+        times = [float(row["movement_time (ms)"]) for row in csv.DictReader(log, delimiter=";")]
+    assert all(time >= 0 for time in times)
+    assert any(time != int(time) for time in times)
+
+
+def test_coalesced_moves_keep_every_raw_sample(run_session, monkeypatch):
+    from pointing_experiment import PointingExperimentTest
+    monkeypatch.setattr(PointingExperimentTest, "COALESCE_MOUSE_EVENTS", True)
+    exit_code, widget, clicks = run_session("--columnar")
+    assert exit_code == 0
+    assert widget.scheduler is not None
+    columns = columnar_log.load_columns("user77.npz")
+    offsets = columns["trajectory_offsets"]
+
+    # the moves of a trial are coalesced into one frame, which is processed when the click flushes it
+    assert (offsets[1:] - offsets[:-1]).tolist() == [3] * len(columns["trial"])
+    assert all(columns["trajectory_hovered"][offsets[1:] - 1] >= 1)
+    t_ns = columns["trajectory_t_ns"]
+    for row in range(len(columns["trial"])):
+        assert list(t_ns[offsets[row]:offsets[row + 1]]) == sorted(t_ns[offsets[row]:offsets[row + 1]])
@@ -0,0 +1,34 @@
+import glob
+
+import instrumentation
+from experiment_model import LOG_FIELDS
+from trial_logger import CsvSink, read_header
+
+
+def write_row(filename, fields):
+    sink = CsvSink(filename, fields)
+    sink.write_rows([{field: 1 for field in fields}])
+    sink.close()
+
+
+def test_log_with_the_same_columns_is_appended(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_row("user1.csv", LOG_FIELDS)
+    write_row("user1.csv", LOG_FIELDS)
+
+    with open("user1.csv") as log:
+        assert len(log.readlines()) == 3
+    assert glob.glob("user1.*.csv") == []
+
+
+def test_log_with_other_columns_is_renamed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fields = LOG_FIELDS + instrumentation.log_fields()
+    write_row("user1.csv", LOG_FIELDS)
+    write_row("user1.csv", fields)
+
+    rotated, = glob.glob("user1.*.csv")
+    assert read_header(rotated) == LOG_FIELDS
+    assert read_header("user1.csv") == fields
+    with open("user1.csv") as log:
+        assert len(log.readlines()) == 2
@@ -0,0 +1,42 @@
+import json
+
+from trial_plan import TrialPlan
+
+CONDITIONS = [(200, 50), (300, 25)]
+
+
+def test_saved_plan_regenerates_the_layouts_from_its_seed(tmp_path):
+    filename = str(tmp_path / "user1.plan.json")
+    plan = TrialPlan(CONDITIONS, repetitions=3, seed=42)
+    plan.save(filename)
+    with open(filename) as plan_file:
+        assert "trials" not in json.load(plan_file)
+
+    loaded = TrialPlan.load(filename)
+
+    assert [loaded.trial(index).layout for index in range(len(loaded))] == \
+        [plan.trial(index).layout for index in range(len(plan))]
+
+
+def test_evicted_trials_are_generated_again_but_stored_layouts_are_kept(tmp_path):
+    plan = TrialPlan(CONDITIONS, repetitions=3, seed=42)
+    plan.generate_all()
+    first = plan.trial(0).layout
+
+    plan.evict(4)
+
+    assert sorted(plan.trials) == [4, 5]
+    assert plan.trial(0).layout == first
+
+    # plans of version 2 store every layout, those win over generated ones
+    filename = str(tmp_path / "user1.plan.json")
+    plan.save(filename)
+    with open(filename) as plan_file:
+        data = json.load(plan_file)
+    data["version"] = 2
+    data["trials"] = [dict(plan.trial(index).to_dict(), layout=[[index, index, 10]]) for index in range(len(plan))]
+    with open(filename, "w") as plan_file:
+        json.dump(data, plan_file)
+    loaded = TrialPlan.load(filename)
+    loaded.evict(len(loaded))
+    assert loaded.trial(1).layout == [(1, 1, 10)]
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+
+import array
+import time
+
+"""
+CURSOR TRAJECTORY RECORDING
+Every cursor sample of a trial is stored as (t_ns, x, y, hovered-target-count) in preallocated,
+typed arrays instead of lists of tuples. Timestamps come from the monotonic nanosecond clock.
+A recorder never grows beyond its capacity: when it is full, every second sample is dropped and
+only every second new sample is kept from then on, so long trials keep their whole path at a lower rate.
+"""
+
+
+class Trajectory(object):
+    """
+        Immutable, compact copy of the samples recorded during one trial
+
+        @param t_ns: array('q') with the monotonic timestamps in nanoseconds
+        @param x: array('i') with the x-coordinates
+        @param y: array('i') with the y-coordinates
+        @param hovered: array('H') with the number of targets under the cursor
+        @param stride: Every how many raw samples one was kept (1 = all samples)
+    """
+
+    __slots__ = ("t_ns", "x", "y", "hovered", "stride")
+
+    def __init__(self, t_ns, x, y, hovered, stride=1):
+        self.t_ns = t_ns
+        self.x = x
+        self.y = y
+        self.hovered = hovered
+        self.stride = stride
+
+    def __len__(self):
+        return len(self.t_ns)
+
+    ''' Iterates over all samples as (t_ns, x, y, hovered) tuples'''
+
+    def __iter__(self):
+        return zip(self.t_ns, self.x, self.y, self.hovered)
+
+    ''' Returns the memory used by the sample arrays in bytes'''
+
+    def nbytes(self):
+        return sum(len(column) * column.itemsize for column in (self.t_ns, self.x, self.y, self.hovered))
+
+
+class TrajectoryRecorder(object):
+    """
+        Records cursor samples into preallocated arrays with a fixed upper bound
+
+        @param capacity: Maximum number of samples kept per trial
+    """
+
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.t_ns = array.array('q', bytes(8 * capacity))
+        self.x = array.array('i', bytes(4 * capacity))
+        self.y = array.array('i', bytes(4 * capacity))
+        self.hovered = array.array('H', bytes(2 * capacity))
+        self.reset()
+
+    ''' Discards all samples, e.g. at the start of a new trial'''
+
+    def reset(self):
+        self.length = 0
+        self.stride = 1
+        self.skipped = 0
+
+    ''' Stores a single cursor sample
+
+        @param pos_x: Mouse position on the X-Axis
+        @param pos_y: Mouse position on the Y-Axis
+        @param hovered: Number of targets currently under the cursor
+        @param t_ns: Timestamp of the sample, taken from time.monotonic_ns() if not given
+    '''
+
+    def record(self, pos_x, pos_y, hovered=0, t_ns=None):
+        if self.skipped + 1 < self.stride:
+            self.skipped += 1
+            return
+        self.skipped = 0
+        if self.length == self.capacity:
+            self.decimate()
+        idx = self.length
+        self.t_ns[idx] = time.monotonic_ns() if t_ns is None else t_ns
+        self.x[idx] = pos_x
+        self.y[idx] = pos_y
+        self.hovered[idx] = min(hovered, 0xFFFF)
+        self.length = idx + 1
+
+    ''' Keeps every second sample in place and halves the sampling rate from now on'''
+
+    def decimate(self):
+        half = self.length // 2
+        for column in (self.t_ns, self.x, self.y, self.hovered):
+            column[:half] = column[0:2 * half:2]
+        self.length = half
+        self.stride *= 2
+
+    ''' Returns a compact copy of all samples recorded so far
+
+        @return: A Trajectory holding only the used part of the buffers
+    '''
+
+    def snapshot(self):
+        length = self.length
+        return Trajectory(self.t_ns[:length], self.x[:length], self.y[:length], self.hovered[:length], self.stride)
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+
+
+import re
+import zlib
+
+"""
+TRIAL DESIGN
+The order of the conditions of a session, computed per trial instead of materialized as a list:
+trial i is condition order[i % n] of the participant's row, the session consists of `repetitions` blocks that
+each contain every condition once. Memory use does not depend on the number of trials, any trial can be looked
+up by its index in constant time, and a session can be resumed at any trial.
+
+Orders:
+    fixed       the conditions in the order they are given (hand-written counterbalancing in the setup file)
+    latin       Latin square: participant p starts at condition p and continues cyclically
+    balanced    balanced Latin square (Williams design): every condition also precedes every other condition
+                equally often across participants (n rows for an even number of conditions, 2n for an odd number)
+
+The row of a participant is taken from the UserID (participant_number), so consecutive IDs get consecutive rows.
+Conditions are a list of (distance, size) tuples or a ConditionGrid crossing all distances with all sizes:
+
+    design = TrialDesign(ConditionGrid([100, 200, 400], [10, 25, 50]), repetitions=4, order="balanced",
+                         participant=participant_number("7"))
+    design[12]                  # (distance, size) of trial 12
+    design.iter_from(elapsed)   # generator over the remaining trials
+"""
+
+ORDERS = ("fixed", "latin", "balanced")
+
+
+class ConditionGrid(object):
+    """
+        All combinations of the given distances and sizes, expanded on access
+        Behaves like a read-only list of (distance, size) tuples ordered by distance, then size
+
+        @param distances: A list of target distances
+        @param sizes: A list of target sizes
+    """
+
+    def __init__(self, distances, sizes):
+        self.distances = list(distances)
+        self.sizes = list(sizes)
+
+    def __len__(self):
+        return len(self.distances) * len(self.sizes)
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("condition %d is not part of the grid" % index)
+        distance, size = divmod(index, len(self.sizes))
+        return self.distances[distance], self.sizes[size]
+
+    def __iter__(self):
+        for distance in self.distances:
+            for size in self.sizes:
+                yield distance, size
+
+    def __eq__(self, other):
+        return isinstance(other, ConditionGrid) and self.distances == other.distances and self.sizes == other.sizes
+
+    def __repr__(self):
+        return "ConditionGrid(%r, %r)" % (self.distances, self.sizes)
+
+    def to_dict(self):
+        return {"distances": self.distances, "sizes": self.sizes}
+
+
+''' Converts the stored form of conditions (see TrialDesign.to_dict) back into a list or ConditionGrid'''
+
+
+def conditions_from_dict(conditions):
+    if isinstance(conditions, dict):
+        return ConditionGrid(conditions["distances"], conditions["sizes"])
+    return [tuple(condition) for condition in conditions]
+
+
+''' Derives a participant number from a UserID
+    The trailing digits are used ("7", "P07" and "sim7" are all participant 7), other IDs are hashed
+
+    @return: A non-negative integer
+'''
+
+
+def participant_number(user_id):
+    match = re.search(r"(\d+)$", str(user_id))
+    if match:
+        return int(match.group(1))
+    return zlib.crc32(str(user_id).encode("utf-8"))
+
+
+class TrialDesign(object):
+    """
+        Lazy, randomly accessible sequence of the conditions of all trials of a session
+
+        @param conditions: A list of (distance, size) tuples or a ConditionGrid
+        @param repetitions: Number of blocks, every block contains every condition once
+        @param order: Order of the conditions inside a block, one of ORDERS
+        @param participant: Participant number selecting the row of a latin or balanced order
+    """
+
+    def __init__(self, conditions, repetitions=4, order="fixed", participant=0):
+        if order not in ORDERS:
+            raise ValueError("unknown order %r, expected one of %s" % (order, ", ".join(ORDERS)))
+        if not isinstance(conditions, ConditionGrid):
+            conditions = [tuple(condition) for condition in conditions]
+        self.conditions = conditions
+        self.repetitions = repetitions
+        self.order = order
+        self.participant = participant
+        self.size = len(conditions)
+        rows = 2 * self.size if order == "balanced" and self.size % 2 else max(self.size, 1)
+        self.row = participant % rows if order != "fixed" else 0
+
+    def __len__(self):
+        return self.repetitions * self.size
+
+    ''' Returns the index of the condition at the given position of a block'''
+
+    def position(self, column):
+        if self.order == "fixed":
+            return column
+        if self.order == "latin":
+            return (self.row + column) % self.size
+        row = self.row
+        if row >= self.size:
+            # the second half of an odd balanced square repeats the rows in reverse
+            row -= self.size
+            column = self.size - 1 - column
+        if column == 0:
+            first = 0
+        elif column % 2:
+            first = (column + 1) // 2
+        else:
+            first = self.size - column // 2
+        return (first + row) % self.size
+
+    ''' Returns the (distance, size) tuple of the trial at the given index'''
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("trial %d is not part of the design" % index)
+        return self.conditions[self.position(index % self.size)]
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    ''' Generates the conditions of all trials from the given index on, e.g. to resume a session'''
+
+    def iter_from(self, first):
+        for index in range(first, len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return isinstance(other, TrialDesign) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "%d trials: %d conditions x %d repetitions, %s order (row %d)" % (
+            len(self), self.size, self.repetitions, self.order, self.row)
+
+    ''' Returns a json serializable description the design can be recreated from'''
+
+    def to_dict(self):
+        if isinstance(self.conditions, ConditionGrid):
+            conditions = self.conditions.to_dict()
+        else:
+            conditions = [list(condition) for condition in self.conditions]
+        return {"conditions": conditions, "repetitions": self.repetitions, "order": self.order,
+                "participant": self.participant}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(conditions_from_dict(data["conditions"]), data["repetitions"], data.get("order", "fixed"),
+                   data.get("participant", 0))
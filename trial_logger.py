@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+
+
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+
+"""
+TRIAL LOGGING
+Trial records are handed to an AsyncTrialWriter which writes them from a background thread,
+so file and console output never delay the click handling of the experiment UI.
+Records are written in batches to any number of sinks. A sink is an object with
+write_rows(rows), flush() and close() methods. Sinks storing records durably can also have a
+missing_records(records) method, so AsyncTrialWriter.restore() can write the records a crash kept from them.
+"""
+
+# the columns identifying a record
+RECORD_KEY_FIELDS = ["user_id", "trial", "timestamp (ISO)"]
+
+
+''' Returns the key identifying a record, values are compared as they appear in the csv file'''
+
+
+def record_key(record):
+    return tuple(str(record.get(field)) for field in RECORD_KEY_FIELDS)
+
+
+''' Reads the header line of a semicolon separated csv file
+
+    @return: The list of column names, None for an empty file
+'''
+
+
+def read_header(filename):
+    with open(filename, newline="") as logfile:
+        return next(csv.reader(logfile, delimiter=";"), None)
+
+
+class CsvSink(object):
+    """
+        Writes trial records to a semicolon separated csv file
+        The header line is only written if the file is new or empty. An existing file with other columns
+        (e.g. written with instrumentation turned on while it is off now) is renamed to <name>.<date-time>.csv
+        first, so rows never end up under a header they do not match.
+
+        @param filename: The file the records are appended to
+        @param fields: The names of the columns, in order
+    """
+
+    def __init__(self, filename, fields):
+        if os.path.exists(filename) and read_header(filename) not in (None, list(fields)):
+            root, extension = os.path.splitext(filename)
+            rotated = root + time.strftime(".%Y%m%d-%H%M%S") + extension
+            os.replace(filename, rotated)
+            sys.stderr.write("%s has other columns than this session, it was renamed to %s\n" % (filename, rotated))
+        self.logfile = open(filename, "a", newline="")
+        self.filename = filename
+        self.out = csv.DictWriter(self.logfile, fields, delimiter=";", quoting=csv.QUOTE_ALL, extrasaction="ignore")
+        if self.logfile.tell() == 0:
+            self.out.writeheader()
+
+    ''' Returns the given records that are not in the file yet, in their order'''
+
+    def missing_records(self, records):
+        self.logfile.flush()
+        with open(self.filename, newline="") as logfile:
+            logged = set(record_key(row) for row in csv.DictReader(logfile, delimiter=";"))
+        return [record for record in records if record_key(record) not in logged]
+
+    def write_rows(self, rows):
+        self.out.writerows(rows)
+
+    def flush(self):
+        self.logfile.flush()
+
+    def close(self):
+        self.logfile.close()
+
+
+class StdoutSink(object):
+    """
+        Prints trial records to stdout in the same format as the csv file
+
+        @param fields: The names of the columns, in order
+        @param stream: The stream to print to, stdout by default
+    """
+
+    def __init__(self, fields, stream=None):
+        self.fields = fields
+        self.stream = stream or sys.stdout
+        self.stream.write(";".join("\"%s\"" % field for field in fields) + "\n")
+
+    def write_rows(self, rows):
+        self.stream.write("".join(";".join("\"%s\"" % self.format_value(row.get(field)) for field in self.fields) + "\n"
+                                  for row in rows))
+
+    ''' Helper printing numbers without decimals like the original console output'''
+
+    def format_value(self, value):
+        if isinstance(value, float):
+            return "%d" % value
+        return value
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class AsyncTrialWriter(object):
+    """
+        Queue backed writer thread batching trial records for a list of sinks
+        A batch is written as soon as it holds batch_size records, or flush_interval seconds
+        after its first record arrived. close() writes all pending records and closes the sinks.
+
+        @param sinks: A list of sinks receiving every record
+        @param batch_size: Maximum number of records written at once
+        @param flush_interval: Maximum time in seconds a record waits before it is written
+    """
+
+    def __init__(self, sinks, batch_size=32, flush_interval=1.0):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="AsyncTrialWriter", daemon=True)
+        self.thread.start()
+
+    ''' Queues a record for writing, returns immediately
+
+        @param record: Dictionary mapping the column names to their values
+    '''
+
+    def put(self, record):
+        if self.closed:
+            raise ValueError("writer is closed")
+        self.queue.put(record)
+
+    ''' Writes the records a crash kept from the sinks, e.g. the journaled records of a resumed session
+        Every sink with a missing_records() method gets the records it does not have yet, other sinks none.
+        Has to be called before the first put(), the sinks are written from the calling thread.
+
+        @param records: The records the sinks should have, in order
+    '''
+
+    def restore(self, records):
+        for sink in self.sinks:
+            if not hasattr(sink, "missing_records"):
+                continue
+            try:
+                rows = sink.missing_records(records)
+                if rows:
+                    sink.write_rows(rows)
+                    sink.flush()
+            except Exception as error:
+                sys.stderr.write("Could not restore trial records in %s: %s\n" % (type(sink).__name__, error))
+
+    ''' Writes all pending records, closes all sinks and stops the writer thread'''
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    ''' Main loop of the writer thread'''
+
+    def run(self):
+        running = True
+        while running:
+            record = self.queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    running = False
+                    break
+                batch.append(record)
+            self.write(batch)
+        for sink in self.sinks:
+            sink.close()
+
+    ''' Hands a batch to every sink, a failing sink does not stop the others'''
+
+    def write(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write_rows(batch)
+                sink.flush()
+            except Exception as error:
+                sys.stderr.write("Could not write trial records to %s: %s\n" % (type(sink).__name__, error))
@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+
+
+import json
+import math
+import os
+import random
+import sys
+import threading
+
+import target_layout
+from trial_design import TrialDesign, conditions_from_dict
+
+"""
+TRIAL PLAN
+Precomputes the angle and the target layout of every trial of a session from a single seed.
+Every trial draws from its own random generator derived from the seed and the trial index, so any trial
+can be generated on its own, in any order and on any thread, and always gets the same layout.
+Only the trials around the current one are kept in memory, a running session evicts the trials it is done with.
+A plan can be saved to a json file and loaded again to repeat a session or to resume a crashed one. The file holds
+the seed, the design and the geometry the layouts are generated from, not the layouts themselves:
+
+    plan = TrialPlan(conditions, repetitions=4, seed=42)
+    plan.prefetch(first, 32)          # generates the next layouts on a background thread
+    plan.evict(model.elapsed)         # forgets the trials before the current one
+    plan.save("user1.plan.json")
+    plan = TrialPlan.load("user1.plan.json")
+    plan.trial(model.elapsed).layout  # [(x, y, diameter), ...], main target first
+"""
+
+PLAN_VERSION = 3
+
+
+class PlannedTrial(object):
+    """
+        The precomputed settings of a single trial
+
+        @param index: Position of the trial in the session
+        @param distance: The distance between target and cursor
+        @param size: The size of the targets
+        @param angle: Direction of the main target in radians
+        @param layout: A list of (x, y, diameter) tuples, main target first
+    """
+
+    __slots__ = ("index", "distance", "size", "angle", "layout")
+
+    def __init__(self, index, distance, size, angle, layout):
+        self.index = index
+        self.distance = distance
+        self.size = size
+        self.angle = angle
+        self.layout = layout
+
+    ''' Helper for accessing this trial's settings'''
+
+    def get_current_condition(self):
+        return self.distance, self.size
+
+    def to_dict(self):
+        return {"distance": self.distance, "size": self.size, "angle": self.angle,
+                "layout": [list(target) for target in self.layout]}
+
+
+class TrialPlan(object):
+    """
+        Seeded, reproducible angles and layouts for all trials of a session
+        The conditions of the trials come from a TrialDesign, the same one PointingExperimentModel uses.
+        Trials are generated on first access and cached until they are evicted.
+        Layouts stored in plan files of older versions are kept and used instead of generated ones.
+
+        @param conditions: A list of (distance, size) tuples or a ConditionGrid
+        @param repetitions: Indicates how often all trials should be repeated
+        @param seed: Seed of the plan, a random one is drawn (and stored with the plan) if None
+        @param width: Width of the area the targets are placed in
+        @param height: Height of the area the targets are placed in
+        @param start_pos: Tuple with the cursor's starting position, the center of the area by default
+        @param min_targets: Smallest number of distractors of a trial
+        @param max_targets: Largest number of distractors of a trial
+        @param order: Order of the conditions, see TrialDesign
+        @param participant: Participant number selecting the row of a latin or balanced order
+    """
+
+    def __init__(self, conditions, repetitions=4, seed=None, width=1920, height=800, start_pos=None,
+                 min_targets=3, max_targets=10, order="fixed", participant=0):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 32)
+        self.design = TrialDesign(conditions, repetitions, order, participant)
+        self.conditions = self.design.conditions
+        self.repetitions = repetitions
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.start_pos = tuple(start_pos) if start_pos is not None else (width / 2, height / 2)
+        self.min_targets = min_targets
+        self.max_targets = max_targets
+        self.trials = {}
+        self.stored_trials = {}
+        self.prefetch_thread = None
+
+    def __len__(self):
+        return len(self.design)
+
+    ''' Returns the random generator of a single trial, independent of all other trials'''
+
+    def trial_rng(self, index):
+        return random.Random("%s:%d" % (self.seed, index))
+
+    ''' Returns the planned trial at the given index, generating it on first access
+
+        @param index: Position of the trial in the session (e.g. model.elapsed)
+
+        @return: A PlannedTrial
+    '''
+
+    def trial(self, index):
+        planned = self.trials.get(index)
+        if planned is None:
+            # generation is deterministic, so a trial generated concurrently by prefetch() is identical
+            planned = self.trials.setdefault(index, self.stored_trials.get(index) or self.generate(index))
+        return planned
+
+    ''' Drops the cached trials before the given index, e.g. the ones a session is done with
+        Evicted trials are generated again if they are needed later on
+    '''
+
+    def evict(self, before):
+        for index in [index for index in list(self.trials) if index < before]:
+            self.trials.pop(index, None)
+
+    ''' Generates the angle and layout of a single trial'''
+
+    def generate(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("trial %d is not part of the plan" % index)
+        distance, size = self.design[index]
+        rng = self.trial_rng(index)
+        angle = math.radians(rng.randint(0, 360))
+        number_of_targets = rng.randint(self.min_targets, self.max_targets)
+        try:
+            layout = target_layout.generate_layout(distance, size, angle, self.start_pos, self.width, self.height,
+                                                   number_of_targets, rng)
+        except target_layout.LayoutError as error:
+            sys.stderr.write("Layout for trial %d: %s\n" % (index, error))
+            layout = error.layout
+        return PlannedTrial(index, distance, size, angle, layout)
+
+    ''' Generates trials from the given index on in a background thread, so no layout has to be
+        generated between two clicks
+
+        @param first: Index of the first trial to generate
+        @param count: Number of trials to generate, all remaining ones if None
+    '''
+
+    def prefetch(self, first=0, count=None):
+        if self.prefetch_thread is not None and self.prefetch_thread.is_alive():
+            return
+        self.prefetch_thread = threading.Thread(target=self.generate_all, args=(first, count), daemon=True)
+        self.prefetch_thread.start()
+
+    ''' Generates the given number of trials from the given index on, all remaining ones if count is None'''
+
+    def generate_all(self, first=0, count=None):
+        last = len(self) if count is None else min(first + count, len(self))
+        for index in range(first, last):
+            self.trial(index)
+
+    ''' Writes the plan to a json file, the layouts are generated again from the seed when it is loaded'''
+
+    def save(self, filename):
+        design = self.design.to_dict()
+        plan = {"version": PLAN_VERSION, "seed": self.seed, "conditions": design["conditions"],
+                "repetitions": self.repetitions, "order": design["order"], "participant": design["participant"],
+                "width": self.width, "height": self.height,
+                "start_pos": list(self.start_pos), "min_targets": self.min_targets, "max_targets": self.max_targets}
+        temp_name = filename + ".tmp"
+        with open(temp_name, "w") as plan_file:
+            json.dump(plan, plan_file)
+        os.replace(temp_name, filename)
+
+    ''' Reads a plan written by save()
+        Plans of version 1 have no order and use the conditions as given, plans of versions 1 and 2 store
+        the layouts of all trials, which are used as they are
+
+        @return: A TrialPlan
+    '''
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as plan_file:
+            data = json.load(plan_file)
+        if data.get("version") not in (1, 2, PLAN_VERSION):
+            raise ValueError("%s: unsupported trial plan version %s" % (filename, data.get("version")))
+        plan = cls(conditions_from_dict(data["conditions"]), data["repetitions"], data["seed"], data["width"],
+                   data["height"], data["start_pos"], data["min_targets"], data["max_targets"],
+                   data.get("order", "fixed"), data.get("participant", 0))
+        for index, trial in enumerate(data.get("trials", [])):
+            plan.stored_trials[index] = PlannedTrial(index, trial["distance"], trial["size"], trial["angle"],
+                                                     [tuple(target) for target in trial["layout"]])
+        return plan
+
+    ''' Checks whether the plan was made for the given trial design'''
+
+    def matches(self, design):
+        return self.design == design